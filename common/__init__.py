@@ -0,0 +1 @@
+"""Modules shared by the day4-day6 CLIs (each day's src/ re-exports them)."""
@@ -0,0 +1,83 @@
+"""Content-addressed embedding cache for day5/day6 ingest (SQLite).
+
+Rows are keyed on (embedding model, sha1 of the text), so a re-ingest only
+sends new or edited docs / chunks to the API; everything else is read back
+from disk. Vectors are stored as raw float32 blobs. Caches written by the
+old day5 CLI (no dim column) are upgraded in place when opened.
+"""
+import hashlib, sqlite3
+from pathlib import Path
+from typing import Callable
+import numpy as np
+from . import tracing
+
+def content_key(text: str) -> str:
+    # Same idea as _hash() in the CLI, but untruncated: this key must not collide
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    def __init__(self, path: Path, model: str):
+        self.model = model
+        self.hits = self.misses = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, key TEXT NOT NULL, dim INTEGER NOT NULL, vec BLOB NOT NULL,"
+            " PRIMARY KEY (model, key))"
+        )
+        if "dim" not in {r[1] for r in self.db.execute("PRAGMA table_info(embeddings)")}:
+            with self.db:
+                self.db.execute("ALTER TABLE embeddings ADD COLUMN dim INTEGER NOT NULL DEFAULT 0")
+                self.db.execute("UPDATE embeddings SET dim = length(vec) / 4")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        found = {}
+        for i in range(0, len(keys), 500):   # stay under SQLite's bound-parameter limit
+            part = keys[i:i+500]
+            rows = self.db.execute(
+                f"SELECT key, vec FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(part))})",
+                [self.model, *part],
+            )
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype="float32")
+        return found
+
+    def put_many(self, keys: list[str], X: np.ndarray):
+        X = np.asarray(X, dtype="float32")
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, dim, vec) VALUES (?, ?, ?, ?)",
+                [(self.model, k, int(x.shape[0]), x.tobytes()) for k, x in zip(keys, X)],
+            )
+
+    def embed(self, texts: list[str], embed_fn: Callable[[list[str]], np.ndarray]) -> np.ndarray:
+        """Embed texts, calling embed_fn only for (unique) texts not cached yet."""
+        keys = [content_key(t) for t in texts]
+        found = self.get_many(list(dict.fromkeys(keys)))
+
+        todo = {}   # key -> text, first occurrence only
+        for k, t in zip(keys, texts):
+            if k not in found and k not in todo:
+                todo[k] = t
+        if todo:
+            fresh = embed_fn(list(todo.values()))
+            self.put_many(list(todo), fresh)
+            found.update(zip(todo, np.asarray(fresh, dtype="float32")))
+
+        self.misses += len(todo)
+        self.hits += len(keys) - len(todo)
+        tracing.count("cache_hits", len(keys) - len(todo), cache="embeddings")
+        tracing.count("cache_misses", len(todo), cache="embeddings")
+        if not keys:
+            return np.zeros((0, 0), dtype="float32")
+        return np.stack([found[k] for k in keys])
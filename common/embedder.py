@@ -0,0 +1,143 @@
+"""Concurrent, rate-limit-aware embedding for day5/day6 ingest.
+
+Batches are packed by tiktoken token count (not item count) up to the
+per-request limits, a small thread pool keeps several requests in flight,
+and 429s / transient errors are retried with backoff. The wait time comes
+from the `retry-after` / `x-ratelimit-reset-*` response headers when present,
+and a rate-limit hit pauses every worker, not just the one that saw it.
+"""
+import random, re, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+from . import tracing
+
+MAX_INPUT_TOKENS = 8191        # per input, text-embedding-3-*
+MAX_REQUEST_TOKENS = 300_000   # per request, summed over inputs
+MAX_REQUEST_ITEMS = 2048       # per request
+
+@lru_cache(maxsize=None)   # loading an encoding reads and parses its BPE file: once per process
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except Exception as e:
+        raise RuntimeError("tiktoken not installed. Run: pip install tiktoken") from e
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def plan_batches(token_counts: list[int], max_tokens: int = MAX_REQUEST_TOKENS,
+                 max_items: int = MAX_REQUEST_ITEMS) -> list[list[int]]:
+    """Group input positions into in-order batches that respect both limits."""
+    batches, current, used = [], [], 0
+    for i, n in enumerate(token_counts):
+        if current and (used + n > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += n
+    if current:
+        batches.append(current)
+    return batches
+
+def _duration(value: str | None) -> float | None:
+    """Seconds from '1.5', '20ms', '1s' or '6m0s' style header values."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(n) * scale[u] for n, u in parts)
+
+def retry_delay(headers) -> float | None:
+    if headers is None:
+        return None
+    ms = _duration(headers.get("retry-after-ms"))
+    if ms is not None:
+        return ms / 1000
+    return _duration(headers.get("retry-after")) or max(
+        _duration(headers.get("x-ratelimit-reset-requests")) or 0,
+        _duration(headers.get("x-ratelimit-reset-tokens")) or 0,
+    ) or None
+
+def embed_query(client, model: str, text: str) -> np.ndarray:
+    """One short input (a question): a plain request, no tokenizer or thread pool to spin up."""
+    with tracing.span("embed_query"):
+        resp = client.embeddings.create(model=model, input=[text])
+    tracing.usage("openai", model, resp)
+    return np.array(resp.data[0].embedding, dtype="float32")
+
+class Embedder:
+    def __init__(self, client, model: str, workers: int = 4, max_retries: int = 6,
+                 max_tokens: int = MAX_REQUEST_TOKENS, max_items: int = MAX_REQUEST_ITEMS):
+        # We retry ourselves (and pause all workers), so turn off the SDK's own retries
+        self.client = client.with_options(max_retries=0) if hasattr(client, "with_options") else client
+        self.model = model
+        self.workers = workers
+        self.max_retries = max_retries
+        self.max_tokens = max_tokens
+        self.max_items = max_items
+        self.requests = self.retries = self.tokens = 0
+        self._pause_until = 0.0
+        self._lock = threading.Lock()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype="float32")
+        enc = _encoding(self.model)
+        inputs, counts = [], []
+        for t in texts:
+            toks = enc.encode(t, disallowed_special=())
+            if len(toks) > MAX_INPUT_TOKENS:   # the API would reject it outright
+                print(f"Warning: truncating a {len(toks)}-token input to {MAX_INPUT_TOKENS} tokens")
+                t, toks = enc.decode(toks[:MAX_INPUT_TOKENS]), toks[:MAX_INPUT_TOKENS]
+            inputs.append(t)
+            counts.append(len(toks))
+        self.tokens += sum(counts)
+
+        batches = plan_batches(counts, self.max_tokens, self.max_items)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(batches)))) as pool:
+            results = list(pool.map(lambda b: self._request([inputs[i] for i in b]), batches))
+        return np.array([v for vecs in results for v in vecs], dtype="float32")
+
+    def _wait_turn(self):
+        with self._lock:
+            delay = self._pause_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _pause(self, seconds: float):
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+
+    def _request(self, batch: list[str]) -> list[list[float]]:
+        import openai
+        for attempt in range(self.max_retries + 1):
+            self._wait_turn()
+            try:
+                raw = self.client.embeddings.with_raw_response.create(model=self.model, input=batch)
+                resp = raw.parse()
+                tracing.usage("openai", self.model, resp)
+                with self._lock:
+                    self.requests += 1
+                if raw.headers.get("x-ratelimit-remaining-requests") == "0":
+                    self._pause(_duration(raw.headers.get("x-ratelimit-reset-requests")) or 1.0)
+                return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+            except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as e:
+                if attempt == self.max_retries:
+                    raise
+                backoff = min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+                delay = retry_delay(getattr(getattr(e, "response", None), "headers", None)) or backoff
+                if isinstance(e, openai.RateLimitError):
+                    self._pause(delay)   # everyone backs off, not just this worker
+                else:
+                    time.sleep(delay)
+                with self._lock:
+                    self.retries += 1
+                tracing.count("retries", provider="openai", call="embeddings", error=type(e).__name__)
@@ -0,0 +1,168 @@
+"""Append-only result log (JSONL), shared format for day4-day6 outputs.
+
+Every result is one JSON line appended to a log file (day5/day6 answers go
+to `outputs/answers.jsonl`, day4 analyses to `outputs/results.jsonl`),
+stamped with an "id" and a UTC "ts". A write is a single O_APPEND write()
+under an advisory lock, so it costs the same after a million records as
+after one, and concurrent writers (several CLIs, the server) never
+interleave or overwrite each other. Once the file passes `max_bytes` it is
+renamed to `answers.000001.jsonl`, `answers.000002.jsonl`, ... and a new one
+started.
+
+day4, day5 and day6 each import it through a small `src/results_log.py`
+that puts the repo root on sys.path. Reading history (rotated files first,
+oldest to newest), from any of those folders:
+
+  python src/results_log.py outputs/answers.jsonl --last 5
+  python src/results_log.py outputs/answers.jsonl --grep metformin --since 2025-09-01 --count
+"""
+import json, os, re, uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+MAX_BYTES = 64 << 20   # rotate the live file past this size
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+class ResultLog:
+    def __init__(self, path: Path, max_bytes: int = MAX_BYTES):
+        self.path, self.max_bytes = Path(path), max_bytes
+        self._fd = None     # kept open between appends; reopened after a rotation
+        self._lock = None   # lock file, also kept open
+        self._rotated = re.compile(re.escape(self.path.stem) + r"\.(\d{6})" + re.escape(self.path.suffix) + "$")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._close_fd()
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def _close_fd(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @contextmanager
+    def _locked(self):
+        try:
+            import fcntl
+        except ImportError:   # Windows: single-writer use only
+            yield
+            return
+        if self._lock is None:
+            self._lock = open(self.path.with_name(self.path.name + ".lock"), "a+")
+        fcntl.flock(self._lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock, fcntl.LOCK_UN)
+
+    def _open(self) -> int:
+        # Another writer may have rotated the file since we opened it: follow the name
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            current = None
+        if self._fd is not None and (current is None or not os.path.samestat(os.fstat(self._fd), current)):
+            self._close_fd()
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def rotated(self) -> list[Path]:
+        """Rotated files, oldest first. Globbed only on rotation and reads, never per append."""
+        return sorted(p for p in self.path.parent.glob(f"{self.path.stem}.*{self.path.suffix}")
+                      if self._rotated.match(p.name))
+
+    def _rotate(self):
+        done = self.rotated()
+        n = int(self._rotated.match(done[-1].name).group(1)) + 1 if done else 1
+        os.replace(self.path, self.path.with_name(f"{self.path.stem}.{n:06d}{self.path.suffix}"))
+        self._close_fd()
+
+    def append(self, record: dict) -> str:
+        """Write one record; returns its id."""
+        record = {"id": uuid.uuid4().hex[:16], "ts": _now(), **record}
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._locked():
+            fd = self._open()
+            size = os.fstat(fd).st_size
+            if size and size + len(line) > self.max_bytes:
+                self._rotate()
+                fd = self._open()
+            os.write(fd, line)
+        return record["id"]
+
+    def __iter__(self):
+        """Every record, oldest first. A torn last line (writer killed mid-write) is skipped."""
+        for path in [*self.rotated(), self.path]:
+            try:
+                f = path.open(encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+def append(path: Path, record: dict) -> str:
+    with ResultLog(path) as log:
+        return log.append(record)
+
+# ---- Query -------------------------------------------------------------------
+def query(path: Path, since: str | None = None, until: str | None = None, kind: str | None = None,
+          grep: str | None = None, source: str | None = None, record_id: str | None = None, last: int | None = None):
+    """Records matching every given filter, oldest first (only the newest `last` if set).
+    since / until compare against the ISO timestamp, so any prefix works ("2025-09", "2025-09-17T10")."""
+    needle = grep.casefold() if grep else None
+
+    def keep(r: dict) -> bool:
+        ts = r.get("ts", "")
+        return ((since is None or ts >= since) and (until is None or ts[:len(until)] <= until)
+                and (kind is None or r.get("kind") == kind)
+                and (record_id is None or r.get("id", "").startswith(record_id))
+                and (source is None or any(source in s for s in r.get("sources") or []))
+                and (needle is None or needle in json.dumps(r, ensure_ascii=False).casefold()))
+
+    hits = filter(keep, ResultLog(path))
+    return iter(deque(hits, maxlen=last)) if last else hits
+
+def main():
+    import argparse, sys
+    ap = argparse.ArgumentParser(description="Read an append-only result log (and its rotated files)")
+    ap.add_argument("log", help="the live log file, e.g. outputs/answers.jsonl")
+    ap.add_argument("--since", help="ISO timestamp or prefix, e.g. 2025-09-17")
+    ap.add_argument("--until", help="ISO timestamp or prefix (inclusive)")
+    ap.add_argument("--kind", help='record kind, e.g. "ask"')
+    ap.add_argument("--grep", help="case-insensitive text match anywhere in the record")
+    ap.add_argument("--source", help="records citing this source (substring, e.g. policy1.txt)")
+    ap.add_argument("--id", help="record id (or prefix)")
+    ap.add_argument("--last", type=int, help="only the newest N matches")
+    ap.add_argument("--count", action="store_true", help="print the number of matches only")
+    ap.add_argument("--pretty", action="store_true", help="indented JSON instead of one line per record")
+    args = ap.parse_args()
+
+    hits = query(Path(args.log), args.since, args.until, args.kind, args.grep, args.source, args.id, args.last)
+    try:
+        if args.count:
+            print(sum(1 for _ in hits))
+        else:
+            for r in hits:
+                print(json.dumps(r, ensure_ascii=False, indent=2 if args.pretty else None))
+    except BrokenPipeError:   # piped into head
+        sys.stderr.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Spans, counters and token/cost accounting for day4-day6 (off unless enabled).
+
+Instrumented code wraps a stage in `with span("search", k=3):` and counts
+with `count("cache_hits", cache="answer")` or `usage(provider, model, resp)`.
+Until `enable()` is called these return at once (span() hands back one shared
+no-op object), so an untraced run pays one function call per stage and
+nothing per row, chunk or token.
+
+Once enabled:
+- every finished span is one record in the trace file (a results_log, so it
+  rotates and is read like one): name, trace / span / parent ids, ms, its
+  attributes and the error if it raised. Nesting follows the call stack,
+  asyncio tasks included, so one ask's spans share a trace id;
+- span durations feed a histogram per name, and counters add up per label
+  set: tokens in/out and USD cost per model, bytes read, cache hits and
+  misses, retries;
+- at exit the counters are appended to the trace as one "metrics" record and
+  written to the metrics file in Prometheus text format (for node_exporter's
+  textfile collector). `day6_cli.py --serve` also serves it on GET /metrics.
+
+day4, day5 and day6 each import it through a small `src/tracing.py` that
+puts the repo root on sys.path. Where the time of a run went, per stage:
+
+  python src/day6_cli.py --ask "..." --trace outputs/trace.jsonl
+  python src/tracing.py outputs/trace.jsonl                  # count, p50/p95/max and total ms per span
+  python src/tracing.py outputs/trace.jsonl --trace-id 3f2a  # one run's spans as a tree
+"""
+import atexit, bisect, json, os, threading, time
+from contextvars import ContextVar
+from pathlib import Path
+
+# USD per 1M tokens (input, output), list prices; other models are counted in tokens only
+PRICES = {
+    "text-embedding-3-small": (0.02, 0.0),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-5": (1.25, 10.00),
+    "claude-sonnet-4-20250514": (3.00, 15.00),
+}
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)   # span seconds
+PREFIX = "rag_"   # Prometheus metric names
+
+_tracer = None                                          # the active Tracer; None = off
+_current = ContextVar("tracing_span", default=None)     # innermost open span, for parent links
+
+def _id() -> str:
+    return os.urandom(8).hex()
+
+class _Noop:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+NOOP = _Noop()
+
+class Span:
+    __slots__ = ("tracer", "name", "attrs", "id", "parent", "trace", "t0", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict):
+        self.tracer, self.name, self.attrs = tracer, name, attrs
+
+    def set(self, **attrs):
+        """Attributes only known inside the span (sizes, token counts, cache outcome)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.id = _id()
+        self.parent = parent.id if parent else None
+        self.trace = parent.trace if parent else _id()
+        self._token = _current.set(self)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, err, tb):
+        seconds = time.perf_counter() - self.t0
+        try:
+            _current.reset(self._token)
+        except ValueError:   # closed from another context (e.g. a generator finalized elsewhere)
+            pass
+        self.tracer.finish(self, seconds, err)
+        return False
+
+class Tracer:
+    def __init__(self, trace: Path | None = None, metrics: Path | None = None):
+        from .results_log import ResultLog
+        self.log = ResultLog(trace) if trace else None
+        self.metrics = Path(metrics) if metrics else None
+        self.counters = {}   # (name, ((label, value), ...)) -> total
+        self.hist = {}       # span name -> [[count per bucket..., +Inf], sum of seconds]
+        self.lock = threading.Lock()
+
+    def finish(self, span: Span, seconds: float, err: BaseException | None):
+        with self.lock:
+            h = self.hist.get(span.name)
+            if h is None:
+                h = self.hist[span.name] = [[0] * (len(BUCKETS) + 1), 0.0]
+            h[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+            h[1] += seconds
+            if err is not None:
+                key = ("span_errors", (("span", span.name),))
+                self.counters[key] = self.counters.get(key, 0) + 1
+        if self.log is not None:
+            rec = {"kind": "span", "name": span.name, "trace": span.trace, "span": span.id, "parent": span.parent,
+                   "ms": round(seconds * 1000, 3), **span.attrs}
+            if err is not None:
+                rec["error"] = f"{type(err).__name__}: {err}"
+            self.log.append(rec)
+
+    def add(self, name: str, value: float, labels: dict):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self) -> dict:
+        """Counters as {'name{label=value,...}': total}."""
+        with self.lock:
+            items = sorted(self.counters.items())
+        return {name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): round(total, 6)
+                for (name, labels), total in items}
+
+    def prometheus(self) -> str:
+        """Text exposition format: a histogram of span seconds, then one counter per name."""
+        with self.lock:
+            hist = {name: (list(buckets), total) for name, (buckets, total) in self.hist.items()}
+            counters = sorted(self.counters.items())
+        lines = []
+        if hist:
+            lines += [f"# HELP {PREFIX}span_seconds Duration of instrumented stages.",
+                      f"# TYPE {PREFIX}span_seconds histogram"]
+            for name, (buckets, total) in sorted(hist.items()):
+                label, cum = f'span="{_escape(name)}"', 0
+                for le, n in zip([*map(str, BUCKETS), "+Inf"], buckets):
+                    cum += n
+                    lines.append(f'{PREFIX}span_seconds_bucket{{{label},le="{le}"}} {cum}')
+                lines += [f"{PREFIX}span_seconds_sum{{{label}}} {total:.6f}", f"{PREFIX}span_seconds_count{{{label}}} {cum}"]
+        typed = set()
+        for (name, labels), total in counters:
+            metric = f"{PREFIX}{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            label = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{metric}{{{label}}} {total:.15g}" if label else f"{metric} {total:.15g}")
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        if self.log is not None:
+            self.log.append({"kind": "metrics", "counters": self.snapshot()})
+            self.log.close()
+        if self.metrics is not None:
+            self.metrics.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.metrics.with_name(self.metrics.name + ".tmp")
+            tmp.write_text(self.prometheus(), encoding="utf-8")
+            os.replace(tmp, self.metrics)   # a scraper never sees half a file
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# ---- API ---------------------------------------------------------------------
+def enable(trace: Path | None = None, metrics: Path | None = None) -> Tracer:
+    """Start collecting (once per process); trace and metrics are written as described above."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(trace, metrics)
+        atexit.register(_tracer.close)
+    return _tracer
+
+def enabled() -> bool:
+    return _tracer is not None
+
+def span(name: str, **attrs):
+    """Timed stage: `with span("embed", texts=n) as s: ...; s.set(tokens=...)`."""
+    return Span(_tracer, name, attrs) if _tracer is not None else NOOP
+
+def count(name: str, value: float = 1, **labels):
+    if _tracer is not None:
+        _tracer.add(name, value, labels)
+
+def tokens(provider: str, model: str, tokens_in: int, tokens_out: int = 0):
+    """Token counters, and their list-price cost when the model is in PRICES."""
+    if _tracer is None:
+        return
+    _tracer.add("tokens_in", tokens_in, {"provider": provider, "model": model})
+    if tokens_out:
+        _tracer.add("tokens_out", tokens_out, {"provider": provider, "model": model})
+    price = PRICES.get(model)
+    if price:
+        _tracer.add("cost_usd", (tokens_in * price[0] + tokens_out * price[1]) / 1e6, {"provider": provider, "model": model})
+
+def usage(provider: str, model: str, resp) -> tuple[int, int] | None:
+    """Count the tokens reported by an SDK response (or a raw JSON body): chat, responses,
+    messages and embeddings all carry a `usage`. Returns (in, out), or None if off / absent."""
+    if _tracer is None or resp is None:
+        return None
+    u = resp.get("usage") if isinstance(resp, dict) else getattr(resp, "usage", None)
+    if u is None:
+        return None
+    get = u.get if isinstance(u, dict) else lambda k: getattr(u, k, None)
+    tin = get("input_tokens") or get("prompt_tokens") or 0
+    tout = get("output_tokens") or get("completion_tokens") or 0
+    tokens(provider, model, tin, tout)
+    return tin, tout
+
+def prometheus_text() -> str:
+    return _tracer.prometheus() if _tracer is not None else ""
+
+# ---- Report ------------------------------------------------------------------
+def _pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+def report(path: Path, since: str | None = None):
+    """Per span name: count, errors, p50/p95/max and total ms; then the latest counters."""
+    from .results_log import query
+    spans, metrics = {}, None
+    for r in query(path, since=since):
+        if r.get("kind") == "span":
+            spans.setdefault(r["name"], []).append(r)
+        elif r.get("kind") == "metrics":
+            metrics = r
+    print(f"{'span':24s} {'n':>6s} {'err':>4s} {'p50 ms':>9s} {'p95 ms':>9s} {'max ms':>9s} {'total s':>9s}")
+    for name, rs in sorted(spans.items(), key=lambda kv: -sum(r["ms"] for r in kv[1])):
+        ms = [r["ms"] for r in rs]
+        print(f"{name:24s} {len(ms):6d} {sum('error' in r for r in rs):4d} {_pct(ms, 0.5):9.1f} {_pct(ms, 0.95):9.1f} "
+              f"{max(ms):9.1f} {sum(ms) / 1000:9.2f}")
+    if metrics:
+        print(f"\ncounters at {metrics['ts']}:")
+        for name, total in metrics["counters"].items():
+            print(f"  {name}: {total:g}")
+
+def tree(path: Path, trace_id: str):
+    """Spans of the traces whose id starts with trace_id, indented under their parents."""
+    from .results_log import query
+    rs = [r for r in query(path, kind="span") if r["trace"].startswith(trace_id)]
+    children = {}
+    for r in rs:
+        children.setdefault(r["parent"], []).append(r)
+
+    def show(parent, depth):
+        for r in children.get(parent, []):   # log order = finish order; fine for reading
+            extra = {k: v for k, v in r.items() if k not in ("id", "ts", "kind", "name", "trace", "span", "parent", "ms")}
+            print(f"{'  ' * depth}{r['name']} {r['ms']:.1f} ms" + (f"  {json.dumps(extra, ensure_ascii=False)}" if extra else ""))
+            show(r["span"], depth + 1)
+
+    ids = {r["span"] for r in rs}
+    for root in sorted({r["parent"] for r in rs if r["parent"] not in ids}, key=str):
+        show(root, 0)
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Summarize a trace file written with --trace")
+    ap.add_argument("trace", help="trace JSONL, e.g. outputs/trace.jsonl")
+    ap.add_argument("--since", help="ISO timestamp or prefix, e.g. 2025-09-17")
+    ap.add_argument("--trace-id", help="print one trace (id or prefix) as a tree instead")
+    args = ap.parse_args()
+    if args.trace_id:
+        tree(Path(args.trace), args.trace_id)
+    else:
+        report(Path(args.trace), args.since)
+
+if __name__ == "__main__":
+    main()
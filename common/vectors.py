@@ -0,0 +1,30 @@
+"""Cosine search over L2-normalized float32 vectors, shared by the day5/day6 indexes.
+
+With unit vectors cosine similarity is one matmul, and top-k is an
+`argpartition` followed by a sort of just the k winners.
+"""
+import numpy as np
+
+def normalize(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype="float32")
+    norms = np.linalg.norm(X, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return X / norms
+
+def top_k(S: np.ndarray, k: int):
+    """Best k columns per row of a (B, N) score matrix, sorted. Returns (idx, scores)."""
+    n = S.shape[1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((S.shape[0], 0), dtype="int64"), S[:, :0]
+    part = np.argpartition(-S, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (S.shape[0], 1))
+    part_scores = np.take_along_axis(S, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+def search(X: np.ndarray, q: np.ndarray, k: int):
+    """Top-k by cosine for one query (D,) or a batch (B, D). Returns (idx, scores)."""
+    q = normalize(q)
+    single = q.ndim == 1
+    idx, scores = top_k((q[None, :] if single else q) @ X.T, k)
+    return (idx[0], scores[0]) if single else (idx, scores)
@@ -0,0 +1,166 @@
+"""Incremental bullet aggregator over a (large) provider outputs folder.
+
+`collect_model_bullets` re-reads every file on every run. This keeps its
+work in a small SQLite state file next to the summary instead:
+
+- a manifest of parsed files (name, mtime, size, the bullet keys found), so a
+  re-run only parses files that are new or changed, and forgets deleted ones;
+- the case-insensitive dedupe state: each unique bullet with the number of
+  files that contain it and the order it was first seen in.
+
+New and changed files are parsed on a process pool, in blocks committed one
+at a time (an interrupted run keeps what it finished). The result matches
+`collect_model_bullets` + `summarize_bullets`, except that bullet order is
+first-seen order across runs (new files by name) rather than directory
+order, and risk terms are matched within single bullets (see `summary`).
+A parser change (PARSER_VERSION), an edited risk lexicon or another
+inputs folder starts the state over.
+"""
+import json, os, sqlite3, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+from io_demo import bullets_from_file, clean_bullet
+from policy_utils import tag_risk, risk_matcher
+
+PARSER_VERSION = 1   # bump when bullet extraction changes, to re-parse everything
+SUFFIXES = (".json", ".txt")
+BLOCK = 4096         # files parsed + committed per block
+POOL_MIN = 256       # below this many files to parse, a process pool costs more than it saves
+WORKERS = os.cpu_count() or 1
+
+def parse_file(path: str) -> List[Tuple[str, str]]:
+    """Unique (bullet, key) pairs of one file, in order. Runs in worker processes."""
+    out, seen = [], set()
+    for b in bullets_from_file(Path(path)):
+        s, key = clean_bullet(b)
+        if s and key not in seen:
+            out.append((s, key))
+            seen.add(key)
+    return out
+
+class BulletIndex:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT);"
+            "CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, keys TEXT);"
+            "CREATE TABLE IF NOT EXISTS bullets (key TEXT PRIMARY KEY, text TEXT, refs INTEGER, risk INTEGER,"
+            " seq INTEGER);"
+            "CREATE INDEX IF NOT EXISTS bullets_seq ON bullets (seq);"
+            "CREATE INDEX IF NOT EXISTS bullets_risk ON bullets (risk) WHERE risk = 1;"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def reset(self):
+        with self.db:
+            self.db.execute("DELETE FROM meta")
+            self.db.execute("DELETE FROM files")
+            self.db.execute("DELETE FROM bullets")
+
+    def _meta(self, k: str) -> str | None:
+        row = self.db.execute("SELECT v FROM meta WHERE k = ?", (k,)).fetchone()
+        return row[0] if row else None
+
+    # ---- Updating ------------------------------------------------------------
+    def _drop(self, keys: List[str]):
+        self.db.executemany("UPDATE bullets SET refs = refs - 1 WHERE key = ?", [(k,) for k in keys])
+        self.db.executemany("DELETE FROM bullets WHERE key = ? AND refs <= 0", [(k,) for k in keys])
+
+    def _add(self, pairs: List[Tuple[str, str]]):
+        for s, key in pairs:
+            cur = self.db.execute("UPDATE bullets SET refs = refs + 1 WHERE key = ?", (key,))
+            if not cur.rowcount:
+                self._seq += 1
+                self.db.execute("INSERT INTO bullets (key, text, refs, risk, seq) VALUES (?, ?, 1, ?, ?)",
+                                (key, s, tag_risk(s) == "risk", self._seq))
+
+    def refresh(self, inputs_dir: Path, workers: int = WORKERS) -> Dict[str, Any]:
+        """Bring the state up to date with inputs_dir; returns what changed."""
+        t0 = time.perf_counter()
+        inputs_dir = Path(inputs_dir)
+        meta = {"inputs": str(inputs_dir.resolve()), "parser": str(PARSER_VERSION),
+                "lexicon": risk_matcher().fingerprint}   # stored risk flags depend on it
+        if any(self._meta(k) != v for k, v in meta.items()):
+            self.reset()
+            with self.db:
+                self.db.executemany("INSERT INTO meta (k, v) VALUES (?, ?)", meta.items())
+
+        # One directory scan; only files whose size or mtime moved get parsed
+        known = {name: (m, s) for name, m, s in self.db.execute("SELECT name, mtime_ns, size FROM files")}
+        current, todo = set(), []
+        if inputs_dir.exists():
+            with os.scandir(inputs_dir) as it:
+                for e in it:
+                    if not e.name.lower().endswith(SUFFIXES) or not e.is_file():
+                        continue
+                    st = e.stat()
+                    current.add(e.name)
+                    if known.get(e.name) != (st.st_mtime_ns, st.st_size):
+                        todo.append((e.name, st.st_mtime_ns, st.st_size))
+        gone = [name for name in known if name not in current]
+        todo.sort()
+        self._seq = self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM bullets").fetchone()[0]
+
+        with self.db:
+            for name in gone:
+                row = self.db.execute("SELECT keys FROM files WHERE name = ?", (name,)).fetchone()
+                self._drop(json.loads(row[0]))
+                self.db.execute("DELETE FROM files WHERE name = ?", (name,))
+
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(todo) >= POOL_MIN else None
+        try:
+            for i in range(0, len(todo), BLOCK):
+                block = todo[i:i + BLOCK]
+                paths = [str(inputs_dir / name) for name, _, _ in block]
+                parsed = pool.map(parse_file, paths, chunksize=64) if pool else map(parse_file, paths)
+                with self.db:   # one transaction per block
+                    for (name, mtime_ns, size), pairs in zip(block, parsed):
+                        self._add(pairs)   # before dropping the old version, so unchanged bullets keep their place
+                        if name in known:
+                            row = self.db.execute("SELECT keys FROM files WHERE name = ?", (name,)).fetchone()
+                            self._drop(json.loads(row[0]))
+                        self.db.execute("INSERT OR REPLACE INTO files (name, mtime_ns, size, keys) VALUES (?, ?, ?, ?)",
+                                        (name, mtime_ns, size, json.dumps([k for _, k in pairs], ensure_ascii=False)))
+        finally:
+            if pool:
+                pool.shutdown()
+        return {"files": len(current), "parsed": len(todo), "removed": len(gone),
+                "seconds": round(time.perf_counter() - t0, 3)}
+
+    # ---- Reading -------------------------------------------------------------
+    def bullets(self, limit: int | None = None) -> List[str]:
+        """Unique bullets in first-seen order (the first `limit` only, if given)."""
+        sql = "SELECT text FROM bullets ORDER BY seq" + (" LIMIT ?" if limit is not None else "")
+        return [r[0] for r in self.db.execute(sql, (limit,) if limit is not None else ())]
+
+    def summary(self, n: int = 3) -> Dict[str, Any]:
+        """Same payload as summarize_bullets(all bullets), without reading them all back.
+
+        Risk is flagged per bullet. summarize_bullets scans the bullets joined with " ",
+        so a multi-word term split across two bullets ("data" ending one, "leak" starting
+        the next) flags it there but not here; use --full if that matters."""
+        flagged = self.db.execute("SELECT 1 FROM bullets WHERE risk = 1 LIMIT 1").fetchone()
+        return {"bullets": self.bullets(n), "risk": "risk" if flagged else "ok"}
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Refresh the bullet state of an outputs folder and time it")
+    ap.add_argument("inputs", help="folder of .json/.txt provider outputs")
+    ap.add_argument("--state", default="aggregate.state.sqlite", help="state file")
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    args = ap.parse_args()
+    with BulletIndex(Path(args.state)) as index:
+        print(index.refresh(Path(args.inputs), args.workers))
+        print(index.summary())
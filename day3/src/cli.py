@@ -1,7 +1,8 @@
-import argparse, json, os
+import argparse, json, os, sys
 from pathlib import Path
 from io_demo import collect_model_bullets
 from policy_utils import summarize_bullets
+from aggregate import BulletIndex, WORKERS
 
 def main():
     here = Path(__file__).resolve()
@@ -17,14 +18,26 @@ def main():
                     help="Folder with JSON files from Day 2 (default: ai-lab/day2/outputs)")
     ap.add_argument("--out", type=str, default=str(default_out),
                     help="Where to write the summary JSON (default: ai-lab/day3/outputs/summary.json)")
+    ap.add_argument("--workers", type=int, default=WORKERS,
+                    help="Processes parsing new/changed files (default: all CPUs)")
+    ap.add_argument("--full", action="store_true",
+                    help="Re-read every file without the incremental state (<out>.state.sqlite)")
     args = ap.parse_args()
 
     inputs_dir = Path(args.inputs)
     out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    bullets = collect_model_bullets(inputs_dir)
-    payload = summarize_bullets(bullets)
+    if args.full:
+        bullets = collect_model_bullets(inputs_dir)
+        payload = summarize_bullets(bullets)
+    else:
+        # Only files added, changed or deleted since the last run are processed
+        with BulletIndex(out_path.with_suffix(".state.sqlite")) as index:
+            stats = index.refresh(inputs_dir, args.workers)
+            payload = index.summary()
+        print(f"{stats['files']} files: {stats['parsed']} parsed, {stats['removed']} removed "
+              f"in {stats['seconds']}s", file=sys.stderr)
 
     print(json.dumps(payload, ensure_ascii=False, indent=2))
 
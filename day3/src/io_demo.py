@@ -1,6 +1,6 @@
 import json, re
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 
 BULLET_PREFIXES = ("- ", "* ", "• ", "· ", "— ")
 
@@ -72,29 +72,39 @@ def extract_bullets_from_json(data: Any) -> List[str]:
         return out
     return []
 
+def bullets_from_file(p: Path) -> List[str]:
+    """Bullets of one .json or .txt output file (others yield none)."""
+    if p.suffix.lower() == ".json":
+        data = safe_load_json(p)
+        if isinstance(data, dict) and "_error" in data:
+            return []
+        return extract_bullets_from_json(data)
+    if p.suffix.lower() == ".txt":
+        try:
+            text = p.read_text(encoding="utf-8", errors="ignore")
+        except Exception:
+            text = ""
+        return parse_bullets_from_text(text)
+    return []
+
+def clean_bullet(b: str) -> Tuple[str, str]:
+    """(bullet without leftover bullet marks, case-insensitive dedupe key)."""
+    s = b.strip("•*-—· ").strip()
+    return s, s.lower()
+
 def collect_model_bullets(outputs_dir: Path) -> List[str]:
     bullets_all: List[str] = []
     if not outputs_dir.exists():
         return bullets_all
 
     for p in outputs_dir.iterdir():
-        if p.suffix.lower() == ".json":
-            data = safe_load_json(p)
-            if "_error" not in data:
-                bullets_all.extend(extract_bullets_from_json(data))
-        elif p.suffix.lower() == ".txt":
-            try:
-                text = p.read_text(encoding="utf-8", errors="ignore")
-            except Exception:
-                text = ""
-            bullets_all.extend(parse_bullets_from_text(text))
+        bullets_all.extend(bullets_from_file(p))
 
     # De-duplicate while preserving order (case-insensitive)
     seen = set()
     unique: List[str] = []
     for b in bullets_all:
-        s = b.strip("•*-—· ").strip()
-        key = s.lower()
+        s, key = clean_bullet(b)
         if s and key not in seen:
             unique.append(s)
             seen.add(key)
@@ -1,13 +1,28 @@
 from typing import List, Dict, Any
+from risk_matcher import RiskMatcher, LEXICON
+
+RED_FLAGS = ["privacy", "breach", "overbudget", "bias", "inequity", "fraud"]   # if risk_terms.txt is missing
+
+_matcher: RiskMatcher | None = None
+
+def risk_matcher() -> RiskMatcher:
+    """The risk lexicon (risk_terms.txt), compiled once per process."""
+    global _matcher
+    if _matcher is None:
+        _matcher = RiskMatcher.from_file(LEXICON) if LEXICON.exists() else RiskMatcher(RED_FLAGS)
+    return _matcher
 
 def top_n(items: List[str], n: int = 3) -> List[str]:
     """Return first n items. If list is shorter, return all."""
     return items[:n]
 
 def tag_risk(text: str) -> str:
-    """Toy rule-based risk tagger for demo."""
-    red_flags = ["privacy", "breach", "overbudget", "bias", "inequity", "fraud"]
-    return "risk" if any(w in text.lower() for w in red_flags) else "ok"
+    """Rule-based risk tagger: "risk" if any lexicon term occurs in the text."""
+    return "risk" if risk_matcher().any(text) else "ok"
+
+def scan_risks(texts: List[str]) -> List[Dict[str, Any]]:
+    """Risk, matched terms with counts, and positions for each text (see RiskMatcher.scan)."""
+    return risk_matcher().scan_many(texts)
 
 def summarize_bullets(bullets: List[str]) -> Dict[str, Any]:
     """Package a summary payload like an API might."""
@@ -0,0 +1,120 @@
+"""Multi-pattern risk term matcher (Aho-Corasick), built once from a lexicon.
+
+`w in text` per red-flag word costs terms x text; this automaton finds every
+occurrence of every term in one pass over the text, however many terms the
+lexicon has (English, Japanese, ...). Matching is case-insensitive substring
+matching, like the old `tag_risk`: "Privacy-breach" hits both "privacy" and
+"breach", and overlapping terms are all reported.
+
+Lexicon file: one term per line; blank lines and lines starting with # are
+skipped. `risk_terms.txt` next to this file is the default.
+
+  python src/risk_matcher.py outputs/*.txt                  # per-file risk, matched terms and counts
+  python src/risk_matcher.py snippets.jsonl --lexicon terms.txt --only-risk
+"""
+import hashlib, json
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Tuple
+
+LEXICON = Path(__file__).resolve().parent / "risk_terms.txt"
+
+def read_lexicon(path: Path) -> List[str]:
+    with Path(path).open(encoding="utf-8") as f:
+        return [ln.strip() for ln in f if ln.strip() and not ln.lstrip().startswith("#")]
+
+class RiskMatcher:
+    def __init__(self, terms: Iterable[str]):
+        self.terms = sorted({t.strip().lower() for t in terms if t.strip()})
+        self.fingerprint = hashlib.sha1("\n".join(self.terms).encode("utf-8")).hexdigest()[:12]
+        # Trie: goto[state] maps a character to the next state; out[state] lists the terms ending there
+        self.goto: List[Dict[str, int]] = [{}]
+        self.out: List[List[str]] = [[]]
+        for term in self.terms:
+            s = 0
+            for ch in term:
+                nxt = self.goto[s].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[s][ch] = nxt
+                    self.goto.append({})
+                    self.out.append([])
+                s = nxt
+            self.out[s].append(term)
+        # Failure links, breadth first: the longest proper suffix that is also a trie path
+        self.fail = [0] * len(self.goto)
+        queue = list(self.goto[0].values())
+        for s in queue:   # grows while iterating
+            for ch, nxt in self.goto[s].items():
+                f = self.fail[s]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+                queue.append(nxt)
+        self.alphabet = frozenset(ch for term in self.terms for ch in term)
+
+    @classmethod
+    def from_file(cls, path: Path = LEXICON) -> "RiskMatcher":
+        return cls(read_lexicon(path))
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def _scan(self, text: str):
+        """Yield (end index in the lowercased text, terms ending there)."""
+        goto, fail, out, alphabet = self.goto, self.fail, self.out, self.alphabet
+        s = 0
+        for i, ch in enumerate(text.lower()):
+            if ch not in alphabet:   # most characters of a long text: straight back to the root
+                s = 0
+                continue
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            if out[s]:
+                yield i, out[s]
+
+    def find(self, text: str) -> List[Tuple[int, str]]:
+        """Every (start, term) occurrence, in text order. Starts index the lowercased text,
+        which is the original text unless lower() changed its length (e.g. "İ")."""
+        return [(i - len(t) + 1, t) for i, terms in self._scan(text) for t in terms]
+
+    def any(self, text: str) -> bool:
+        """Whether any term occurs; stops at the first match."""
+        return next(self._scan(text), None) is not None
+
+    def scan(self, text: str) -> Dict[str, Any]:
+        """{"risk": "risk" | "ok", "counts": {term: n}, "matches": [[start, term], ...]}"""
+        matches = self.find(text)
+        return {"risk": "risk" if matches else "ok",
+                "counts": dict(Counter(t for _, t in matches)),
+                "matches": [list(m) for m in matches]}
+
+    def scan_many(self, texts: Iterable[str]) -> List[Dict[str, Any]]:
+        """scan() for a whole batch of documents on the one compiled automaton."""
+        return [self.scan(t) for t in texts]
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Pre-screen texts for risk terms")
+    ap.add_argument("files", nargs="+", help=".txt files, or .jsonl with a 'snippet'/'text' field per line")
+    ap.add_argument("--lexicon", default=str(LEXICON), help="one term per line (default: risk_terms.txt)")
+    ap.add_argument("--only-risk", action="store_true", help="print flagged documents only")
+    args = ap.parse_args()
+
+    matcher = RiskMatcher.from_file(Path(args.lexicon))
+    for name in args.files:
+        p = Path(name)
+        if p.suffix.lower() == ".jsonl":
+            docs = []
+            for n, line in enumerate(p.read_text(encoding="utf-8").splitlines(), 1):
+                if line.strip():
+                    item = json.loads(line)
+                    item = item if isinstance(item, dict) else {"snippet": item}
+                    docs.append((f"{name}:{item.get('id', n)}", str(item.get("snippet") or item.get("text") or "")))
+        else:
+            docs = [(name, p.read_text(encoding="utf-8", errors="ignore"))]
+        for (doc, _), res in zip(docs, matcher.scan_many(text for _, text in docs)):
+            if res["risk"] == "risk" or not args.only_risk:
+                print(json.dumps({"doc": doc, "risk": res["risk"], "counts": res["counts"]}, ensure_ascii=False))
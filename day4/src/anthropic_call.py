@@ -1,33 +1,82 @@
-
 from __future__ import annotations
 import os
-from typing import Dict, Any
-from .utils import load_env, write_text, write_json, coerce_json, normalize_contract, PROMPT_TEMPLATE
+from typing import Dict, Any, Tuple
+from . import response_cache, tracing
+from .utils import load_env, log_result, coerce_json, normalize_contract, PROMPT_TEMPLATE
 
-def analyze_with_anthropic(snippet: str) -> Dict[str, Any]:
-    load_env()
+MODEL = "claude-sonnet-4-20250514"
+
+def _sdk():
     try:
         import anthropic
     except Exception as e:
         raise RuntimeError("Anthropic SDK not installed. Run: pip install anthropic") from e
+    return anthropic
 
-    client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+def _request(snippet: str) -> Dict[str, Any]:
     prompt = PROMPT_TEMPLATE.replace("{snippet}", snippet)
-
-    msg = client.messages.create(
-        model="claude-sonnet-4-20250514",
+    return dict(
+        model=MODEL,
         max_tokens=800,
         temperature=0.2,
         messages=[{"role": "user", "content": prompt}],
     )
 
+def _finish(msg) -> Tuple[str, Dict[str, Any]]:
     parts = []
     for block in getattr(msg, "content", []):
         if getattr(block, "type", None) == "text":
             parts.append(getattr(block, "text", ""))
     text_out = "\n".join([p for p in parts if p]).strip() or str(msg)
+    return text_out, normalize_contract(coerce_json(text_out))
+
+def anthropic_client():
+    with tracing.span("get_client", provider="anthropic"):
+        load_env()
+        return _sdk().Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
-    write_text("anthropic", text_out)
-    obj = normalize_contract(coerce_json(text_out))
-    write_json("anthropic", obj)
+def analyze_with_anthropic(snippet: str) -> Dict[str, Any]:
+    with tracing.span("analyze_with_anthropic"):
+        client = anthropic_client()
+
+        req = _request(snippet)
+        key = response_cache.request_key("anthropic", req)
+        cache = response_cache.cache()
+        hit = cache.get(key) if cache else None
+        if hit is not None:
+            text_out, obj = hit
+        else:
+            with tracing.span("completion", path=f"messages:{MODEL}"):
+                msg = client.messages.create(**req)
+            tracing.usage("anthropic", MODEL, msg)
+            text_out, obj = _finish(msg)
+            if cache:
+                cache.put(key, "anthropic", MODEL, (text_out, obj))
+    log_result("anthropic", text_out, obj)
     return obj
+
+def async_anthropic_client():
+    """AsyncAnthropic client for batch mode (retries are done by the caller)."""
+    load_env()
+    return _sdk().AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), max_retries=0)
+
+async def analyze_with_anthropic_async(client, snippet: str, call) -> Tuple[str, Dict[str, Any]]:
+    """Same as analyze_with_anthropic on an async client; `call` wraps the request (retries).
+    Returns the raw text and the normalized result."""
+    req = _request(snippet)
+    key = response_cache.request_key("anthropic", req)
+    cache = response_cache.cache()
+    hit = cache.get(key) if cache else None
+    if hit is not None:
+        return hit
+
+    async def fetch():
+        with tracing.span("completion", path=f"messages:{MODEL}"):
+            msg = await call(client.messages.create, **req)
+        tracing.usage("anthropic", MODEL, msg)
+        result = _finish(msg)
+        if cache:
+            cache.put(key, "anthropic", MODEL, result)
+        return result
+
+    return await (cache.once(key, fetch) if cache else fetch())
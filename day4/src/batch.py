@@ -0,0 +1,167 @@
+"""Batch policy analysis: many snippets, one or both providers, concurrently.
+
+Snippets come from a directory (every .txt file below it, id = relative
+path) or a JSONL file ({"id": ..., "snippet": ...} objects, or bare JSON
+strings; id defaults to the line number). Each provider gets its own pool
+of workers, so its concurrency limit is independent of the other's, and
+the reader only runs ahead of the slowest provider by a bounded queue.
+
+Responses are cached on disk (see response_cache): unchanged snippets cost
+no API call on a re-run, and duplicates within a run share one call.
+Rate limits, timeouts and 5xx errors are retried with exponential backoff
+and jitter (honouring Retry-After when the API sends one). Every result is
+written to one JSONL output as soon as it arrives:
+
+  {"id": ..., "provider": "openai", "result": {"bullets": [...], "risk": "ok"},
+   "raw": "...", "attempts": 1, "ms": 812.4}   (+ "cached": true, attempts 0, when no call was made)
+
+or, when a snippet fails for good, "error" instead of "result" and "raw".
+"""
+from __future__ import annotations
+import asyncio, json, pathlib, random, time
+from typing import Any, Dict, Iterator, Tuple
+from .openai_call import async_openai_client, analyze_with_openai_async
+from .anthropic_call import async_anthropic_client, analyze_with_anthropic_async
+from .capabilities import save_all
+from .utils import OUT
+from . import tracing
+
+PROVIDERS = {
+    "openai": (async_openai_client, analyze_with_openai_async),
+    "anthropic": (async_anthropic_client, analyze_with_anthropic_async),
+}
+CONCURRENCY = {"openai": 16, "anthropic": 8}
+RETRIES = 5          # attempts after the first
+BACKOFF = 1.0        # seconds before the first retry; doubles each time
+MAX_BACKOFF = 60.0
+
+def read_snippets(path: pathlib.Path) -> Iterator[Tuple[str, str]]:
+    """Yield (id, snippet) from a directory of .txt files or a JSONL file."""
+    if path.is_dir():
+        for p in sorted(path.rglob("*.txt")):
+            text = p.read_text(encoding="utf-8", errors="ignore").strip()
+            if text:
+                yield p.relative_to(path).as_posix(), text
+        return
+    with path.open(encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{n}: not valid JSON ({e})") from None
+            if isinstance(item, str):
+                item = {"snippet": item}
+            text = str(item.get("snippet") or item.get("text") or "").strip() if isinstance(item, dict) else ""
+            if not text:
+                raise ValueError(f"{path}:{n}: expected an object with a 'snippet' field")
+            yield str(item.get("id", n)), text
+
+def _retryable(e: Exception) -> bool:
+    status = getattr(e, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    return type(e).__name__ in ("APITimeoutError", "APIConnectionError") or isinstance(e, (TimeoutError, ConnectionError))
+
+def _retry_after(e: Exception) -> float | None:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class Caller:
+    """Runs one API request with retries; counts attempts for the current job."""
+
+    def __init__(self, retries: int, provider: str = ""):
+        self.retries, self.attempts, self.provider = retries, 0, provider
+
+    async def __call__(self, fn, **kwargs):
+        for attempt in range(self.retries + 1):
+            self.attempts += 1
+            try:
+                return await fn(**kwargs)
+            except Exception as e:
+                if attempt == self.retries or not _retryable(e):
+                    raise
+                tracing.count("retries", provider=self.provider, call="analyze", error=type(e).__name__)
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(MAX_BACKOFF, BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.0)
+                await asyncio.sleep(delay)
+
+async def _worker(name: str, client, analyze, queue: asyncio.Queue, emit, retries: int):
+    while (item := await queue.get()) is not None:
+        sid, snippet = item
+        call = Caller(retries, name)
+        t0 = time.perf_counter()
+        rec: Dict[str, Any] = {"id": sid, "provider": name}
+        try:
+            with tracing.span(f"analyze_with_{name}", id=sid):
+                raw, obj = await analyze(client, snippet, call)
+            rec.update(result=obj, raw=raw)
+        except Exception as e:   # one bad snippet shouldn't sink a run of thousands
+            rec["error"] = f"{type(e).__name__}: {e}"
+        if not call.attempts and "error" not in rec:
+            rec["cached"] = True   # response cache hit, or shared an identical in-flight request
+        rec.update(attempts=call.attempts, ms=round((time.perf_counter() - t0) * 1000, 1))
+        emit(rec)
+
+async def _run(src: pathlib.Path, dst: pathlib.Path, providers: list[str], concurrency: Dict[str, int],
+               retries: int) -> Dict[str, Any]:
+    stats = {"snippets": 0, **{p: {"ok": 0, "cached": 0, "risk": 0, "errors": 0} for p in providers}}
+    t0 = time.perf_counter()
+    with dst.open("w", encoding="utf-8") as out:
+        def emit(rec: Dict[str, Any]):
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            out.flush()
+            s = stats[rec["provider"]]
+            if "error" in rec:
+                s["errors"] += 1
+            else:
+                s["ok"] += 1
+                s["cached"] += rec.get("cached", False)
+                s["risk"] += rec["result"]["risk"] == "risk"
+
+        clients, queues, workers = {}, {}, []
+        for name in providers:
+            make_client, analyze = PROVIDERS[name]
+            clients[name] = make_client()
+            n = concurrency.get(name) or CONCURRENCY[name]
+            queues[name] = asyncio.Queue(maxsize=2 * n)   # bounds how far reading runs ahead
+            workers += [asyncio.create_task(_worker(name, clients[name], analyze, queues[name], emit, retries))
+                        for _ in range(n)]
+        try:
+            for item in read_snippets(src):
+                stats["snippets"] += 1
+                if tracing.enabled():
+                    tracing.count("bytes_read", len(item[1].encode("utf-8")), what="snippets")
+                for name in providers:
+                    await queues[name].put(item)
+            for name in providers:
+                for _ in range(concurrency.get(name) or CONCURRENCY[name]):
+                    await queues[name].put(None)   # one stop signal per worker
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+            for client in clients.values():
+                await client.close()
+            save_all()   # what each path's breaker learned during the run
+    stats["seconds"] = time.perf_counter() - t0
+    return stats
+
+def analyze_batch(path: str, providers: list[str], out: str | None = None,
+                  concurrency: Dict[str, int] | None = None, retries: int = RETRIES) -> Dict[str, Any]:
+    src = pathlib.Path(path)
+    dst = pathlib.Path(out) if out else OUT / f"batch_{src.stem}.jsonl"
+    with tracing.span("batch", providers=",".join(providers)):   # parent of every snippet's spans
+        stats = asyncio.run(_run(src, dst, providers, concurrency or {}, retries))
+    calls = stats["snippets"] * len(providers)
+    print(f"Analyzed {stats['snippets']} snippets x {len(providers)} provider(s) in {stats['seconds']:.1f}s "
+          f"({calls / max(stats['seconds'], 1e-9):.1f} calls/s). Results in {dst}")
+    for name in providers:
+        s = stats[name]
+        print(f"  {name}: {s['ok']} ok ({s['cached']} from cache, {s['risk']} risk), {s['errors']} errors")
+    return stats
@@ -0,0 +1,254 @@
+"""Provider batch jobs: submit thousands of snippets now, collect the results later.
+
+OpenAI's Batch API and Anthropic's Message Batches take a file of requests
+and answer within 24h at about half the price of the same calls made one by
+one, and they don't count against the per-minute rate limits. The requests
+are exactly the ones the direct calls send (PROMPT_TEMPLATE filled with each
+snippet), so results come back through the same coerce_json /
+normalize_contract and land in the response cache: a later direct call or
+`--batch` run for the same snippet costs nothing.
+
+  python -m src.cli --batch-submit samples/ --providers openai anthropic
+  python -m src.cli --batch-collect              # latest job; prints progress until it has ended
+  python -m src.cli --batch-collect 20250918_101500_3fa2 --wait
+
+Each job is tracked in `outputs/batch_jobs/<job>.json` (provider batch ids,
+which snippet each request belongs to, status). Snippets already in the
+response cache, and duplicates, are not sent. Collecting writes the same
+records as `--batch` to `outputs/batch_<name>.jsonl`; "attempts" is 0 for
+every record since no direct call was made.
+
+Both SDKs honour OPENAI_BASE_URL / ANTHROPIC_BASE_URL, so a job can be run
+end to end against a local mock server.
+"""
+from __future__ import annotations
+import json, pathlib, secrets, time
+from typing import Any, Dict, List, Tuple
+from . import capabilities, openai_call, anthropic_call, response_cache
+from .batch import read_snippets
+from .utils import OUT, coerce_json, normalize_contract
+
+JOBS = OUT / "batch_jobs"
+POLL = 60.0                                             # seconds between status checks with --wait
+MAX_REQUESTS = {"openai": 50_000, "anthropic": 100_000}  # per provider batch (API limits)
+MAX_BYTES = 100 << 20                                    # per provider batch; both APIs allow a little more
+
+Result = Tuple[str, Dict[str, Any]]
+
+# ---- Providers ---------------------------------------------------------------
+class OpenAIBatches:
+    name = "openai"
+
+    def __init__(self):
+        self.client = openai_call.openai_client()
+        # The path the capability breaker currently prefers for this key
+        self.path = capabilities.router("openai", self.client.api_key, openai_call.PATHS).plan()[0]
+        self.url, self.request, self.body_text = openai_call.BATCH_PATHS[self.path]
+
+    def line(self, custom_id: str, req: Dict[str, Any]) -> Dict[str, Any]:
+        return {"custom_id": custom_id, "method": "POST", "url": self.url, "body": req}
+
+    def submit(self, lines: List[Dict[str, Any]], job: str) -> Dict[str, Any]:
+        data = "".join(json.dumps(l, ensure_ascii=False) + "\n" for l in lines).encode("utf-8")
+        f = self.client.files.create(file=(f"{job}.jsonl", data), purpose="batch")
+        b = self.client.batches.create(input_file_id=f.id, endpoint=self.url, completion_window="24h",
+                                       metadata={"job": job})
+        return {"id": b.id, "input_file_id": f.id}
+
+    def status(self, batch_id: str) -> Tuple[bool, str]:
+        b = self.client.batches.retrieve(batch_id)
+        c = b.request_counts
+        counts = f" ({c.completed}/{c.total} done, {c.failed} failed)" if c else ""
+        return b.status in ("completed", "failed", "expired", "cancelled"), b.status + counts
+
+    def results(self, batch_id: str):
+        """Yield (custom_id, result or None, error or None)."""
+        b = self.client.batches.retrieve(batch_id)
+        for file_id in (b.output_file_id, b.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                r = json.loads(line)
+                resp = r.get("response") or {}
+                if r.get("error") or resp.get("status_code") != 200:
+                    err = r.get("error") or (resp.get("body") or {}).get("error") or f"HTTP {resp.get('status_code')}"
+                    yield r["custom_id"], None, json.dumps(err, ensure_ascii=False) if isinstance(err, dict) else str(err)
+                    continue
+                try:
+                    yield r["custom_id"], openai_call._finish(self.body_text(resp["body"])), None
+                except Exception as e:
+                    yield r["custom_id"], None, f"{type(e).__name__}: {e}"
+
+class AnthropicBatches:
+    name = "anthropic"
+    path = f"messages:{anthropic_call.MODEL}"
+
+    def __init__(self):
+        self.client = anthropic_call.anthropic_client()
+        self.request = anthropic_call._request
+
+    def line(self, custom_id: str, req: Dict[str, Any]) -> Dict[str, Any]:
+        return {"custom_id": custom_id, "params": req}
+
+    def submit(self, lines: List[Dict[str, Any]], job: str) -> Dict[str, Any]:
+        return {"id": self.client.messages.batches.create(requests=lines).id}
+
+    def status(self, batch_id: str) -> Tuple[bool, str]:
+        b = self.client.messages.batches.retrieve(batch_id)
+        c = b.request_counts
+        return b.processing_status == "ended", (f"{b.processing_status} ({c.succeeded} succeeded, {c.errored} errored, "
+                                                f"{c.processing} processing, {c.expired} expired)")
+
+    def results(self, batch_id: str):
+        for entry in self.client.messages.batches.results(batch_id):
+            res = entry.result
+            if res.type != "succeeded":
+                err = getattr(getattr(getattr(res, "error", None), "error", None), "message", None)
+                yield entry.custom_id, None, f"{res.type}: {err}" if err else res.type
+                continue
+            try:
+                raw = anthropic_call._finish(res.message)[0]
+                yield entry.custom_id, (raw, normalize_contract(coerce_json(raw))), None
+            except Exception as e:
+                yield entry.custom_id, None, f"{type(e).__name__}: {e}"
+
+PROVIDERS = {"openai": OpenAIBatches, "anthropic": AnthropicBatches}
+
+# ---- Job state ---------------------------------------------------------------
+def _job_path(job: str) -> pathlib.Path:
+    return JOBS / f"{job}.json"
+
+def _save(state: Dict[str, Any]):
+    JOBS.mkdir(parents=True, exist_ok=True)
+    path = _job_path(state["job"])
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state, indent=1, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(path)
+
+def load_job(job: str | None = None) -> Dict[str, Any]:
+    """A job's state; the most recent job when `job` is None or "latest"."""
+    if job in (None, "latest"):
+        jobs = sorted(JOBS.glob("*.json")) if JOBS.is_dir() else []
+        if not jobs:
+            raise FileNotFoundError(f"No batch jobs in {JOBS}")
+        return json.loads(jobs[-1].read_text(encoding="utf-8"))
+    path = pathlib.Path(job) if job.endswith(".json") else _job_path(job)
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def _chunks(lines: List[Dict[str, Any]], provider: str):
+    chunk, size = [], 0
+    for line in lines:
+        n = len(json.dumps(line, ensure_ascii=False).encode("utf-8")) + 1
+        if chunk and (len(chunk) == MAX_REQUESTS[provider] or size + n > MAX_BYTES):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(line)
+        size += n
+    if chunk:
+        yield chunk
+
+# ---- Submit / collect --------------------------------------------------------
+def submit(path: str, providers: list[str], out: str | None = None) -> Dict[str, Any]:
+    src = pathlib.Path(path)
+    job = time.strftime("%Y%m%d_%H%M%S") + "_" + secrets.token_hex(2)
+    items = list(read_snippets(src))
+    state: Dict[str, Any] = {
+        "job": job, "source": str(src), "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "out": out or str(OUT / f"batch_{src.stem}.jsonl"), "status": "submitted",
+        "ids": [sid for sid, _ in items], "providers": {},
+    }
+    cache = response_cache.cache()
+    try:
+        for name in providers:
+            api = PROVIDERS[name]()
+            keys, lines, seen, cached = [], [], set(), 0
+            for _, snippet in items:
+                req = api.request(snippet)
+                key = response_cache.request_key(name, req)   # also the custom_id: 64 hex chars
+                keys.append(key)
+                if key in seen:
+                    continue
+                seen.add(key)
+                if cache and cache.get(key) is not None:
+                    cached += 1
+                    continue
+                lines.append(api.line(key, req))
+            p = state["providers"][name] = {"path": api.path, "keys": keys, "cached": cached,
+                                            "requests": len(lines), "batches": []}
+            for chunk in _chunks(lines, name):
+                p["batches"].append({**api.submit(chunk, job), "count": len(chunk), "status": "submitted"})
+                _save(state)   # a failure later on must not lose batches already paid for
+            print(f"  {name}: {len(lines)} requests in {len(p['batches'])} batch(es) via {api.path}, "
+                  f"{cached} already cached, {len(items) - len(seen)} duplicates")
+    finally:
+        _save(state)
+    print(f"Submitted job {job} ({len(items)} snippets). Collect with: python -m src.cli --batch-collect {job}")
+    return state
+
+def _poll(state: Dict[str, Any], apis: Dict[str, Any]) -> bool:
+    """Refresh every provider batch's status; True when all have ended."""
+    done = True
+    for name, p in state["providers"].items():
+        for b in p["batches"]:
+            if b.get("ended"):
+                continue
+            ended, b["status"] = apis[name].status(b["id"])
+            b["ended"] = ended
+            done &= ended
+            print(f"  {name} {b['id']}: {b['status']}")
+    _save(state)
+    return done
+
+def collect(job: str | None = None, wait: bool = False, out: str | None = None) -> Dict[str, Any] | None:
+    """Write the job's results once every provider batch has ended; returns the stats, or None if still running."""
+    state = load_job(job)
+    apis = {name: PROVIDERS[name]() for name, p in state["providers"].items() if p["batches"]}
+    while not _poll(state, apis):
+        if not wait:
+            print(f"Job {state['job']} is still running; collect again later (or add --wait).")
+            return None
+        time.sleep(POLL)
+
+    cache = response_cache.cache()
+    dst = pathlib.Path(out or state["out"])
+    stats: Dict[str, Any] = {"snippets": len(state["ids"])}
+    with dst.open("w", encoding="utf-8") as f:
+        for name, p in state["providers"].items():
+            fresh: Dict[str, Result] = {}
+            errors: Dict[str, str] = {}
+            for b in p["batches"]:
+                for key, result, err in apis[name].results(b["id"]):
+                    if result is None:
+                        errors[key] = err
+                        continue
+                    fresh[key] = result
+                    if cache:
+                        cache.put(key, name, p["path"].split(":", 1)[1], result)
+            s = stats[name] = {"ok": 0, "cached": 0, "risk": 0, "errors": 0}
+            for sid, key in zip(state["ids"], p["keys"]):
+                rec: Dict[str, Any] = {"id": sid, "provider": name}
+                result, cached = fresh.get(key), False
+                if result is None and key not in errors and cache:
+                    result = cache.get(key)   # was cached at submit time, so never sent
+                    cached = result is not None
+                if result is None:
+                    rec["error"] = errors.get(key, "no result returned (batch expired, cancelled or failed)")
+                    s["errors"] += 1
+                else:
+                    rec.update(result=result[1], raw=result[0])
+                    s["ok"] += 1
+                    s["cached"] += cached
+                    s["risk"] += result[1]["risk"] == "risk"
+                if cached:
+                    rec["cached"] = True
+                rec.update(attempts=0, batch=state["job"])
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    state.update(status="collected", collected=str(dst), stats=stats)
+    _save(state)
+    print(f"Collected job {state['job']}: {stats['snippets']} snippets. Results in {dst}")
+    for name in state["providers"]:
+        s = stats[name]
+        print(f"  {name}: {s['ok']} ok ({s['cached']} from cache, {s['risk']} risk), {s['errors']} errors")
+    return stats
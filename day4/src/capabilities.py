@@ -0,0 +1,140 @@
+"""Which endpoint/model works for this API key, remembered across runs.
+
+A provider can reach a model through several paths (OpenAI: the Responses
+API with gpt-5, then Chat Completions with gpt-4o-mini). Each path has a
+circuit breaker, kept per API key (by fingerprint, never the key itself) in
+`day4.capabilities.json`:
+
+  closed     the path is tried in its normal order
+  open       skipped until `retry_at`: the API said the path can't work
+             (a 400/404/422 naming an unsupported parameter or unknown
+             model; for a day), or it kept failing transiently (5 in a row;
+             for a minute). Any other 4xx fails only that one request.
+  half-open  once `retry_at` passes, the next call tries it again; success
+             closes it, failure re-opens it
+
+So once the preferred path is known not to work, calls go straight to the
+one that does instead of paying a failed round trip each time. Every call
+also updates the path's success/failure counts and average latency.
+
+  python -m src.capabilities            show what is recorded
+  python -m src.capabilities --probe    try every OpenAI path once now
+"""
+from __future__ import annotations
+import hashlib, json, os, time
+from typing import Any, Dict, List
+from .utils import ROOT
+
+STORE = ROOT / "day4.capabilities.json"
+REJECTED_COOLDOWN = 24 * 3600   # seconds a path stays open after the API rejected the request
+TRANSIENT_COOLDOWN = 60         # ...after TRANSIENT_LIMIT transient failures in a row
+TRANSIENT_LIMIT = 5
+SAVE_EVERY = 5.0                # seconds between saves of plain stats (state changes save at once)
+# What a 400/404/422 must carry to count as "this path can't work" rather than "this request was bad"
+CAPABILITY_CODES = {"unsupported_parameter", "unsupported_value", "model_not_found"}
+CAPABILITY_MESSAGES = ("unsupported parameter", "unsupported value", "not supported with this model",
+                       "does not support", "model_not_found", "does not exist or you do not have access")
+
+def fingerprint(api_key: str | None) -> str:
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+
+def bad_request(e: Exception) -> bool:
+    return getattr(e, "status_code", None) in (400, 404, 422)
+
+def rejected(e: Exception) -> bool:
+    """The path is unsupported for this key (unknown model, unsupported parameter), judged by the
+    error code or message; not a rate limit, outage, auth problem or one malformed request."""
+    if not bad_request(e):
+        return False
+    code = str(getattr(e, "code", None) or "").lower()
+    message = str(getattr(e, "message", None) or e).lower()
+    return code in CAPABILITY_CODES or any(m in message for m in CAPABILITY_MESSAGES)
+
+def _load() -> Dict[str, Any]:
+    try:
+        return json.loads(STORE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+class Router:
+    """Orders a provider's paths for one API key and records how each call went."""
+
+    def __init__(self, provider: str, api_key: str | None, paths: List[str]):
+        self.key = f"{provider}:{fingerprint(api_key)}"
+        self.paths = paths
+        self.state = {p: {"ok": 0, "failed": 0, "streak": 0, "ms": None, "retry_at": 0.0, "last_error": None}
+                      for p in paths}
+        for p, rec in (_load().get(self.key) or {}).items():
+            if p in self.state:
+                self.state[p].update(rec)
+        self._saved = time.monotonic()
+
+    def plan(self) -> List[str]:
+        """Paths to try, in order: closed or half-open ones first, open ones only as a last resort."""
+        now = time.time()
+        ready = [p for p in self.paths if self.state[p]["retry_at"] <= now]
+        return ready + [p for p in self.paths if p not in ready]
+
+    def success(self, path: str, ms: float):
+        s = self.state[path]
+        reopened = s["retry_at"] > 0
+        s.update(ok=s["ok"] + 1, streak=0, retry_at=0.0)
+        s["ms"] = round(ms if s["ms"] is None else 0.9 * s["ms"] + 0.1 * ms, 1)   # moving average
+        self.save(force=reopened)
+
+    def failure(self, path: str, e: Exception):
+        s = self.state[path]
+        s.update(failed=s["failed"] + 1, last_error=f"{type(e).__name__}: {e}"[:300])
+        opened = False
+        if rejected(e):
+            s["retry_at"], opened = time.time() + REJECTED_COOLDOWN, True
+        elif not bad_request(e):   # another 4xx says nothing about the path, only this request
+            s["streak"] += 1
+            if s["streak"] >= TRANSIENT_LIMIT:
+                s["retry_at"], opened = time.time() + TRANSIENT_COOLDOWN, True
+        self.save(force=opened)
+
+    def save(self, force: bool = False):
+        if not force and time.monotonic() - self._saved < SAVE_EVERY:
+            return
+        data = _load()   # other keys / providers may have been saved by other processes
+        data[self.key] = self.state
+        tmp = STORE.with_name(STORE.name + f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        os.replace(tmp, STORE)
+        self._saved = time.monotonic()
+
+_routers: Dict[str, Router] = {}
+
+def router(provider: str, api_key: str | None, paths: List[str]) -> Router:
+    """The process-wide Router for this provider and key (shared by concurrent batch workers)."""
+    key = f"{provider}:{fingerprint(api_key)}"
+    if key not in _routers:
+        _routers[key] = Router(provider, api_key, paths)
+    return _routers[key]
+
+def save_all():
+    for r in _routers.values():
+        r.save(force=True)
+
+def show():
+    data = _load()
+    if not data:
+        print(f"No capabilities recorded yet ({STORE.name}).")
+    now = time.time()
+    for key, paths in data.items():
+        print(key)
+        for p, s in paths.items():
+            state = "closed" if s["retry_at"] <= now else f"open for {int(s['retry_at'] - now)}s"
+            err = f"  last error: {s['last_error']}" if s["last_error"] and s["retry_at"] > now else ""
+            print(f"  {p:28s} {state:18s} ok {s['ok']:6d}  failed {s['failed']:6d}  avg {s['ms'] or '-'} ms{err}")
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Show (or probe) the recorded provider capabilities")
+    ap.add_argument("--probe", action="store_true", help="call every OpenAI path once and record the outcome")
+    args = ap.parse_args()
+    if args.probe:
+        from .openai_call import probe
+        probe()
+    show()
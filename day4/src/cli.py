@@ -1,17 +1,56 @@
-
 from __future__ import annotations
 import argparse, pathlib
-from .openai_call import analyze_with_openai
-from .anthropic_call import analyze_with_anthropic
 
 def main():
     ap = argparse.ArgumentParser(description="Day 4: Call OpenAI/Anthropic and save normalized outputs.")
-    ap.add_argument("--provider", choices=["openai", "anthropic"], required=True, help="Which API to call")
-    ap.add_argument("--file", required=True, help="Path to a text file containing the policy snippet")
+    ap.add_argument("--provider", choices=["openai", "anthropic"], help="Which API to call")
+    ap.add_argument("--file", help="Path to a text file containing the policy snippet")
+    ap.add_argument("--batch", metavar="PATH", help="Batch mode: a folder of .txt snippets or a JSONL file")
+    ap.add_argument("--batch-submit", metavar="PATH",
+                    help="Like --batch, but as provider batch jobs (half price, results within 24h)")
+    ap.add_argument("--batch-collect", metavar="JOB", nargs="?", const="latest",
+                    help="Fetch a submitted job's results once it has ended (default: the latest job)")
+    ap.add_argument("--wait", action="store_true", help="--batch-collect: poll until the job has ended")
+    ap.add_argument("--providers", nargs="+", choices=["openai", "anthropic"], default=["openai", "anthropic"],
+                    help="--batch/--batch-submit: providers to send every snippet to")
+    ap.add_argument("--out", help="--batch/--batch-collect: output JSONL (default: outputs/batch_<name>.jsonl)")
+    ap.add_argument("--openai-concurrency", type=int, help="--batch: max OpenAI requests in flight (default: 16)")
+    ap.add_argument("--anthropic-concurrency", type=int, help="--batch: max Anthropic requests in flight (default: 8)")
+    ap.add_argument("--no-cache", action="store_true", help="call the API even for snippets analyzed before")
+    ap.add_argument("--retries", type=int, default=5, help="--batch: retries on rate limits / timeouts / 5xx")
+    ap.add_argument("--trace", metavar="JSONL", help="append timed spans (and the counters at exit) to this file")
+    ap.add_argument("--metrics", metavar="PATH", help="write counters in Prometheus text format here at exit")
     args = ap.parse_args()
+    if args.trace or args.metrics:
+        from . import tracing
+        tracing.enable(args.trace and pathlib.Path(args.trace), args.metrics and pathlib.Path(args.metrics))
+    if args.no_cache:
+        from . import response_cache
+        response_cache.ENABLED = False
+
+    if args.batch_submit:
+        from .batch_jobs import submit
+        submit(args.batch_submit, args.providers, args.out)
+        return
+    if args.batch_collect:
+        from .batch_jobs import collect
+        collect(args.batch_collect, args.wait, args.out)
+        return
+    if args.batch:
+        from .batch import analyze_batch
+        concurrency = {"openai": args.openai_concurrency, "anthropic": args.anthropic_concurrency}
+        analyze_batch(args.batch, args.providers, args.out, concurrency, args.retries)
+        return
+    if not (args.provider and args.file):
+        ap.error("--provider and --file are required (or use --batch / --batch-submit / --batch-collect)")
 
     snippet = pathlib.Path(args.file).read_text(encoding="utf-8")
-    result = analyze_with_openai(snippet) if args.provider == "openai" else analyze_with_anthropic(snippet)
+    # Provider modules are imported per path, so --help and usage errors don't load them
+    if args.provider == "openai":
+        from .openai_call import analyze_with_openai as analyze
+    else:
+        from .anthropic_call import analyze_with_anthropic as analyze
+    result = analyze(snippet)
     print(result)
 
 if __name__ == "__main__":
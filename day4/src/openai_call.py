@@ -1,48 +1,165 @@
-
 from __future__ import annotations
-import os
-from typing import Dict, Any
-from .utils import load_env, write_text, write_json, coerce_json, normalize_contract, PROMPT_TEMPLATE
+import os, time
+from typing import Dict, Any, Tuple
+from . import capabilities, response_cache, tracing
+from .utils import load_env, log_result, coerce_json, normalize_contract, PROMPT_TEMPLATE
 
-def analyze_with_openai(snippet: str) -> Dict[str, Any]:
-    load_env()
+MODEL = "gpt-5"                 # Responses API
+FALLBACK_MODEL = "gpt-4o-mini"  # Chat Completions, if the Responses call fails
+
+def _sdk():
     try:
-        from openai import OpenAI
+        import openai
     except Exception as e:
         raise RuntimeError("OpenAI SDK not installed. Run: pip install openai") from e
+    return openai
 
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+def _responses_request(snippet: str) -> Dict[str, Any]:
     prompt = PROMPT_TEMPLATE.replace("{snippet}", snippet)
+    return dict(model=MODEL, input=[{"role": "user", "content": prompt}], temperature=0.2)
 
-    text_out = None
+def _chat_request(snippet: str) -> Dict[str, Any]:
+    prompt = PROMPT_TEMPLATE.replace("{snippet}", snippet)
+    return dict(
+        model=FALLBACK_MODEL,
+        messages=[
+            {"role": "system", "content": "Return strictly formatted JSON only."},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0.2,
+    )
+
+def _responses_text(resp) -> str | None:
     try:
-        resp = client.responses.create(
-            model="gpt-5",
-            input=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-        )
-        try:
-            text_out = resp.output[0].content[0].text
-        except Exception:
-            text_out = getattr(resp, "output_text", None)
+        return resp.output[0].content[0].text
     except Exception:
-        try:
-            resp = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "Return strictly formatted JSON only."},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.2,
-            )
-            text_out = resp.choices[0].message.content
-        except Exception as e:
-            raise RuntimeError(f"OpenAI call failed: {e}")
+        return getattr(resp, "output_text", None)
+
+def _chat_text(resp) -> str | None:
+    return resp.choices[0].message.content
+
+# Paths in order of preference; capabilities.Router skips the ones known not to work for this key
+PATHS = [f"responses:{MODEL}", f"chat:{FALLBACK_MODEL}"]
+
+def _responses_body_text(body: Dict[str, Any]) -> str | None:
+    # Raw JSON body (batch results), where the SDK's output_text helper doesn't exist
+    parts = [c.get("text", "") for item in body.get("output") or [] if item.get("type") == "message"
+             for c in item.get("content") or [] if c.get("type") == "output_text"]
+    return "".join(parts) or None
+
+def _chat_body_text(body: Dict[str, Any]) -> str | None:
+    return ((body.get("choices") or [{}])[0].get("message") or {}).get("content")
+
+# Batch API endpoint, request builder and body reader for each path
+BATCH_PATHS = {
+    PATHS[0]: ("/v1/responses", _responses_request, _responses_body_text),
+    PATHS[1]: ("/v1/chat/completions", _chat_request, _chat_body_text),
+}
+
+def openai_client():
+    with tracing.span("get_client", provider="openai"):
+        load_env()
+        return _sdk().OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def _endpoints(client) -> Dict[str, tuple]:
+    return {
+        PATHS[0]: (client.responses.create, _responses_request, _responses_text),
+        PATHS[1]: (client.chat.completions.create, _chat_request, _chat_text),
+    }
 
+def _finish(text_out: str | None) -> Tuple[str, Dict[str, Any]]:
     if not text_out:
         raise RuntimeError("No text returned by OpenAI API")
+    return text_out, normalize_contract(coerce_json(text_out))
 
-    write_text("openai", text_out)
-    obj = normalize_contract(coerce_json(text_out))
-    write_json("openai", obj)
+def _complete(client, snippet: str) -> Tuple[str, Dict[str, Any]]:
+    router = capabilities.router("openai", client.api_key, PATHS)
+    cache = response_cache.cache()
+    endpoints, err = _endpoints(client), None
+    for path in router.plan():
+        create, request, text = endpoints[path]
+        req = request(snippet)
+        key = response_cache.request_key("openai", req)
+        hit = cache.get(key) if cache else None
+        if hit is not None:
+            return hit
+        t0 = time.perf_counter()
+        try:
+            with tracing.span("completion", path=path):
+                resp = create(**req)
+        except Exception as e:
+            router.failure(path, e)
+            err = e
+            continue
+        router.success(path, (time.perf_counter() - t0) * 1000)
+        tracing.usage("openai", req["model"], resp)
+        result = _finish(text(resp))
+        if cache:
+            cache.put(key, "openai", req["model"], result)
+        return result
+    raise RuntimeError(f"OpenAI call failed: {err}")
+
+def analyze_with_openai(snippet: str) -> Dict[str, Any]:
+    with tracing.span("analyze_with_openai"):
+        client = openai_client()
+        try:
+            text_out, obj = _complete(client, snippet)
+        finally:
+            capabilities.save_all()
+    log_result("openai", text_out, obj)
     return obj
+
+def probe():
+    """Call every path once with a tiny snippet, whatever its breaker says, and record the outcome."""
+    client = openai_client()
+    router = capabilities.router("openai", client.api_key, PATHS)
+    for path, (create, request, _) in _endpoints(client).items():
+        t0 = time.perf_counter()
+        try:
+            create(**request("Pilot to extend clinic hours. Budget approved."))
+            router.success(path, (time.perf_counter() - t0) * 1000)
+            print(f"{path}: ok")
+        except Exception as e:
+            router.failure(path, e)
+            print(f"{path}: {type(e).__name__}: {e}")
+    capabilities.save_all()
+
+def async_openai_client():
+    """Pooled AsyncOpenAI client for batch mode (retries are done by the caller)."""
+    load_env()
+    return _sdk().AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+async def analyze_with_openai_async(client, snippet: str, call) -> Tuple[str, Dict[str, Any]]:
+    """Same as analyze_with_openai on an async client; `call` wraps each request (retries).
+    Returns the raw text and the normalized result."""
+    router = capabilities.router("openai", client.api_key, PATHS)
+    cache = response_cache.cache()
+    endpoints, err = _endpoints(client), None
+    for path in router.plan():
+        create, request, text = endpoints[path]
+        req = request(snippet)
+        key = response_cache.request_key("openai", req)
+        hit = cache.get(key) if cache else None
+        if hit is not None:
+            return hit
+
+        async def fetch():
+            t0 = time.perf_counter()
+            try:
+                with tracing.span("completion", path=path):
+                    resp = await call(create, **req)
+            except Exception as e:
+                router.failure(path, e)
+                raise
+            router.success(path, (time.perf_counter() - t0) * 1000)
+            tracing.usage("openai", req["model"], resp)
+            result = _finish(text(resp))
+            if cache:
+                cache.put(key, "openai", req["model"], result)
+            return result
+
+        try:
+            return await (cache.once(key, fetch) if cache else fetch())
+        except Exception as e:
+            err = e
+    raise RuntimeError(f"OpenAI call failed: {err}")
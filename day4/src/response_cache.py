@@ -0,0 +1,96 @@
+"""Disk-backed cache of day4 model responses (SQLite).
+
+Rows are keyed on the provider plus a hash of the exact request sent: model,
+prompt (PROMPT_TEMPLATE filled with the snippet), temperature and the other
+parameters. So a re-run only calls the API for snippets that changed, and
+editing the template or switching model misses the cache as it should. Each
+row keeps the raw model text and the normalized contract.
+
+In batch mode, identical requests that are in flight at the same time share
+one API call: the first caller makes it, the others await its result.
+"""
+from __future__ import annotations
+import hashlib, json, sqlite3, time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Tuple
+from . import tracing
+from .utils import ROOT
+
+if TYPE_CHECKING:
+    import asyncio   # imported for real inside once(), only batch mode needs it
+
+CACHE_PATH = ROOT / "day4.respcache.sqlite"
+ENABLED = True   # cli --no-cache turns it off for the run
+
+Result = Tuple[str, Dict[str, Any]]   # (raw text, normalized contract)
+
+def request_key(provider: str, request: Dict[str, Any]) -> str:
+    blob = json.dumps([provider, request], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH):
+        self.hits = self.misses = self.shared = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, provider TEXT NOT NULL, model TEXT, raw TEXT NOT NULL,"
+            " result TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def close(self):
+        self.db.close()
+
+    def get(self, key: str) -> Result | None:
+        row = self.db.execute("SELECT raw, result FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            tracing.count("cache_misses", cache="response")
+            return None
+        self.hits += 1
+        tracing.count("cache_hits", cache="response")
+        return row[0], json.loads(row[1])
+
+    def put(self, key: str, provider: str, model: str | None, result: Result):
+        raw, obj = result
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, raw, result, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, provider, model, raw, json.dumps(obj, ensure_ascii=False), time.time()),
+            )
+
+    async def once(self, key: str, fetch: Callable[[], Awaitable[Result]]) -> Result:
+        """Run fetch() unless the same key is already being fetched; then await that call instead."""
+        import asyncio   # batch mode only; the one-off CLI path doesn't need it
+        if key in self._inflight:
+            self.shared += 1
+            tracing.count("cache_hits", cache="inflight")
+            return await asyncio.shield(self._inflight[key])
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()   # mark retrieved: nobody else may be waiting
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+_cache: ResponseCache | None = None
+
+def cache() -> ResponseCache | None:
+    """The process-wide cache, or None when disabled."""
+    global _cache
+    if not ENABLED:
+        return None
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
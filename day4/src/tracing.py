@@ -0,0 +1,18 @@
+"""Spans, counters and token/cost accounting: the shared implementation in common/tracing.py.
+
+  python -m src.tracing outputs/trace.jsonl                  # count, p50/p95/max and total ms per span
+  python -m src.tracing outputs/trace.jsonl --trace-id 3f2a  # one run's spans as a tree
+"""
+import sys
+from pathlib import Path
+
+_REPO = str(Path(__file__).resolve().parents[2])   # the repo root, which holds common/
+if _REPO not in sys.path:
+    sys.path.append(_REPO)
+from common.tracing import (count, enable, enabled, main, prometheus_text, report, span,   # noqa: E402
+                            tokens, tree, usage)
+
+__all__ = ["count", "enable", "enabled", "prometheus_text", "report", "span", "tokens", "tree", "usage"]
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,21 @@
 
 from __future__ import annotations
-import os, json, re, time, pathlib
+import os, json, re, pathlib
 from typing import Dict, Any
-from dotenv import load_dotenv
+from .results_log import append
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
 OUT = ROOT / "outputs"
 OUT.mkdir(parents=True, exist_ok=True)
+RESULTS_LOG = OUT / "results.jsonl"   # append-only, one record per call (see results_log)
 
 def load_env():
+    from dotenv import load_dotenv
     load_dotenv(dotenv_path=ROOT / ".env")
 
-def timestamp(prefix: str) -> str:
-    return time.strftime(f"%Y%m%d_%H%M%S_{prefix}")
-
-def write_text(prefix: str, text: str) -> str:
-    p = OUT / f"{timestamp(prefix)}.txt"
-    p.write_text(text, encoding="utf-8")
-    return str(p)
-
-def write_json(prefix: str, obj: Dict[str, Any]) -> str:
-    p = OUT / f"{timestamp(prefix)}.json"
-    p.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
-    return str(p)
+def log_result(provider: str, raw: str, obj: Dict[str, Any]) -> str:
+    """Append the raw model text and its normalized result to the log; returns the record id."""
+    return append(RESULTS_LOG, {"kind": provider, "raw": raw, "result": obj})
 
 def coerce_json(text: str) -> Dict[str, Any]:
     text = text.strip()
@@ -1,15 +1,27 @@
+from __future__ import annotations
 import argparse, os, json, hashlib
 from pathlib import Path
-from dotenv import load_dotenv
-from openai import OpenAI
-import numpy as np
-from sklearn.neighbors import NearestNeighbors
+from typing import TYPE_CHECKING
+import tracing
+
+# openai, numpy and dotenv are imported inside the functions that use them,
+# so --help and argument errors start instantly (see scripts/bench_startup.py)
+if TYPE_CHECKING:
+    import numpy as np
+    from openai import OpenAI
 
 # ---- Config & helpers --------------------------------------------------------
 ROOT = Path(__file__).resolve().parent.parent
 ENV = ROOT / ".env"
 OUT_DIR = ROOT / "outputs"
-INDEX_EMB = ROOT / "day5.embeddings.npz"   # vectors + metadata
+RESULTS_LOG = OUT_DIR / "answers.jsonl"   # append-only answer history, see results_log
+INDEX_VEC = ROOT / "day5.vectors.npy"      # normalized float32, memory-mappable
+INDEX_META = ROOT / "day5.docs.npz"        # sources / ids
+INDEX_INFO = ROOT / "day5.nn.json"         # sidecar: how to open the index
+EMB_CACHE = ROOT / "day5.embcache.sqlite"  # (model, text hash) -> vector
+EMBED_MODEL = "text-embedding-3-small"
+CHAT_MODEL = "gpt-4.1-mini"
+EMBED_WORKERS = 4  # embedding requests in flight during ingest
 K = 3  # top-k neighbors
 
 def _hash(text: str) -> str:
@@ -17,35 +29,47 @@ def _hash(text: str) -> str:
 
 # ---- Embeddings --------------------------------------------------------------
 def get_client():
-    load_dotenv(ENV, override=True)
-    key = os.getenv("OPENAI_API_KEY")
-    project = os.getenv("OPENAI_PROJECT")
-
-    if not key:
-        raise RuntimeError("Missing OPENAI_API_KEY in .env")
-
-    if key.startswith("sk-proj-"):
-        if not project:
-            raise RuntimeError(
-                "You are using a project key (sk-proj-...), but OPENAI_PROJECT is missing in .env"
-            )
-        return OpenAI(api_key=key, project=project)
-
-    # fallback for classic sk- keys
-    return OpenAI(api_key=key)
+    with tracing.span("get_client"):
+        from dotenv import load_dotenv
+        from openai import OpenAI
+        load_dotenv(ENV, override=True)
+        key = os.getenv("OPENAI_API_KEY")
+        project = os.getenv("OPENAI_PROJECT")
+
+        if not key:
+            raise RuntimeError("Missing OPENAI_API_KEY in .env")
+
+        if key.startswith("sk-proj-"):
+            if not project:
+                raise RuntimeError(
+                    "You are using a project key (sk-proj-...), but OPENAI_PROJECT is missing in .env"
+                )
+            return OpenAI(api_key=key, project=project)
+
+        # fallback for classic sk- keys
+        return OpenAI(api_key=key)
 
 def embed_texts(client: OpenAI, texts: list[str]) -> np.ndarray:
-    # Batch safely (OpenAI supports batching; keep simple here)
-    embs = []
-    B = 64
-    for i in range(0, len(texts), B):
-        chunk = texts[i:i+B]
-        resp = client.embeddings.create(model="text-embedding-3-small", input=chunk)
-        embs.extend([d.embedding for d in resp.data])
-    return np.array(embs, dtype="float32")
+    # Token-packed batches, a few requests in flight, shared backoff on 429s (same as day6)
+    from embedder import Embedder
+    with tracing.span("embed_texts", texts=len(texts)) as span:
+        embedder = Embedder(client, EMBED_MODEL, workers=EMBED_WORKERS)
+        X = embedder.embed(texts)
+        span.set(tokens=embedder.tokens, requests=embedder.requests, retries=embedder.retries)
+    return X
+
+def embed_cached(client: OpenAI, texts: list[str]) -> np.ndarray:
+    # Content-addressed: unchanged docs are read back from disk, only new ones hit the API
+    from embed_cache import EmbeddingCache
+    with EmbeddingCache(EMB_CACHE, EMBED_MODEL) as cache:
+        X = cache.embed(texts, lambda todo: embed_texts(client, todo))
+    print(f"Embeddings: {cache.hits} cached, {cache.misses} new")
+    return X
 
 # ---- Ingest ------------------------------------------------------------------
 def ingest(docs_path: str):
+    import numpy as np
+    from vectors import normalize
     client = get_client()
     docs_dir = Path(docs_path)
     if not docs_dir.exists():
@@ -60,78 +84,92 @@ def ingest(docs_path: str):
         texts.append(txt)
         sources.append(str(p))
         ids.append(_hash(str(p)))
+    if tracing.enabled():
+        tracing.count("bytes_read", sum(len(t.encode("utf-8")) for t in texts), what="docs")
 
     if not texts:
         print("No .txt files found to ingest.")
         return
 
-    X = embed_texts(client, texts)
-    # Use cosine distance via brute-force KNN (CPU-friendly for small libs)
-    nn = NearestNeighbors(metric="cosine", algorithm="brute")
-    nn.fit(X)
+    X = normalize(embed_cached(client, texts))
 
-    # Save everything compactly
+    # Save vectors uncompressed so --ask can memory-map them (no refit needed)
     OUT_DIR.mkdir(exist_ok=True)
-    np.savez_compressed(
-        INDEX_EMB,
-        X=X,
+    np.save(INDEX_VEC, X)
+    np.savez(
+        INDEX_META,
         sources=np.array(sources, dtype=object),
         ids=np.array(ids, dtype=object)
     )
-    (ROOT / "day5.nn.json").write_text(json.dumps({"metric": "cosine", "algo": "brute"}))
-    print(f"Ingested {len(texts)} docs. Saved vectors to {INDEX_EMB.name}")
+    INDEX_INFO.write_text(json.dumps({
+        "metric": "cosine", "algo": "brute", "normalized": True, "dtype": "float32",
+        "vectors": INDEX_VEC.name, "meta": INDEX_META.name,
+        "count": int(X.shape[0]), "dim": int(X.shape[1]),
+    }))
+    print(f"Ingested {len(texts)} docs. Saved vectors to {INDEX_VEC.name}")
 
 # ---- Ask ---------------------------------------------------------------------
 def ask(question: str):
-    client = get_client()
-    if not INDEX_EMB.exists():
+    import numpy as np
+    import results_log
+    from embedder import embed_query
+    from vectors import search
+    if not INDEX_INFO.exists():
         raise FileNotFoundError("Vector file missing. Run --ingest first.")
 
-    data = np.load(INDEX_EMB, allow_pickle=True)
-    X = data["X"]
-    sources = list(map(str, data["sources"]))
-    # ids = list(map(str, data["ids"]))  # reserved if needed later
-
-    # Build a fresh neighbor model (fast for small X)
-    nn = NearestNeighbors(metric="cosine", algorithm="brute")
-    nn.fit(X)
-
-    q_emb = embed_texts(client, [question])
-    dist, idx = nn.kneighbors(q_emb, n_neighbors=min(K, len(sources)))
-    chosen_idx = idx[0].tolist()
-
-    picked_paths = [sources[i] for i in chosen_idx]
-    context = "\n\n---\n\n".join(Path(p).read_text(errors="ignore") for p in picked_paths)
-
-    # Compose the answer with citations
-    msg = [
-        {"role": "system", "content": "Answer using only the provided context. Add inline [citations] using file basenames."},
-        {"role": "user", "content": f"Question: {question}\n\nContext:\n{context}"}
-    ]
-    reply = client.chat.completions.create(
-        model="gpt-4.1-mini",
-        temperature=0.2,
-        messages=msg
-    ).choices[0].message.content
+    info = json.loads(INDEX_INFO.read_text())
+    if "vectors" not in info:
+        raise RuntimeError(f"{INDEX_INFO.name} is from an older index format. Re-run --ingest.")
+    with tracing.span("ask"):
+        client = get_client()
+        with tracing.span("load"):
+            X = np.load(ROOT / info["vectors"], mmap_mode="r")
+            sources = list(map(str, np.load(ROOT / info["meta"], allow_pickle=True)["sources"]))
+        # ids = ...["ids"]  # reserved if needed later
+
+        q_emb = embed_query(client, EMBED_MODEL, question)
+        with tracing.span("search", k=K, rows=len(X)):
+            chosen_idx, _ = search(X, q_emb, K)
+
+        picked_paths = [sources[i] for i in chosen_idx]
+        context = "\n\n---\n\n".join(Path(p).read_text(errors="ignore") for p in picked_paths)
+        tracing.count("bytes_read", len(context.encode("utf-8")), what="docs")
+
+        # Compose the answer with citations
+        msg = [
+            {"role": "system", "content": "Answer using only the provided context. Add inline [citations] using file basenames."},
+            {"role": "user", "content": f"Question: {question}\n\nContext:\n{context}"}
+        ]
+        with tracing.span("completion", model=CHAT_MODEL):
+            chat = client.chat.completions.create(
+                model=CHAT_MODEL,
+                temperature=0.2,
+                messages=msg
+            )
+        tracing.usage("openai", CHAT_MODEL, chat)
+        reply = chat.choices[0].message.content
 
-    OUT_DIR.mkdir(exist_ok=True)
     out = {
+        "kind": "ask",
         "question": question,
         "answer": reply,
         "sources": picked_paths
     }
-    out_file = OUT_DIR / f"qa_{len(list(OUT_DIR.glob('qa_*.json')))}.json"
-    out_file.write_text(json.dumps(out, indent=2, ensure_ascii=False))
-    print("Answer saved to", out_file)
+    record_id = results_log.append(RESULTS_LOG, out)
+    print(f"Answer {record_id} logged to {RESULTS_LOG}")
 
 # ---- CLI ---------------------------------------------------------------------
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("--ingest", help="path to docs folder (txt files)")
     ap.add_argument("--ask", help='question string, e.g., --ask "What is X?"')
+    ap.add_argument("--trace", metavar="JSONL", help="append timed spans (and the counters at exit) to this file")
+    ap.add_argument("--metrics", metavar="PATH", help="write counters in Prometheus text format here at exit")
     args = ap.parse_args()
 
     ROOT.mkdir(exist_ok=True)
+    if args.trace or args.metrics:
+        tracing.enable(args.trace and Path(args.trace), args.metrics and Path(args.metrics))
     if args.ingest:
         ingest(args.ingest)
     elif args.ask:
@@ -0,0 +1,10 @@
+"""Cosine search over normalized vectors: the shared implementation in common/vectors.py."""
+import sys
+from pathlib import Path
+
+_REPO = str(Path(__file__).resolve().parents[2])   # the repo root, which holds common/
+if _REPO not in sys.path:
+    sys.path.append(_REPO)
+from common.vectors import normalize, search, top_k   # noqa: E402
+
+__all__ = ["normalize", "search", "top_k"]
@@ -0,0 +1,175 @@
+"""Approximate nearest-neighbour search for day6 segments (IVF, pure NumPy).
+
+The manifest's "algo" picks the backend: "brute" scores every row, "ivf"
+clusters each segment's vectors with spherical k-means and, at query time,
+scores only the rows in the `nprobe` clusters closest to the query. More
+probes means better recall and slower queries; nprobe == nlist is exact.
+
+Each segment's structure is its centroids in `{segment}.ivf.npz`, plus the row
+ids grouped by cluster (`.ivf.rows.npy`) and each cluster's start offset
+(`.ivf.starts.npy`), memory-mapped so a probe reads only its clusters. Segments
+smaller than MIN_ROWS stay brute force; scanning them is already cheap.
+
+Recall/latency report for the current index:  python src/ann.py --nprobe 1 4 16
+"""
+import os
+from pathlib import Path
+import numpy as np
+
+ALGOS = ("brute", "ivf")
+MIN_ROWS = 10_000     # smaller segments are searched exactly
+NPROBE = 8            # default clusters probed per query
+KMEANS_ITERS = 10
+TRAIN_PER_LIST = 64   # k-means trains on at most this many sampled rows per cluster
+BLOCK = 16_384        # rows assigned to clusters per step
+
+def auto_nlist(n: int) -> int:
+    # ~4*sqrt(N) clusters, with at least ~39 training rows per cluster
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+def _assign(X: np.ndarray, C: np.ndarray) -> np.ndarray:
+    out = np.empty(len(X), dtype="int32")
+    for s in range(0, len(X), BLOCK):
+        out[s:s + BLOCK] = np.argmax(np.asarray(X[s:s + BLOCK]) @ C.T, axis=1)
+    return out
+
+def kmeans(X: np.ndarray, nlist: int, iters: int = KMEANS_ITERS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of X (rows L2-normalized). Returns (nlist, D) centroids."""
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(len(X), size=min(len(X), nlist * TRAIN_PER_LIST), replace=False))
+    T = np.asarray(X[sample], dtype="float32")
+    C = T[rng.choice(len(T), size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        labels = _assign(T, C)
+        counts = np.bincount(labels, minlength=nlist)
+        order = np.argsort(labels, kind="stable")
+        sums = np.zeros_like(C)
+        full = counts > 0
+        sums[full] = np.add.reduceat(T[order], np.cumsum(counts)[full] - counts[full])
+        empty = ~full
+        sums[empty] = T[rng.choice(len(T), size=int(empty.sum()))]   # re-seed empty clusters
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        C = sums / np.where(norms == 0, 1, norms)
+    return C.astype("float32")
+
+def ivf_path(seg_dir: Path, name: str, part: str = "npz") -> Path:
+    """The segment's centroids (part "npz"), or its "rows" / "starts" array."""
+    return seg_dir / (f"{name}.ivf.npz" if part == "npz" else f"{name}.ivf.{part}.npy")
+
+def build_ivf(seg_dir: Path, name: str, params: dict) -> dict | None:
+    """Cluster a finished segment and write its .ivf files. Returns the manifest entry,
+    or None if the segment is small enough to stay brute force."""
+    X = np.load(seg_dir / f"{name}.vectors.npy", mmap_mode="r")
+    if len(X) < MIN_ROWS:
+        return None
+    nlist = min(params.get("nlist") or auto_nlist(len(X)), len(X))
+    C = kmeans(X, nlist, params.get("iters") or KMEANS_ITERS)
+    labels = _assign(X, C)
+    rows = np.argsort(labels, kind="stable").astype("int32")   # row ids grouped by cluster, ascending within
+    starts = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))]).astype("int64")
+    for part, arr in (("rows", rows), ("starts", starts)):
+        tmp = seg_dir / f"{name}.ivf.tmp.{part}.npy"
+        np.save(tmp, arr)
+        os.replace(tmp, ivf_path(seg_dir, name, part))   # readers see the old or the new file, never half of one
+    tmp = seg_dir / f"{name}.ivf.tmp.npz"
+    np.savez(tmp, centroids=C)
+    os.replace(tmp, ivf_path(seg_dir, name))
+    return {"nlist": int(nlist)}
+
+def delete_files(seg_dir: Path, name: str):
+    for part in ("npz", "rows", "starts"):
+        try:
+            ivf_path(seg_dir, name, part).unlink()
+        except OSError:
+            pass   # already gone, or still mapped by a reader on Windows
+
+class IVF:
+    """Searches one segment through its clusters."""
+
+    def __init__(self, seg_dir: Path, name: str):
+        with np.load(ivf_path(seg_dir, name)) as f:
+            arrays = {k: f[k] for k in f.files}
+        self.centroids = arrays["centroids"]
+        self.rows, self.starts = (   # older indexes kept everything in the .npz
+            arrays[part] if part in arrays else np.load(ivf_path(seg_dir, name, part), mmap_mode="r")
+            for part in ("rows", "starts"))
+
+    def search(self, scorer, Q: np.ndarray, Qp: np.ndarray, k: int, alive: np.ndarray | None, nprobe: int, top_k):
+        """(B, k) row ids and scores; -inf scores (and row -1) where fewer than k rows were seen.
+
+        Clusters are picked with the float32 query Q; rows are scored by
+        `scorer` (see quant) with its prepared query Qp.
+        """
+        B = len(Q)
+        best_idx = np.full((B, k), -1, dtype="int64")
+        best = np.full((B, k), -np.inf, dtype="float32")
+        probe, _ = top_k(Q @ self.centroids.T, nprobe)
+        if B <= len(np.unique(probe)):
+            # Few queries: gather each query's probed rows and score them in one product
+            for b, lists in enumerate(probe):
+                rows = np.sort(np.concatenate([self.rows[self.starts[c]:self.starts[c + 1]] for c in lists]))
+                if alive is not None:
+                    rows = rows[alive[rows]]
+                idx, scores = top_k(scorer.score(Qp[b:b + 1], rows), k)
+                n = idx.shape[1]
+                best_idx[b, :n], best[b, :n] = rows[idx[0]], scores[0]
+            return best_idx, best
+        # Many queries: group (query, cluster) pairs by cluster so each cluster's rows are read once
+        order = np.argsort(probe, axis=None, kind="stable")
+        lists, queries = probe.ravel()[order], order // probe.shape[1]
+        cut = np.flatnonzero(np.diff(lists)) + 1
+        for group in np.split(np.arange(len(lists)), cut):
+            if not len(group):
+                continue
+            c = lists[group[0]]
+            rows = self.rows[self.starts[c]:self.starts[c + 1]]
+            if alive is not None:
+                rows = rows[alive[rows]]
+            if not len(rows):
+                continue
+            qs = queries[group]
+            idx, scores = top_k(scorer.score(Qp[qs], rows), k)
+            merged_idx = np.concatenate([best_idx[qs], rows[idx]], axis=1)
+            pick, merged = top_k(np.concatenate([best[qs], scores], axis=1), k)
+            best[qs] = merged
+            best_idx[qs] = np.take_along_axis(merged_idx, pick, axis=1)
+        return best_idx, best
+
+# ---- Benchmark ---------------------------------------------------------------
+def bench(info_path: Path, nprobes: list[int], k: int = 10, queries: int = 200, seed: int = 0):
+    """Recall@k and latency of the index's ANN search against exact search.
+
+    Queries are sampled stored vectors with a little noise, so no API calls.
+    """
+    import time
+    from vector_index import Index
+
+    index = Index(info_path)
+    X = np.concatenate([np.asarray(V[:min(len(V), 4 * queries)]) for V in index.vectors])
+    rng = np.random.default_rng(seed)
+    Q = X[rng.choice(len(X), size=min(queries, len(X)), replace=False)]
+    Q = Q + rng.normal(scale=0.05 / np.sqrt(Q.shape[1]), size=Q.shape).astype("float32")
+
+    def timed(**kw):
+        t0 = time.perf_counter()
+        idx, _ = index.search(Q, k, **kw)
+        return idx, (time.perf_counter() - t0) * 1000 / len(Q)
+
+    exact, ms = timed(exact=True)
+    print(f"{len(index)} rows, {len(index.names)} segments, algo {index.info.get('algo', 'brute')}, "
+          f"{len(Q)} queries, k={k}")
+    print(f"  exact       {ms:8.3f} ms/query  recall 1.000")
+    for nprobe in nprobes:
+        idx, ms = timed(nprobe=nprobe)
+        recall = np.mean([len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(idx.tolist(), exact.tolist())])
+        print(f"  nprobe {nprobe:4d} {ms:8.3f} ms/query  recall {recall:.3f}")
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Recall/latency of day6 ANN search vs exact search")
+    ap.add_argument("--index", default=str(Path(__file__).resolve().parent.parent / "day6.nn.json"))
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=200)
+    args = ap.parse_args()
+    bench(Path(args.index), args.nprobe, args.k, args.queries)
@@ -0,0 +1,140 @@
+"""Answer cache for day6 questions (SQLite).
+
+Answers are keyed on the normalized question (NFKC, case-folded, whitespace
+collapsed, trailing punctuation dropped) within a scope: the corpus version
+(see `vector_index.corpus_version`), the chat model, the retrieval mode,
+top-k and the search settings (algo/nprobe, code dtype/dims, rerank; see
+`day6_cli.cache_scope`). Ingesting changed documents changes the version, so a stale answer is
+never served; rows of other versions are purged when the cache is opened.
+
+With a `similarity` threshold, a question that misses exactly can still hit a
+cached near-duplicate: its embedding (needed for retrieval anyway) is compared
+with those of the cached questions in its scope, held in RAM as one matrix.
+
+Rows older than `ttl` seconds are dropped; beyond `max_entries` the least
+recently used go first.
+"""
+import hashlib, json, re, sqlite3, time, unicodedata
+from pathlib import Path
+import numpy as np
+import tracing
+
+TTL = 7 * 24 * 3600   # seconds an answer stays valid
+MAX_ENTRIES = 10_000
+EVICT_TO = 0.9        # when full, evict down to this share of max_entries (so we don't evict on every put)
+
+_SPACE = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?!.。？！]+$")
+
+def normalize_question(question: str) -> str:
+    text = _SPACE.sub(" ", unicodedata.normalize("NFKC", question).casefold()).strip()
+    return _TRAILING.sub("", text)
+
+def question_key(question: str) -> str:
+    return hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()
+
+class AnswerCache:
+    def __init__(self, path: Path, version: str, ttl: float = TTL, max_entries: int = MAX_ENTRIES,
+                 similarity: float | None = None):
+        self.version, self.ttl, self.max_entries, self.similarity = version, ttl, max_entries, similarity
+        self.hits = self.near_hits = self.misses = 0
+        self._vecs = {}   # scope -> (keys, (n, D) matrix) for similarity lookups
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " version TEXT NOT NULL, scope TEXT NOT NULL, key TEXT NOT NULL, question TEXT NOT NULL,"
+            " vec BLOB, result TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (version, scope, key))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS answers_used ON answers (used)")
+        with self.db:   # the corpus changed (or rows expired) since they were written
+            self.db.execute("DELETE FROM answers WHERE version != ? OR created < ?", (version, time.time() - ttl))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def _touch(self, scope: str, key: str) -> dict | None:
+        row = self.db.execute(
+            "SELECT result FROM answers WHERE version = ? AND scope = ? AND key = ? AND created >= ?",
+            (self.version, scope, key, time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        with self.db:
+            self.db.execute("UPDATE answers SET used = ?, hits = hits + 1 WHERE version = ? AND scope = ? AND key = ?",
+                            (time.time(), self.version, scope, key))
+        return json.loads(row[0])
+
+    def get(self, scope: str, question: str) -> dict | None:
+        """Cached result for this exact (normalized) question, or None. No embedding needed."""
+        result = self._touch(scope, question_key(question))
+        if result is not None:
+            self.hits += 1
+            tracing.count("cache_hits", cache="answer", match="exact")
+        return result
+
+    def nearest(self, scope: str, q_emb: np.ndarray) -> dict | None:
+        """Cached result of the most similar question if its cosine >= similarity, else None."""
+        if self.similarity is None:
+            self.misses += 1
+            tracing.count("cache_misses", cache="answer")
+            return None
+        if scope not in self._vecs:
+            rows = self.db.execute("SELECT key, vec FROM answers WHERE version = ? AND scope = ? AND vec IS NOT NULL",
+                                   (self.version, scope)).fetchall()
+            M = np.stack([np.frombuffer(v, dtype="float32") for _, v in rows]) if rows else np.zeros((0, len(q_emb)), "float32")
+            self._vecs[scope] = ([k for k, _ in rows], M)
+        keys, M = self._vecs[scope]
+        q = np.asarray(q_emb, dtype="float32")
+        if len(keys) and M.shape[1] == len(q):
+            sims = M @ (q / max(float(np.linalg.norm(q)), 1e-12))
+            best = int(np.argmax(sims))
+            if sims[best] >= self.similarity:
+                result = self._touch(scope, keys[best])
+                if result is not None:
+                    self.near_hits += 1
+                    tracing.count("cache_hits", cache="answer", match="similar")
+                    return result
+        self.misses += 1
+        tracing.count("cache_misses", cache="answer")
+        return None
+
+    def put(self, scope: str, question: str, q_emb: np.ndarray | None, result: dict):
+        key, now = question_key(question), time.time()
+        vec = None
+        if q_emb is not None:
+            q = np.asarray(q_emb, dtype="float32")
+            vec = (q / max(float(np.linalg.norm(q)), 1e-12)).astype("float32")
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO answers (version, scope, key, question, vec, result, created, used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.version, scope, key, question, None if vec is None else vec.tobytes(),
+                 json.dumps(result, ensure_ascii=False), now, now),
+            )
+        if vec is not None and scope in self._vecs:
+            keys, M = self._vecs[scope]
+            if key not in keys and M.shape[1] == len(vec):
+                self._vecs[scope] = (keys + [key], np.vstack([M, vec[None, :]]))
+        self._evict()
+
+    def _evict(self):
+        (n,) = self.db.execute("SELECT COUNT(*) FROM answers").fetchone()
+        if n <= self.max_entries:
+            return
+        with self.db:
+            self.db.execute(
+                "DELETE FROM answers WHERE rowid IN (SELECT rowid FROM answers ORDER BY used LIMIT ?)",
+                (n - int(self.max_entries * EVICT_TO),),
+            )
+        self._vecs.clear()   # reloaded on the next similarity lookup
+
+    def stats(self) -> str:
+        return f"answer cache: {self.hits} exact + {self.near_hits} similar hits, {self.misses} misses"
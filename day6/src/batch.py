@@ -0,0 +1,172 @@
+"""Batch question mode for day6 (`day6_cli.py --ask-file questions.jsonl`).
+
+Questions are read in blocks. For each block, all questions are embedded in
+token-packed requests (through the embedding cache, so a re-run costs no
+embed calls), and top-k is taken for the whole block in one matrix product
+per segment (fused with per-question BM25 hits on hybrid indexes).
+Completions then run concurrently on one pooled AsyncOpenAI client, at most
+`parallel` at a time. Each answer is written to the output JSONL as soon as
+it arrives, so the output is in completion order; `line` gives the
+question's position in the input. Questions already in the answer cache
+(exactly, or by embedding similarity when enabled) skip search and
+completion and are marked "cached".
+
+Input lines are {"question": "...", "id": ...} objects ("id" optional) or
+bare JSON strings.
+"""
+import asyncio, json, time
+from itertools import islice
+from pathlib import Path
+import numpy as np
+import day6_cli as cli
+import tracing
+from embed_cache import EmbeddingCache
+
+BLOCK = 1024              # questions embedded + searched together
+SEARCH_CELLS = 1 << 26    # max query x row scores per search call (~256 MB float32)
+
+def read_questions(path: Path):
+    """Yield (line number, id, question) for each non-empty line."""
+    with path.open(encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{n}: not valid JSON ({e})") from None
+            if isinstance(item, str):
+                item = {"question": item}
+            if not isinstance(item, dict) or not str(item.get("question", "")).strip():
+                raise ValueError(f"{path}:{n}: expected an object with a 'question' field")
+            yield n, item.get("id"), str(item["question"]).strip()
+
+def embed_questions(questions: list[str]) -> np.ndarray:
+    # Runs in a worker thread; SQLite connections can't cross threads, so open the cache here
+    client = cli.get_client()
+    with EmbeddingCache(cli.EMB_CACHE, cli.EMBED_MODEL) as cache:
+        return cache.embed(questions, lambda todo: cli.embed_texts(client, todo))
+
+def retrieve(index, Q: np.ndarray, questions: list[str], top_k: int) -> list[tuple[list[str], list[str], list[float]]]:
+    """(sources, chunks, scores) per query row, searching in row blocks that bound memory."""
+    rows = max(1, SEARCH_CELLS // max(len(index), 1))
+    out = []
+    with tracing.span("search", k=top_k, retrieval=index.retrieval, queries=len(Q)):
+        for s in range(0, len(Q), rows):
+            idx, scores = index.retrieve(Q[s:s + rows], questions[s:s + rows], top_k)
+            for ids, sc in zip(idx, scores):
+                ids = ids.tolist()
+                out.append(([index.source(i) for i in ids], [index.chunk(i) for i in ids], [round(x, 4) for x in sc.tolist()]))
+    if tracing.enabled():
+        tracing.count("bytes_read", sum(len(c.encode("utf-8")) for _, chunks, _ in out for c in chunks), what="chunks")
+    return out
+
+def prepare(index, block: list[tuple], top_k: int, cache: dict | None) -> list[dict]:
+    scope = cli.cache_scope(index, top_k)
+    answers = cli.open_answer_cache(index, cache)   # this thread's own connection
+    jobs, todo = [], []
+    for n, qid, question in block:
+        job = {"line": n, "id": qid, "question": question}
+        hit = answers.get(scope, question) if answers else None
+        if hit is not None:
+            job.update(hit, cached="exact")
+        else:
+            todo.append(job)
+        jobs.append(job)
+    if todo:
+        Q = embed_questions([job["question"] for job in todo])
+        fresh = []
+        for job, q in zip(todo, Q):
+            hit = answers.nearest(scope, q) if answers else None
+            if hit is not None:
+                job.update(hit, cached="similar")
+            else:
+                job["emb"] = q   # kept (not written) to cache the answer under
+                fresh.append(job)
+        if fresh:
+            hits = retrieve(index, np.stack([job["emb"] for job in fresh]), [job["question"] for job in fresh], top_k)
+            for job, (sources, chunks, scores) in zip(fresh, hits):
+                job.update(sources=sources, scores=scores, chunks=chunks)
+    if answers:
+        answers.close()
+    return jobs
+
+async def complete(client, job: dict) -> dict:
+    chunks = job.pop("chunks")
+    try:
+        with tracing.span("completion", model=cli.CHAT_MODEL):
+            chat = await client.chat.completions.create(
+                model=cli.CHAT_MODEL,
+                temperature=0.2,
+                messages=cli.build_messages(job["question"], chunks),
+            )
+        tracing.usage("openai", cli.CHAT_MODEL, chat)
+        job["answer"] = chat.choices[0].message.content
+    except Exception as e:   # one failed question shouldn't sink a 5,000-question run
+        job["error"] = f"{type(e).__name__}: {e}"
+    return job
+
+async def _run(questions_path: Path, out_path: Path, top_k: int, parallel: int, opts: dict | None,
+               cache: dict | None) -> dict:
+    index = cli.load_corpus(**(opts or {}))
+    answers = cli.open_answer_cache(index, cache)
+    scope = cli.cache_scope(index, top_k)
+    client = cli.get_async_client(max_connections=parallel).with_options(max_retries=6)
+    slots = asyncio.Semaphore(parallel)   # completions in flight (also bounds queued jobs)
+    tasks, stats = set(), {"questions": 0, "answered": 0, "cached": 0, "errors": 0}
+    it = read_questions(questions_path)
+    t0 = time.perf_counter()
+
+    def record(job):
+        emb = job.pop("emb", None)
+        if answers and emb is not None and "answer" in job:
+            answers.put(scope, job["question"], emb, {"answer": job["answer"], "sources": job["sources"]})
+        if job["id"] is None:
+            del job["id"]
+        out.write(json.dumps(job, ensure_ascii=False) + "\n")
+        out.flush()
+        stats["errors" if "error" in job else "answered"] += 1
+        stats["cached"] += "cached" in job
+
+    def write(task):
+        slots.release()
+        tasks.discard(task)
+        record(task.result())
+
+    with out_path.open("w", encoding="utf-8") as out:
+        block = list(islice(it, BLOCK))
+        nxt = asyncio.create_task(asyncio.to_thread(prepare, index, block, top_k, cache)) if block else None
+        while nxt is not None:
+            jobs = await nxt
+            # Embed + search the next block while this one's completions run
+            block = list(islice(it, BLOCK))
+            nxt = asyncio.create_task(asyncio.to_thread(prepare, index, block, top_k, cache)) if block else None
+            for job in jobs:
+                if "cached" in job:
+                    record(job)
+                    continue
+                await slots.acquire()
+                task = asyncio.create_task(complete(client, job))
+                task.add_done_callback(write)
+                tasks.add(task)
+            stats["questions"] += len(jobs)
+        while tasks:
+            await asyncio.wait(set(tasks))
+        await client.close()
+    if answers:
+        answers.close()
+
+    dt = time.perf_counter() - t0
+    stats.update(seconds=round(dt, 1), questions_per_s=round(stats["questions"] / max(dt, 1e-9), 2))
+    return stats
+
+def ask_file(questions_path: str, out_path: str | None = None, top_k: int = cli.K, parallel: int = 16,
+             opts: dict | None = None, cache: dict | None = None):
+    src = Path(questions_path)
+    cli.OUT_DIR.mkdir(exist_ok=True)
+    dst = Path(out_path) if out_path else cli.OUT_DIR / f"{src.stem}.answers.jsonl"
+    with tracing.span("ask_file", file=src.name):   # parent of every question's spans
+        stats = asyncio.run(_run(src, dst, top_k, parallel, opts, cache))
+    print(f"Answered {stats['answered']}/{stats['questions']} questions in {stats['seconds']}s "
+          f"({stats['questions_per_s']} q/s, {stats['cached']} from the answer cache, {stats['errors']} errors). "
+          f"Results in {dst}")
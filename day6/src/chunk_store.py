@@ -0,0 +1,104 @@
+"""Columnar chunk store for day6 segments.
+
+Each text column (source, id, chunk, doc) is one contiguous UTF-8 blob,
+`{segment}.{column}.bin`, and `{segment}.offsets.npy` holds an (N+1, columns)
+int64 array of byte offsets into those blobs. Reading row i of a column is
+two offset lookups and one slice of a memory-mapped file, so `ask` can fetch
+its top-k chunks without loading (or unpickling) the rest of the corpus.
+"""
+import io, mmap
+from pathlib import Path
+import numpy as np
+
+COLUMNS = ("source", "id", "chunk", "doc")
+
+def npy_header(dtype: str, shape: tuple) -> bytes:
+    f = io.BytesIO()
+    np.lib.format.write_array_header_1_0(f, {"descr": dtype, "fortran_order": False, "shape": shape})
+    return f.getvalue()
+
+class NpyAppender:
+    """Append rows to a .npy whose length is not known up front.
+
+    A header is written first and patched with the final row count on close;
+    the header length does not depend on the count, so the patch is in place.
+    """
+
+    def __init__(self, path: Path, dtype: str):
+        self.path, self.dtype = path, np.dtype(dtype).str
+        self.rows, self.width = 0, None
+        self._f = path.open("wb")
+
+    def append(self, X: np.ndarray):
+        X = np.ascontiguousarray(X, dtype=self.dtype)
+        if self.width is None:
+            self.width = int(X.shape[1])
+            self._f.write(npy_header(self.dtype, (0, self.width)))
+        self._f.write(X.tobytes())
+        self.rows += len(X)
+
+    def close(self):
+        if self.width is None:
+            self.width = 0
+            self._f.write(npy_header(self.dtype, (0, 0)))
+        header = npy_header(self.dtype, (self.rows, self.width))
+        assert len(header) == len(npy_header(self.dtype, (0, self.width)))
+        self._f.seek(0)
+        self._f.write(header)
+        self._f.close()
+
+class ChunkStoreWriter:
+    def __init__(self, seg_dir: Path, name: str):
+        self._blobs = {col: (seg_dir / f"{name}.{col}.bin").open("wb") for col in COLUMNS}
+        self._ends = np.zeros(len(COLUMNS), dtype="int64")
+        self._offsets = NpyAppender(seg_dir / f"{name}.offsets.npy", "<i8")
+        self._offsets.append(self._ends[None, :])   # row 0: every column starts at byte 0
+
+    def append(self, **columns):
+        rows = []
+        for values in zip(*(columns[col] for col in COLUMNS)):
+            for j, value in enumerate(values):
+                data = str(value).encode("utf-8")
+                self._blobs[COLUMNS[j]].write(data)
+                self._ends[j] += len(data)
+            rows.append(self._ends.copy())
+        if rows:
+            self._offsets.append(np.stack(rows))
+
+    def close(self):
+        for f in self._blobs.values():
+            f.close()
+        self._offsets.close()
+
+class ChunkStore:
+    """Random access to one segment's columns; nothing is read until asked for."""
+
+    def __init__(self, seg_dir: Path, name: str):
+        self.offsets = np.load(seg_dir / f"{name}.offsets.npy", mmap_mode="r")
+        self._paths = {col: seg_dir / f"{name}.{col}.bin" for col in COLUMNS}
+        self._maps = {}
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def _blob(self, col: str):
+        if col not in self._maps:
+            with self._paths[col].open("rb") as f:
+                size = f.seek(0, 2)
+                self._maps[col] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        return self._maps[col]
+
+    def get(self, col: str, row: int) -> str:
+        j = COLUMNS.index(col)
+        start, stop = int(self.offsets[row, j]), int(self.offsets[row + 1, j])
+        return self._blob(col)[start:stop].decode("utf-8")
+
+    def rows(self, rows) -> list[dict]:
+        return [{col: self.get(col, r) for col in COLUMNS} for r in rows]
+
+def delete_files(seg_dir: Path, name: str):
+    for path in [seg_dir / f"{name}.offsets.npy", *(seg_dir / f"{name}.{col}.bin" for col in COLUMNS)]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
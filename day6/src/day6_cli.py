@@ -1,22 +1,45 @@
-import argparse, os, json, hashlib
+from __future__ import annotations
+import argparse, os, sys, time
+from itertools import islice
 from pathlib import Path
-from dotenv import load_dotenv
-from openai import OpenAI
-import numpy as np
-from sklearn.neighbors import NearestNeighbors
+from typing import TYPE_CHECKING
+import tracing
+
+# openai, numpy and the index modules are imported inside the functions that use them, so
+# --help, argument errors and answer-cache hits don't pay for them (see scripts/bench_startup.py)
+if TYPE_CHECKING:
+    import numpy as np
+    from openai import OpenAI
+    from vector_index import Index
+    from answer_cache import AnswerCache
 
 # ---- Config & helpers --------------------------------------------------------
 ROOT = Path(__file__).resolve().parent.parent
 ENV = ROOT / ".env"
+DOCS_DIR = ROOT / "docs"                   # corpus root of indexes built before the root was recorded
 OUT_DIR = ROOT / "outputs"
-INDEX_EMB = ROOT / "day6.embeddings.npz"   # vectors + metadata
+RESULTS_LOG = OUT_DIR / "answers.jsonl"   # append-only answer history, see results_log
+INDEX_INFO = ROOT / "day6.nn.json"         # manifest: segments in day6.index/ + tombstones
+EMB_CACHE = ROOT / "day6.embcache.sqlite"  # (model, chunk hash) -> vector
+ANSWER_CACHE = ROOT / "day6.answers.sqlite"  # (corpus version, question) -> answer + sources
+EMBED_MODEL = "text-embedding-3-small"
+CHAT_MODEL = "gpt-4.1-mini"
+EMBED_WORKERS = 4  # embedding requests in flight during ingest
+EMBED_BATCH = 256  # max inputs per embedding request, so one block spans several requests
+INGEST_BLOCK = 2048       # chunks embedded and written per block (bounds ingest memory)
+LOAD_WORKERS = os.cpu_count() or 1   # processes reading + chunking files during ingest
+CHUNKER = "chars"         # see chunking.CHUNKERS: "chars" or "tokens"
+CHUNK_SIZE = 1000         # chapter-sized chunks (in CHUNKER units)
+CHUNK_OVERLAP = 0
+ALGO = "brute"            # search backend, see ann.ALGOS; "ivf" for large corpora
+DTYPE = "float32"         # search codes, see quant.DTYPES; float16/int8/pq shrink what queries read
+LEXICAL = True            # also build BM25 postings, for hybrid (keyword + vector) retrieval
 K = 3  # top-k neighbors
-
-def _hash(text: str) -> str:
-    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:10]
+MAX_K = 50  # largest top-k a question may ask for (CLI and server)
 
 # ---- Embeddings --------------------------------------------------------------
-def get_client():
+def _client_kwargs() -> dict:
+    from dotenv import load_dotenv
     load_dotenv(ENV, override=True)
     key = os.getenv("OPENAI_API_KEY")
     project = os.getenv("OPENAI_PROJECT")
@@ -29,101 +52,221 @@ def get_client():
             raise RuntimeError(
                 "You are using a project key (sk-proj-...), but OPENAI_PROJECT is missing in .env"
             )
-        return OpenAI(api_key=key, project=project)
+        return {"api_key": key, "project": project}
 
     # fallback for classic sk- keys
-    return OpenAI(api_key=key)
+    return {"api_key": key}
+
+def get_client():
+    with tracing.span("get_client"):
+        from openai import OpenAI
+        return OpenAI(**_client_kwargs())
+
+def get_async_client(max_connections: int = 32):
+    # One pooled, keep-alive HTTP client shared by every request in --serve mode
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return AsyncOpenAI(**_client_kwargs(), http_client=DefaultAsyncHttpxClient(limits=limits))
 
 def embed_texts(client: OpenAI, texts: list[str]) -> np.ndarray:
-    # Batch safely (OpenAI supports batching; keep simple here)
-    embs = []
-    B = 64
-    for i in range(0, len(texts), B):
-        chunk = texts[i:i+B]
-        resp = client.embeddings.create(model="text-embedding-3-small", input=chunk)
-        embs.extend([d.embedding for d in resp.data])
-    return np.array(embs, dtype="float32")
-
-# ---- Chunker -----------------------------------------------------------------
-def chunk_text(text, max_chars=1000):
-    import re
-    sentences = re.split(r'(?<=[.!?]) +', text)
-    chunks, current = [], ""
-    for s in sentences:
-        if len(current) + len(s) < max_chars:
-            current += s + " "
-        else:
-            if current.strip():
-                chunks.append(current.strip())
-            current = s + " "
-    if current.strip():
-        chunks.append(current.strip())
-    return chunks
-
-
-# ---- Ingest ------------------------------------------------------------------
-def ingest(docs_path: str):
+    # Token-packed batches, a few requests in flight, shared backoff on 429s
+    from embedder import Embedder
+    with tracing.span("embed_texts", texts=len(texts)) as span:
+        embedder = Embedder(client, EMBED_MODEL, workers=EMBED_WORKERS, max_items=EMBED_BATCH)
+        X = embedder.embed(texts)
+        span.set(tokens=embedder.tokens, requests=embedder.requests, retries=embedder.retries)
+    return X
+
+def chunking_settings(chunker=None, size=None, overlap=None, base: dict | None = None) -> dict:
+    """Explicit values win, then the index's recorded settings, then the defaults.
+    Raises ValueError if the resulting size/overlap can't be chunked."""
+    from chunking import check_sizes
+    base = base or {"chunker": CHUNKER, "size": CHUNK_SIZE, "overlap": CHUNK_OVERLAP}
+    given = {"chunker": chunker, "size": size, "overlap": overlap}
+    settings = {k: base[k] if v is None else v for k, v in given.items()}
+    check_sizes(settings["size"], settings["overlap"])
+    return settings
+
+def search_settings(algo=None, nlist=None, nprobe=None, iters=None, dtype=None, dims=None, pq_m=None,
+                    rerank=None, lexical=None) -> dict:
+    """Manifest fields for search (see vector_index.SEARCH_KEYS); unset params fall back to defaults."""
+    settings = {"algo": algo or ALGO, "dtype": dtype or DTYPE, "dims": dims, "rerank": rerank or 0,
+                "lexical": LEXICAL if lexical is None else lexical}
+    if settings["algo"] == "ivf":
+        settings["ivf"] = {"nlist": nlist, "nprobe": nprobe, "iters": iters}
+    if settings["dtype"] == "pq":
+        settings["pq"] = {"m": pq_m}
+    return settings
+
+def embed_blocks(client: OpenAI, chunks, stats: dict):
+    """Embed a chunk stream in fixed-size blocks.
+
+    Yields (X, sources, ids, texts, doc keys) per block, so memory stays flat
+    however large the corpus is. Fills stats with chunk / cache counts.
+    """
+    from embed_cache import EmbeddingCache
+    stats.update(chunks=0, cached=0, new=0)
+    it = iter(chunks)
+    # Only new or edited chunks go to the API; the rest come from the cache
+    with EmbeddingCache(EMB_CACHE, EMBED_MODEL) as cache:
+        while block := list(islice(it, INGEST_BLOCK)):
+            texts, sources, ids, keys = map(list, zip(*block))
+            X = cache.embed(texts, lambda todo: embed_texts(client, todo))
+            stats.update(chunks=stats["chunks"] + len(texts), cached=cache.hits, new=cache.misses)
+            yield X, sources, ids, texts, keys
+
+def count_doc_bytes(docs: dict):
+    # Files are read in the loader's worker processes, so count their sizes here
+    if tracing.enabled():
+        tracing.count("bytes_read", sum(p.stat().st_size for p in docs.values()), what="docs")
+
+def print_load_stats(load: dict):
+    print(f"Loaded {load['files']} files in {load['seconds']}s with {LOAD_WORKERS} workers "
+          f"({load['files_per_s']} files/s, {load['chunks_per_s']} chunks/s)")
+
+def open_manifest(root: Path | None = None) -> dict:
+    """Current manifest, creating an empty index (rooted at root) on first use."""
+    from vector_index import read_manifest, reset
+    try:
+        info = read_manifest(INDEX_INFO)
+    except FileNotFoundError:
+        return reset(INDEX_INFO, model=EMBED_MODEL, root=str(corpus_dir(root or DOCS_DIR)))
+    if info.get("model") != EMBED_MODEL:
+        raise RuntimeError(f"Index was built with {info.get('model')}, not {EMBED_MODEL}. Re-run --ingest.")
+    return info
+
+def corpus_dir(path: Path) -> Path:
+    """The folder doc keys are relative to: path itself, or a single file's folder."""
+    path = Path(os.path.abspath(path))
+    return path if path.is_dir() or not path.exists() else path.parent
+
+def corpus_root(info: dict) -> Path:
+    return Path(info.get("root") or corpus_dir(DOCS_DIR))
+
+def compact_in_background(info: dict):
+    from vector_index import needs_compaction
+    if not needs_compaction(info):
+        return
+    import subprocess, sys
+    proc = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "--compact"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    print(f"Compacting index in the background (pid {proc.pid})")
+
+def ingest(docs_path: str, chunking: dict | None = None, search: dict | None = None):
+    """Full rebuild: the index afterwards holds exactly the docs in docs_path.
+
+    chunking: optional overrides {"chunker", "size", "overlap"}; None means default.
+    search: optional search_settings() overrides; None means brute force on float32.
+    """
+    from loader import list_docs, file_hash, iter_chunks
+    from vector_index import append_docs
+    chunking = chunking_settings(**(chunking or {}))
     client = get_client()
-    docs_dir = Path(docs_path)
-    if not docs_dir.exists():
-        raise FileNotFoundError(f"Docs folder not found: {docs_dir}")
-
-    texts, sources, ids = [], [], []
-    for p in sorted(docs_dir.glob("*.txt")):
-        full = p.read_text(errors="ignore")
-        if not full.strip():
-            continue
-        pieces = chunk_text(full, max_chars=1000)  # chapter-sized chunks
-        for i, piece in enumerate(pieces):
-            if not piece.strip():
-                continue
-            texts.append(piece)
-            sources.append(f"{p.name}#chunk{i}")          # file + chunk tag
-            ids.append(_hash(f"{p}:{i}"))
-
-    if not texts:
+    root = corpus_dir(Path(docs_path))
+    docs = list_docs(Path(docs_path), root)
+    if not docs:
         print("No .txt files found to ingest.")
         return
 
-    X = embed_texts(client, texts)
-    nn = NearestNeighbors(metric="cosine", algorithm="brute")
-    nn.fit(X)
-
+    hashes = {key: file_hash(p) for key, p in docs.items()}
+    stats = {}
     OUT_DIR.mkdir(exist_ok=True)
-    np.savez_compressed(
-        INDEX_EMB,
-        X=X,
-        sources=np.array(sources, dtype=object),
-        ids=np.array(ids, dtype=object),
-        chunks=np.array(texts, dtype=object),   # persist chunk text
-    )
-    (ROOT / "day6.nn.json").write_text(json.dumps({"metric": "cosine", "algo": "brute"}))
-    print(f"Ingested {len(texts)} chunks from {docs_dir}. Saved vectors to {INDEX_EMB.name}")
+    load = {}
+    with tracing.span("ingest", docs=len(docs)) as span:
+        append_docs(INDEX_INFO, embed_blocks(client, iter_chunks(docs, chunking, LOAD_WORKERS, load), stats), hashes,
+                    replace=True, model=EMBED_MODEL, root=str(root), chunking=chunking, **search_settings(**(search or {})))
+        span.set(load_s=load["seconds"], **stats)
+    count_doc_bytes(docs)
+    print_load_stats(load)
+    print(f"Embeddings: {stats['cached']} cached, {stats['new']} new")
+    print(f"Ingested {stats['chunks']} chunks from {docs_path}. Saved index to {INDEX_INFO.name}")
 
+def add(paths: list[str], chunking: dict | None = None):
+    """Append new or changed docs as one new segment; unchanged docs are skipped.
 
-# ---- Ask ---------------------------------------------------------------------
-def ask(question: str, top_k: int = K):
-    client = get_client()
-    if not INDEX_EMB.exists():
-        raise FileNotFoundError("Vector file missing. Run --ingest first.")
+    Chunking defaults to what the index was built with, so segments stay consistent.
+    Docs are keyed relative to the corpus root given at --ingest; paths outside it are rejected.
+    """
+    from loader import list_docs, file_hash, iter_chunks
+    from vector_index import append_docs
+    info = open_manifest(Path(paths[0]))
+    chunking = chunking_settings(**(chunking or {}), base=info.get("chunking"))
+    root = corpus_root(info)
+    docs = {}
+    for p in paths:
+        docs.update(list_docs(Path(p), root))
+    hashes = {key: file_hash(p) for key, p in docs.items()}
+    changed = {k: p for k, p in docs.items() if info["docs"].get(k, {}).get("sha1") != hashes[k]}
+    if not changed:
+        print("Nothing to add: all docs already indexed.")
+        return
 
-    data = np.load(INDEX_EMB, allow_pickle=True)
-    X = data["X"]
-    sources = list(map(str, data["sources"]))
-    chunks = list(map(str, data["chunks"]))
+    stats, load = {}, {}
+    with tracing.span("add", docs=len(changed)) as span:
+        info = append_docs(INDEX_INFO, embed_blocks(get_client(), iter_chunks(changed, chunking, LOAD_WORKERS, load), stats),
+                           {k: hashes[k] for k in changed})
+        span.set(load_s=load["seconds"], **stats)
+    count_doc_bytes(changed)
+    print_load_stats(load)
+    print(f"Embeddings: {stats['cached']} cached, {stats['new']} new")
+    print(f"Added {len(changed)} docs ({stats['chunks']} chunks) as a new segment.")
+    compact_in_background(info)
 
-    nn = NearestNeighbors(metric="cosine", algorithm="brute")
-    nn.fit(X)
+def remove(keys: list[str]):
+    from vector_index import read_manifest, remove_docs
+    open_manifest()
+    found, removed = remove_docs(INDEX_INFO, keys)
+    missing = [k for k in dict.fromkeys(keys) if k not in found]
+    if missing:
+        print(f"Warning: not in the index, nothing removed for: {', '.join(missing)}")
+    print(f"Removed {len(found)} docs ({removed} chunks tombstoned).")
+    compact_in_background(read_manifest(INDEX_INFO))
 
-    q_emb = embed_texts(client, [question])
-    _, idx = nn.kneighbors(q_emb, n_neighbors=min(top_k, len(sources)))
-    chosen_idx = idx[0].tolist()
+def sync(docs_path: str, chunking: dict | None = None):
+    """Make the index mirror docs_path: remove vanished docs, add new or edited ones."""
+    from loader import list_docs
+    info = open_manifest(Path(docs_path))
+    root = corpus_root(info)
+    present = list_docs(Path(docs_path), root)
+    prefix = Path(os.path.abspath(docs_path)).relative_to(root).as_posix() + "/"
+    inside = [k for k in info["docs"] if prefix == "./" or k.startswith(prefix)]   # only docs_path is mirrored
+    gone = sorted(set(inside) - set(present))
+    if gone:
+        remove(gone)
+    add([docs_path], chunking)
 
-    picked_sources = [sources[i] for i in chosen_idx]
-    picked_chunks  = [chunks[i]  for i in chosen_idx]
-    context = "\n\n---\n\n".join(picked_chunks)
+def reindex_now(search: dict):
+    from vector_index import reindex
+    info = reindex(INDEX_INFO, search_settings(**search))
+    n = len(info["segments"])
+    clustered = sum(1 for s in info["segments"] if s.get("ivf"))
+    coded = sum(1 for s in info["segments"] if s.get("codes"))
+    codes = info["dtype"] + (f"/{info['dims']}d" if info.get("dims") else "")
+    lexical = sum(1 for s in info["segments"] if s.get("lexical"))
+    print(f"Index now uses {info['algo']} search on {codes} codes: "
+          f"{clustered}/{n} segments clustered, {coded}/{n} encoded, {lexical}/{n} with BM25 postings.")
 
-    messages = [
+def compact_now():
+    from vector_index import compact
+    if compact(INDEX_INFO):
+        print(f"Compacted {INDEX_INFO.name} into one segment.")
+    else:
+        print("Nothing to compact.")
+
+
+# ---- Ask ---------------------------------------------------------------------
+def load_corpus(nprobe: int | None = None, rerank: int | None = None, retrieval: str | None = None) -> Index:
+    """Open the saved index (all live segments); the arguments override its search settings."""
+    from vector_index import Index
+    with tracing.span("load"):
+        return Index(INDEX_INFO, nprobe=nprobe, rerank=rerank, retrieval=retrieval)
+
+def build_messages(question: str, picked_chunks: list[str]) -> list[dict]:
+    context = "\n\n---\n\n".join(picked_chunks)
+    return [
         {
             "role": "system",
             "content": "Answer using only the provided context. Add inline [citations] using the provided source tags (e.g., file.txt#chunk3)."
@@ -134,34 +277,221 @@ def ask(question: str, top_k: int = K):
         },
     ]
 
-    reply = client.chat.completions.create(
-        model="gpt-4.1-mini",
-        temperature=0.2,
-        messages=messages,
-    ).choices[0].message.content
+def open_answer_cache(index: Index, cache: dict | None = None) -> AnswerCache | None:
+    """The answer cache for the index's corpus version; None when disabled."""
+    from answer_cache import AnswerCache, TTL
+    cache = cache or {}
+    if not cache.get("enabled", True):
+        return None
+    return AnswerCache(ANSWER_CACHE, index.version, ttl=cache.get("ttl") or TTL, similarity=cache.get("similarity"))
+
+def cache_scope(index: Index, top_k: int) -> str:
+    # Everything besides the corpus and the question that changes an answer,
+    # including the search settings that change which chunks are retrieved
+    info = index.info
+    search = f"{info.get('algo', 'brute')}|nprobe={index.nprobe}|{info.get('dtype') or 'float32'}|dims={info.get('dims')}"
+    return f"{CHAT_MODEL}|{index.retrieval}|k={top_k}|{search}|rerank={index.rerank}"
+
+def ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+def completion_stats(t0: float, first: float | None, end: float, tokens: int) -> tuple[dict, dict]:
+    """(timings_ms, throughput) of a streamed completion: time to first token and in total,
+    and the decode rate (tokens after the first / time since it)."""
+    first = first or end
+    rate = (tokens - 1) / (end - first) if tokens > 1 and end > first else None
+    return ({"first_token": ms(first - t0), "completion": ms(end - t0)},
+            {"tokens": tokens, "tokens_per_s": round(rate, 1) if rate else None})
+
+def stream_reply(client: OpenAI, messages: list[dict], on_text) -> tuple[str, dict, dict]:
+    """Stream a completion, passing each text delta to on_text. Returns the reply and completion_stats."""
+    t0 = time.perf_counter()
+    first, parts, tokens = None, [], None
+    with tracing.span("completion", model=CHAT_MODEL, stream=True):
+        stream = client.chat.completions.create(
+            model=CHAT_MODEL,
+            temperature=0.2,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        for chunk in stream:
+            if chunk.usage:   # last chunk: exact token count
+                tokens = chunk.usage.completion_tokens
+                tracing.usage("openai", CHAT_MODEL, chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                first = first or time.perf_counter()
+                parts.append(chunk.choices[0].delta.content)
+                on_text(parts[-1])
+    return "".join(parts), *completion_stats(t0, first, time.perf_counter(), tokens or len(parts))
+
+def print_timings(timings: dict, throughput: dict | None):
+    line = ", ".join(f"{k.replace('_', ' ')} {v} ms" for k, v in timings.items())
+    if throughput:
+        line += f"; {throughput['tokens']} tokens"
+        if throughput["tokens_per_s"]:
+            line += f" at {throughput['tokens_per_s']} tokens/s"
+    print(line, file=sys.stderr)
+
+def ask(question: str, top_k: int = K, opts: dict | None = None, cache: dict | None = None, stream: bool = False):
+    """Answer one question and append it to the results log. With stream, print the answer as it is
+    generated and report time to first token, tokens/s and the per-stage timings."""
+    import results_log
+    from embedder import embed_query
+    t0 = time.perf_counter()
+    timings, throughput = {}, None
+    with tracing.span("ask", top_k=top_k) as trace:
+        index = load_corpus(**(opts or {}))
+        answers = open_answer_cache(index, cache)
+        scope = cache_scope(index, top_k)
+
+        result = answers.get(scope, question) if answers else None
+        if result is None:
+            client = get_client()
+            t1 = time.perf_counter()
+            q_emb = embed_query(client, EMBED_MODEL, question)
+            timings["embed"] = ms(time.perf_counter() - t1)
+            result = answers.nearest(scope, q_emb) if answers else None
+        cached = result is not None
+        if not cached:
+            t1 = time.perf_counter()
+            with tracing.span("search", k=top_k, retrieval=index.retrieval):
+                idx, _ = index.retrieve(q_emb, question, top_k)
+                chosen_idx = idx.tolist()
+
+                picked_sources = [index.source(i) for i in chosen_idx]
+                picked_chunks  = [index.chunk(i)  for i in chosen_idx]
+            timings["search"] = ms(time.perf_counter() - t1)
+            tracing.count("bytes_read", sum(len(c.encode("utf-8")) for c in picked_chunks), what="chunks")
+
+            messages = build_messages(question, picked_chunks)
+            if stream:
+                reply, stats, throughput = stream_reply(client, messages, lambda text: print(text, end="", flush=True))
+                print()
+                timings.update(stats)
+            else:
+                t1 = time.perf_counter()
+                with tracing.span("completion", model=CHAT_MODEL):
+                    chat = client.chat.completions.create(
+                        model=CHAT_MODEL,
+                        temperature=0.2,
+                        messages=messages,
+                    )
+                tracing.usage("openai", CHAT_MODEL, chat)
+                reply = chat.choices[0].message.content
+                timings["completion"] = ms(time.perf_counter() - t1)
+            result = {"answer": reply, "sources": picked_sources}
+            if answers:
+                answers.put(scope, question, q_emb, result)
+        elif stream:
+            print(result["answer"])
+        if answers:
+            answers.close()
+        trace.set(cached=cached)
+    timings["total"] = ms(time.perf_counter() - t0)
 
-    OUT_DIR.mkdir(exist_ok=True)
     out = {
+        "kind": "ask",
         "question": question,
-        "answer": reply,
-        "sources": picked_sources,
+        "answer": result["answer"],
+        "sources": result["sources"],
+        "cached": cached,
+        "timings_ms": timings,
+        **(throughput or {}),
     }
-    out_file = OUT_DIR / f"qa_{len(list(OUT_DIR.glob('qa_*.json')))}.json"
-    out_file.write_text(json.dumps(out, indent=2, ensure_ascii=False))
-    print("Answer saved to", out_file)
+    record_id = results_log.append(RESULTS_LOG, out)
+    if stream:
+        print_timings(timings, throughput)
+    print(f"Answer {record_id} logged to {RESULTS_LOG}" + (" (from the answer cache)" if cached else ""))
 
 
 # ---- CLI ---------------------------------------------------------------------
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
-    ap.add_argument("--ingest", help="path to docs folder (txt files)")
+    ap.add_argument("--ingest", help="path to docs folder (txt files); rebuilds the index")
+    ap.add_argument("--add", nargs="+", metavar="PATH", help="append new/changed .txt files or folders as a segment")
+    ap.add_argument("--remove", nargs="+", metavar="DOC", help="tombstone docs by name (e.g. policy1.txt)")
+    ap.add_argument("--sync", metavar="DIR", help="mirror a docs folder: remove vanished, add new/changed")
+    ap.add_argument("--compact", action="store_true", help="merge segments and drop tombstoned rows")
+    ap.add_argument("--chunker", choices=["chars", "tokens"], help=f"chunk budget unit (default: index setting or {CHUNKER})")
+    ap.add_argument("--chunk-size", type=int, help=f"chunk budget (default: index setting or {CHUNK_SIZE})")
+    ap.add_argument("--chunk-overlap", type=int, help=f"overlap between chunks (default: index setting or {CHUNK_OVERLAP})")
+    ap.add_argument("--load-workers", type=int, default=LOAD_WORKERS, help="processes reading/chunking files during ingest")
+    ap.add_argument("--algo", choices=["brute", "ivf"], help=f"--ingest/--reindex: search backend (default: {ALGO})")
+    ap.add_argument("--nlist", type=int, help="ivf: clusters per segment (default: ~4*sqrt(rows))")
+    ap.add_argument("--kmeans-iters", type=int, help="ivf: k-means iterations when building")
+    ap.add_argument("--nprobe", type=int, help="ivf: clusters probed per query; higher = better recall, slower "
+                                               "(stored by --ingest/--reindex, overridable per query)")
+    ap.add_argument("--dtype", choices=["float32", "float16", "int8", "pq"], help=f"--ingest/--reindex: search codes (default: {DTYPE})")
+    ap.add_argument("--dims", type=int, help="--ingest/--reindex: keep only the first N dims for search (Matryoshka)")
+    ap.add_argument("--pq-m", type=int, help="pq: sub-vectors (bytes) per vector (default: dims/16)")
+    ap.add_argument("--rerank", type=int, help="re-rank this many candidates on float32 when codes are lossy "
+                                               "(stored by --ingest/--reindex, overridable per query; 0 = off)")
+    ap.add_argument("--lexical", action=argparse.BooleanOptionalAction,
+                    help=f"--ingest/--reindex: build BM25 postings for hybrid retrieval (default: {LEXICAL})")
+    ap.add_argument("--retrieval", choices=["hybrid", "vector", "lexical"],
+                    help="how to rank chunks (default: hybrid if the index has BM25 postings, else vector)")
+    ap.add_argument("--reindex", action="store_true", help="rebuild search structures (--algo, --dtype, ...) without re-embedding")
+    ap.add_argument("--quant-report", action="store_true", help="recall vs bytes/vector for every --dtype/--dims on this index")
     ap.add_argument("--ask", help='question string, e.g., --ask "What is X?"')
+    ap.add_argument("--stream", action="store_true", help="--ask: print the answer as it is generated, with time to first token")
+    ap.add_argument("--ask-file", metavar="JSONL", help='batch mode: one {"question": ...} per line')
+    ap.add_argument("--out", help="--ask-file: output JSONL (default: outputs/<name>.answers.jsonl)")
+    ap.add_argument("--parallel", type=int, default=16, help="--ask-file: max concurrent completion calls")
+    ap.add_argument("--top-k", type=int, default=K, help=f"chunks retrieved per question (1-{MAX_K})")
+    ap.add_argument("--no-cache", action="store_true", help="don't read or write the answer cache")
+    ap.add_argument("--cache-similarity", type=float, metavar="COS",
+                    help="also reuse the answer of a cached question whose embedding is this similar (e.g. 0.95)")
+    ap.add_argument("--cache-ttl", type=float, metavar="SECONDS", help="answer cache lifetime (default: 7 days)")
+    ap.add_argument("--serve", action="store_true", help="run a long-lived query server (warm index, pooled client)")
+    ap.add_argument("--host", default="127.0.0.1", help="--serve: bind address")
+    ap.add_argument("--port", type=int, default=8006, help="--serve: TCP port")
+    ap.add_argument("--socket", help="--serve: listen on this Unix socket path instead of TCP")
+    ap.add_argument("--max-inflight", type=int, default=32, help="--serve: max concurrent upstream API requests")
+    ap.add_argument("--trace", metavar="JSONL", help="append timed spans (and the counters at exit) to this file")
+    ap.add_argument("--metrics", metavar="PATH", help="write counters in Prometheus text format here at exit")
     args = ap.parse_args()
+    if not 1 <= args.top_k <= MAX_K:
+        ap.error(f"--top-k must be between 1 and {MAX_K}")
+    # One flag alone is checked against the index's settings too, by chunking_settings()
+    if args.chunk_size is not None and args.chunk_size <= 0:
+        ap.error("--chunk-size must be positive")
+    if args.chunk_overlap is not None and args.chunk_overlap < 0:
+        ap.error("--chunk-overlap must not be negative")
+    if args.chunk_size is not None and args.chunk_overlap is not None and args.chunk_overlap >= args.chunk_size:
+        ap.error("--chunk-overlap must be smaller than --chunk-size")
 
     ROOT.mkdir(exist_ok=True)
+    if args.trace or args.metrics or args.serve:   # --serve always collects, for GET /metrics
+        tracing.enable(args.trace and Path(args.trace), args.metrics and Path(args.metrics))
+    LOAD_WORKERS = args.load_workers
+    chunking = {"chunker": args.chunker, "size": args.chunk_size, "overlap": args.chunk_overlap}
+    search = {"algo": args.algo, "nlist": args.nlist, "nprobe": args.nprobe, "iters": args.kmeans_iters,
+              "dtype": args.dtype, "dims": args.dims, "pq_m": args.pq_m, "rerank": args.rerank, "lexical": args.lexical}
+    opts = {"nprobe": args.nprobe, "rerank": args.rerank, "retrieval": args.retrieval}   # query-time overrides
+    cache = {"enabled": not args.no_cache, "similarity": args.cache_similarity, "ttl": args.cache_ttl}
     if args.ingest:
-        ingest(args.ingest)
+        ingest(args.ingest, chunking, search)
+    elif args.add:
+        add(args.add, chunking)
+    elif args.remove:
+        remove(args.remove)
+    elif args.sync:
+        sync(args.sync, chunking)
+    elif args.compact:
+        compact_now()
+    elif args.reindex:
+        reindex_now(search)
+    elif args.quant_report:
+        from quant import report
+        report(INDEX_INFO, k=max(args.top_k, 10))
     elif args.ask:
-        ask(args.ask)
+        ask(args.ask, args.top_k, opts, cache, stream=args.stream)
+    elif args.ask_file:
+        from batch import ask_file
+        ask_file(args.ask_file, args.out, top_k=args.top_k, parallel=args.parallel, opts=opts, cache=cache)
+    elif args.serve:
+        from server import serve
+        serve(host=args.host, port=args.port, socket_path=args.socket, max_inflight=args.max_inflight, opts=opts, cache=cache)
     else:
         ap.print_help()
@@ -0,0 +1,10 @@
+"""Content-addressed embedding cache: the shared implementation in common/embed_cache.py."""
+import sys
+from pathlib import Path
+
+_REPO = str(Path(__file__).resolve().parents[2])   # the repo root, which holds common/
+if _REPO not in sys.path:
+    sys.path.append(_REPO)
+from common.embed_cache import EmbeddingCache, content_key   # noqa: E402
+
+__all__ = ["EmbeddingCache", "content_key"]
@@ -0,0 +1,10 @@
+"""Concurrent, rate-limit-aware embedding: the shared implementation in common/embedder.py."""
+import sys
+from pathlib import Path
+
+_REPO = str(Path(__file__).resolve().parents[2])   # the repo root, which holds common/
+if _REPO not in sys.path:
+    sys.path.append(_REPO)
+from common.embedder import Embedder, embed_query, plan_batches, retry_delay   # noqa: E402
+
+__all__ = ["Embedder", "embed_query", "plan_batches", "retry_delay"]
@@ -0,0 +1,307 @@
+"""BM25 inverted index for day6 segments.
+
+Text is NFKC-normalized and lowercased, then tokenized into words (with codes
+like `POL-2024-03` kept whole and also split into their parts) and, for CJK
+runs, overlapping character bigrams, so Japanese terms match without a
+morphological analyzer.
+
+Each segment's index is four memory-mapped files:
+
+  {segment}.lex.terms.bin     sorted vocabulary, UTF-8, back to back
+  {segment}.lex.table.npy     (V+1, 3) int64: term end, postings end, doc freq
+  {segment}.lex.postings.bin  per term: row gaps then term freqs, as varints
+  {segment}.lex.doclen.npy    tokens per row
+
+Building is an external sort (sorted runs spilled to disk, then merged), so
+its memory does not grow with the segment. A lookup is a binary search over the vocabulary plus one varint decode of
+that term's postings, so it touches only the bytes of the query's terms.
+"""
+import bisect, mmap, re, unicodedata
+from collections import Counter
+from pathlib import Path
+import numpy as np
+
+K1, B = 1.2, 0.75
+BLOCK = 2048   # rows tokenized per step when building
+RUN_POSTINGS = 1 << 22   # postings sorted in RAM before a run is spilled to disk
+MERGE_TERMS = 4096       # terms taken from each run per merge step
+SKIP = 64      # every SKIP-th term is kept in RAM to narrow the vocabulary search
+
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"   # kana, CJK ideographs, hangul
+_WORD = rf"[^\W_{_CJK}]+"
+_TOKEN = re.compile(rf"(?P<cjk>[{_CJK}]+)|(?P<code>{_WORD}(?:[-_./]{_WORD})+)|(?P<word>{_WORD})")
+_SPLIT = re.compile(r"[-_./]")
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for m in _TOKEN.finditer(unicodedata.normalize("NFKC", text).lower()):
+        run, kind = m.group(), m.lastgroup
+        if kind == "word":
+            tokens.append(run)
+        elif kind == "code":   # "pol-2024-03" also matches "pol", "2024", "03"
+            tokens.append(run)
+            tokens.extend(_SPLIT.split(run))
+        else:
+            tokens.extend([run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)])
+    return tokens
+
+# ---- Varints -----------------------------------------------------------------
+def encode_varints(values: np.ndarray) -> tuple[bytes, np.ndarray]:
+    """LEB128: 7 bits per byte, high bit set on every byte but a value's last.
+    Returns the bytes and each value's encoded length."""
+    v = np.asarray(values, dtype="uint64")
+    nbytes = np.ones(len(v), dtype="int64")
+    for bits in (7, 14, 21, 28, 35):
+        nbytes += v >= (1 << bits)
+    out = np.empty(int(nbytes.sum()), dtype="uint8")
+    pos = np.cumsum(nbytes) - nbytes
+    for i in range(int(nbytes.max(initial=0))):
+        has = nbytes > i
+        byte = (v[has] >> np.uint64(7 * i)) & np.uint64(0x7F)
+        more = (nbytes[has] > i + 1).astype("uint64") << np.uint64(7)
+        out[pos[has] + i] = (byte | more).astype("uint8")
+    return out.tobytes(), nbytes
+
+def decode_varints(buf) -> np.ndarray:
+    b = np.frombuffer(buf, dtype="uint8")
+    if not len(b):
+        return np.zeros(0, dtype="int64")
+    last = b < 0x80
+    ends = np.flatnonzero(last)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    shift = np.arange(len(b)) - np.repeat(starts, ends - starts + 1)
+    parts = (b & 0x7F).astype("int64") << (7 * shift)
+    return np.add.reduceat(parts, starts)
+
+# ---- Build -------------------------------------------------------------------
+def _paths(seg_dir: Path, name: str) -> dict:
+    return {part: seg_dir / f"{name}.lex.{part}" for part in ("terms.bin", "table.npy", "postings.bin", "doclen.npy")}
+
+def _group(vocab: dict, terms: np.ndarray, rows: np.ndarray, tfs: np.ndarray):
+    """Renumber term ids (vocab: word -> id) in sorted word order, then sort the postings
+    by term, rows ascending within. Returns (words, terms, rows, tfs, doc freq per word)."""
+    words = sorted(vocab)
+    rank = np.empty(len(words), dtype="int32")
+    rank[[vocab[w] for w in words]] = np.arange(len(words), dtype="int32")
+    terms = rank[terms]
+    order = np.lexsort((rows, terms))
+    return words, terms[order], rows[order], tfs[order], np.bincount(terms, minlength=len(words))
+
+def _encode(terms: np.ndarray, rows: np.ndarray, tfs: np.ndarray, df: np.ndarray) -> tuple[bytes, np.ndarray]:
+    """One varint stream of grouped postings: per term, its row gaps then its term freqs.
+    Returns the bytes and each term's end offset in them."""
+    bounds = np.concatenate([[0], np.cumsum(df)])
+    first = bounds[terms]
+    gap_pos = 2 * first + (np.arange(len(rows)) - first)
+    values = np.empty(2 * len(rows), dtype="int64")
+    values[gap_pos] = np.where(np.arange(len(rows)) == first, rows, rows - np.roll(rows, 1))
+    values[gap_pos + df[terms]] = tfs
+    blob, nbytes = encode_varints(values)
+    return blob, np.concatenate([[0], np.cumsum(nbytes)])[2 * bounds[1:]]
+
+class _Runs:
+    """Sorted runs of postings spilled to disk while a segment is tokenized.
+
+    All runs share four files: vocabulary (UTF-8), a (V+1, 2) int64 table per run
+    (absolute term end and postings end, first row = the run's start) and the
+    rows / term freqs as raw int32.
+    """
+
+    def __init__(self, seg_dir: Path, name: str):
+        self.paths = {part: seg_dir / f"{name}.lex.run.{part}" for part in ("terms", "table", "rows", "tfs")}
+        self.files = {part: path.open("wb") for part, path in self.paths.items()}
+        self.runs = []   # (first table row, words) per run
+        self.table_rows = self.term_pos = self.post_pos = 0
+
+    def spill(self, vocab: dict, terms: np.ndarray, rows: np.ndarray, tfs: np.ndarray):
+        words, terms, rows, tfs, df = _group(vocab, terms, rows, tfs)
+        utf8 = [w.encode("utf-8") for w in words]
+        table = np.empty((len(words) + 1, 2), dtype="int64")
+        table[:, 0] = self.term_pos + np.concatenate([[0], np.cumsum([len(w) for w in utf8])])
+        table[:, 1] = self.post_pos + np.concatenate([[0], np.cumsum(df)])
+        self.files["terms"].write(b"".join(utf8))
+        self.files["table"].write(table.tobytes())
+        self.files["rows"].write(rows.astype("int32").tobytes())
+        self.files["tfs"].write(tfs.astype("int32").tobytes())
+        self.runs.append((self.table_rows, len(words)))
+        self.table_rows += len(words) + 1
+        self.term_pos, self.post_pos = int(table[-1, 0]), int(table[-1, 1])
+
+    def open(self):
+        """(vocab, table) views per run, plus the shared rows and term freqs."""
+        for f in self.files.values():
+            f.close()
+        blob = _map(self.paths["terms"])
+        table = _raw(self.paths["table"], "int64").reshape(-1, 2)
+        views = [(_Vocab(blob, table[at:at + v + 1]), table[at:at + v + 1]) for at, v in self.runs]
+        return views, _raw(self.paths["rows"], "int32"), _raw(self.paths["tfs"], "int32")
+
+    def delete(self):
+        for f in self.files.values():
+            f.close()
+        for path in self.paths.values():
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+def _raw(path: Path, dtype: str) -> np.ndarray:
+    return np.memmap(path, dtype=dtype, mode="r") if path.stat().st_size else np.zeros(0, dtype=dtype)
+
+def build(seg_dir: Path, name: str, store) -> dict | None:
+    """Index a finished segment's chunk column. Returns its manifest entry.
+
+    An external sort, so memory stays flat however large the segment: rows are
+    tokenized a block at a time into sorted runs of at most RUN_POSTINGS postings,
+    spilled to disk, then k-way merged term range by term range into the varint file.
+    """
+    n = len(store)
+    if not n:
+        return None
+    paths = _paths(seg_dir, name)
+    runs = _Runs(seg_dir, name)
+    try:
+        doclen = np.lib.format.open_memmap(paths["doclen.npy"], mode="w+", dtype="uint32", shape=(n,))
+        vocab, pending, size = {}, [], 0
+        for start in range(0, n, BLOCK):
+            t_ids, r_ids, counts = [], [], []
+            for row in range(start, min(start + BLOCK, n)):
+                toks = Counter(tokenize(store.get("chunk", row)))
+                doclen[row] = sum(toks.values())
+                for tok, tf in toks.items():
+                    t_ids.append(vocab.setdefault(tok, len(vocab)))
+                    r_ids.append(row)
+                    counts.append(tf)
+            pending.append((np.asarray(t_ids, dtype="int32"), np.asarray(r_ids, dtype="int32"),
+                            np.asarray(counts, dtype="int32")))
+            size += len(t_ids)
+            if size >= RUN_POSTINGS or start + BLOCK >= n:
+                if size:
+                    runs.spill(vocab, *(np.concatenate(p) for p in zip(*pending)))
+                vocab, pending, size = {}, [], 0
+        avgdl = round(float(doclen.mean()), 3)
+        doclen.flush()
+        del doclen
+        words = _merge(runs, paths, seg_dir / f"{name}.lex.run.out")
+    finally:
+        runs.delete()
+    return {"terms": words, "avgdl": avgdl}
+
+def _merge(runs: _Runs, paths: dict, table_tmp: Path) -> int:
+    """Merge the sorted runs into the segment's vocabulary, table and postings files.
+    Each step takes up to MERGE_TERMS terms from every run, cut at one common term so
+    a term's postings are complete within the step. Returns the vocabulary size."""
+    views, all_rows, all_tfs = runs.open()
+    cursor = [0] * len(views)
+    words = term_pos = post_pos = 0
+    try:
+        with paths["terms.bin"].open("wb") as terms_out, paths["postings.bin"].open("wb") as post_out, \
+                table_tmp.open("wb") as table_out:
+            while True:
+                live = [i for i, (vocab, _) in enumerate(views) if cursor[i] < len(vocab)]
+                if not live:
+                    break
+                cutoff = min(views[i][0][min(cursor[i] + MERGE_TERMS, len(views[i][0])) - 1] for i in live)
+                ids, parts = {}, []
+                for i in live:
+                    vocab, table = views[i]
+                    c = cursor[i]
+                    e = bisect.bisect_right(vocab, cutoff, c, len(vocab))
+                    if e == c:
+                        continue
+                    local = np.array([ids.setdefault(vocab[j], len(ids)) for j in range(c, e)], dtype="int32")
+                    lo, hi = table[c, 1], table[e, 1]
+                    parts.append((np.repeat(local, np.diff(table[c:e + 1, 1])), all_rows[lo:hi], all_tfs[lo:hi]))
+                    cursor[i] = e
+                step, terms, rows, tfs, df = _group(ids, *(np.concatenate(p) for p in zip(*parts)))
+                blob, ends = _encode(terms, rows, tfs, df)
+                utf8 = [w.encode("utf-8") for w in step]
+                table = np.empty((len(step), 3), dtype="int64")
+                table[:, 0] = term_pos + np.cumsum([len(w) for w in utf8])
+                table[:, 1] = post_pos + ends
+                table[:, 2] = df
+                terms_out.write(b"".join(utf8))
+                post_out.write(blob)
+                table_out.write(table.tobytes())
+                words, term_pos, post_pos = words + len(step), int(table[-1, 0]), int(table[-1, 1])
+        out = np.lib.format.open_memmap(paths["table.npy"], mode="w+", dtype="int64", shape=(words + 1, 3))
+        out[0] = 0
+        if words:
+            out[1:] = _raw(table_tmp, "int64").reshape(-1, 3)
+        out.flush()
+        del out
+    finally:
+        del views, all_rows, all_tfs
+        table_tmp.unlink(missing_ok=True)
+    return words
+
+def delete_files(seg_dir: Path, name: str):
+    for path in _paths(seg_dir, name).values():
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+# ---- Query -------------------------------------------------------------------
+def _map(path: Path):
+    with path.open("rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if f.seek(0, 2) else b""
+
+class _Vocab:
+    """Sequence view of the sorted vocabulary, for bisect."""
+
+    def __init__(self, blob, table):
+        self.blob, self.table = blob, table
+
+    def __len__(self):
+        return len(self.table) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.table[i, 0]:self.table[i + 1, 0]].decode("utf-8")
+
+class Postings:
+    """Read-only BM25 index of one segment."""
+
+    def __init__(self, seg_dir: Path, name: str, entry: dict):
+        paths = _paths(seg_dir, name)
+        # Plain ndarray views of the mappings: np.memmap's per-item overhead dominates tiny lookups
+        self.table = np.load(paths["table.npy"], mmap_mode="r").view(np.ndarray)
+        self.doclen = np.load(paths["doclen.npy"], mmap_mode="r").view(np.ndarray)
+        self.vocab = _Vocab(_map(paths["terms.bin"]), self.table)
+        self.skip = [self.vocab[i] for i in range(0, len(self.vocab), SKIP)]
+        self.postings = _map(paths["postings.bin"])
+        self.avgdl = entry["avgdl"] or 1.0
+
+    def df(self, term: str) -> tuple[int, int]:
+        """(term id, doc freq); id -1 if the term is not in this segment."""
+        lo = max(0, bisect.bisect_right(self.skip, term) - 1) * SKIP
+        t = bisect.bisect_left(self.vocab, term, lo, min(lo + SKIP, len(self.vocab)))
+        if t < len(self.vocab) and self.vocab[t] == term:
+            return t, int(self.table[t + 1, 2])
+        return -1, 0
+
+    def rows(self, t: int) -> tuple[np.ndarray, np.ndarray]:
+        values = decode_varints(self.postings[self.table[t, 1]:self.table[t + 1, 1]])
+        n = len(values) // 2
+        return np.cumsum(values[:n]), values[n:]
+
+    def score(self, terms: list[tuple[int, float]]) -> tuple[np.ndarray, np.ndarray]:
+        """BM25 over (term id, idf) pairs. Returns (rows, scores) for rows with any hit."""
+        hits = [(self.rows(t), idf) for t, idf in terms if t >= 0]
+        if not hits:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32")
+        rows = np.concatenate([r for (r, _), _ in hits])
+        parts = []
+        for (r, tf), idf in hits:
+            norm = K1 * (1 - B + B * self.doclen[r] / self.avgdl)
+            parts.append(idf * tf * (K1 + 1) / (tf + norm))
+        weights = np.concatenate(parts)
+        if len(rows) * 16 > len(self.doclen):   # common terms: a dense accumulator beats sorting
+            dense = np.bincount(rows, weights=weights, minlength=len(self.doclen))
+            uniq = np.flatnonzero(dense)
+            return uniq, dense[uniq].astype("float32")
+        uniq, inv = np.unique(rows, return_inverse=True)
+        return uniq, np.bincount(inv, weights=weights).astype("float32")
+
+def idf(n: int, df: int) -> float:
+    return float(np.log(1 + (n - df + 0.5) / (df + 0.5)))
@@ -0,0 +1,142 @@
+"""Document loading stage for day6 ingest.
+
+Walks a docs folder recursively, reads and chunks files on a process pool,
+and streams (text, source, id, doc key) tuples to the embedding stage in
+file order. At most a few files per worker are in flight, so memory stays
+bounded; very large files are streamed in this process window by window
+instead of being shipped to a worker whole.
+"""
+import hashlib, os, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from chunking import make_chunker
+
+READ_WINDOW = 1 << 20     # chars of a file chunked at a time
+BIG_FILE = 64 << 20       # bytes; bigger files are streamed here, not in a worker
+INFLIGHT_PER_WORKER = 4   # files queued per worker ahead of the consumer
+
+def _hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:10]
+
+def list_docs(path: Path, root: Path | None = None) -> dict[str, Path]:
+    """Doc key -> path for every .txt under a folder (recursive), or for a single file.
+
+    The key is the path relative to the corpus root (default: the folder itself, or a
+    single file's folder), so the same file always gets the same key however it is named.
+    Paths outside the root are rejected.
+    """
+    if not path.exists():
+        raise FileNotFoundError(f"Docs folder not found: {path}")
+    root = Path(os.path.abspath(root if root is not None else path if path.is_dir() else path.parent))
+
+    def key(p: Path) -> str:
+        try:
+            return Path(os.path.abspath(p)).relative_to(root).as_posix()
+        except ValueError:
+            raise ValueError(f"{p} is outside the corpus root {root}") from None
+
+    if path.is_file():
+        return {key(path): path}
+    key(path)
+    return {key(p): p for p in sorted(path.rglob("*.txt")) if p.is_file()}
+
+def file_hash(p: Path) -> str:
+    h = hashlib.sha1()
+    with p.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def read_windows(p: Path, size: int = READ_WINDOW):
+    """Yield a file's text in ~size pieces cut at line breaks, so a huge file is never in memory whole."""
+    with p.open(encoding="utf-8", errors="ignore") as f:
+        carry = ""
+        while block := f.read(size):
+            text = carry + block
+            if len(block) < size:   # short read = end of file, nothing to cut
+                carry = text
+                break
+            cut = text.rfind("\n")
+            if cut < 0 and len(text) < 4 * size:   # no line break yet: read a bit more
+                carry = text
+                continue
+            cut = len(text) - 1 if cut < 0 else cut
+            carry = text[cut + 1:]
+            yield text[:cut + 1]
+        if carry:
+            yield carry
+
+def chunk_file(key: str, p: Path, chunk):
+    """Yield (text, source, id, doc key) for one file."""
+    i = 0
+    for window in read_windows(p):
+        for piece in chunk(window):
+            if not piece.strip():
+                continue
+            yield piece, f"{key}#chunk{i}", _hash(f"{p}:{i}"), key   # file + chunk tag
+            i += 1
+
+# ---- Worker side -------------------------------------------------------------
+_chunk = None
+
+def _init_worker(chunking: dict):
+    global _chunk
+    _chunk = make_chunker(chunking["chunker"], chunking["size"], chunking["overlap"])
+
+def _load(key: str, path: str) -> list[tuple]:
+    return list(chunk_file(key, Path(path), _chunk))
+
+# ---- Stream ------------------------------------------------------------------
+def iter_chunks(docs: dict[str, Path], chunking: dict, workers: int | None = None, stats: dict | None = None):
+    """Yield (text, source, id, doc key) for all docs, in order, chunked on `workers` processes.
+
+    Fills stats with files, chunks, seconds, files_per_s and chunks_per_s when
+    done. Time spent by the consumer between chunks is not counted, so the
+    rates describe this stage alone.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = {} if stats is None else stats
+    busy, resumed = 0.0, time.perf_counter()
+    files = chunks = 0
+
+    if workers <= 1 or len(docs) < 2:
+        chunk = make_chunker(chunking["chunker"], chunking["size"], chunking["overlap"])
+        for key, p in docs.items():
+            for item in chunk_file(key, p, chunk):
+                chunks += 1
+                busy += time.perf_counter() - resumed
+                yield item
+                resumed = time.perf_counter()
+            files += 1
+    else:
+        _init_worker(chunking)   # for big files streamed in this process
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(chunking,)) as pool:
+            todo, pending = iter(docs.items()), deque()
+
+            def refill():
+                while len(pending) < workers * INFLIGHT_PER_WORKER:
+                    nxt = next(todo, None)
+                    if nxt is None:
+                        return
+                    key, p = nxt
+                    if p.stat().st_size > BIG_FILE:
+                        pending.append((key, p, None))
+                    else:
+                        pending.append((key, p, pool.submit(_load, key, str(p))))
+
+            refill()
+            while pending:
+                key, p, fut = pending.popleft()
+                items = chunk_file(key, p, _chunk) if fut is None else fut.result()
+                refill()   # keep workers busy while the consumer takes this file
+                for item in items:
+                    chunks += 1
+                    busy += time.perf_counter() - resumed
+                    yield item
+                    resumed = time.perf_counter()
+                files += 1
+
+    dt = max(busy + time.perf_counter() - resumed, 1e-9)
+    stats.update(files=files, chunks=chunks, seconds=round(dt, 3),
+                 files_per_s=round(files / dt, 1), chunks_per_s=round(chunks / dt, 1))
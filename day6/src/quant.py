@@ -0,0 +1,250 @@
+"""Compressed search codes for day6 segments.
+
+The manifest's "dtype" picks what queries score against:
+
+  float32  the segment's vectors.npy itself (memory-mapped), 4 bytes/dim
+  float16  half precision, 2 bytes/dim
+  int8     per-dimension scaled int8, 1 byte/dim (+ one scale per dim)
+  pq       product quantization: m sub-vectors, one byte each (256 centroids)
+
+"dims" optionally keeps only the first d dimensions (Matryoshka-style
+truncation, renormalized), which text-embedding-3 models are trained for.
+Codes live in `{segment}.codes.npy`, memory-mapped like the vectors, with the
+codec's small parameters (scales, codebooks) in `{segment}.codes.npz`. Scoring runs
+on the codes directly (the query is scaled / turned into a lookup table instead of
+decoding the codes). The float32 vectors stay on disk as the source of truth
+for compaction, re-indexing and the optional exact re-rank, which reads only
+the top candidates' rows.
+
+Recall-vs-size report for the current index:  day6_cli.py --quant-report
+"""
+import os
+from pathlib import Path
+import numpy as np
+
+DTYPES = ("float32", "float16", "int8", "pq")
+TRAIN_ROWS = 20_000   # rows sampled to fit int8 scales
+PQ_BITS = 8           # 256 centroids per sub-quantizer, one byte per code
+PQ_TRAIN_PER_CODE = 40   # PQ codebooks train on ~40 rows per centroid
+PQ_ITERS = 10
+BLOCK = 16_384        # rows encoded / scored per step
+
+def _truncate(X: np.ndarray, dims: int | None) -> np.ndarray:
+    X = np.asarray(X, dtype="float32")
+    if not dims or dims >= X.shape[-1]:
+        return X
+    X = X[..., :dims]
+    norms = np.linalg.norm(X, axis=-1, keepdims=True)
+    return X / np.where(norms == 0, 1, norms)
+
+def default_m(dims: int) -> int:
+    # 16-dim sub-vectors (96 bytes for 1536-d), or the largest divisor below that
+    m = max(1, dims // 16)
+    while dims % m:
+        m -= 1
+    return m
+
+def _nearest(T: np.ndarray, C: np.ndarray) -> np.ndarray:
+    """Index of the closest (L2) centroid per row: argmax of t.c - |c|^2/2, as one matmul."""
+    Ta = np.hstack([T, np.ones((len(T), 1), dtype=T.dtype)])
+    Ca = np.hstack([C, -0.5 * (C * C).sum(1, keepdims=True)])
+    return np.argmax(Ta @ Ca.T, axis=1)
+
+def _kmeans_l2(T: np.ndarray, n: int, iters: int, rng) -> np.ndarray:
+    C = T[rng.choice(len(T), size=n, replace=False)].copy()
+    for _ in range(iters):
+        labels = _nearest(T, C)
+        counts = np.bincount(labels, minlength=n)
+        full = counts > 0
+        order = np.argsort(labels, kind="stable")
+        sums = np.add.reduceat(T[order], np.cumsum(counts)[full] - counts[full])
+        C[full] = sums / counts[full, None]
+        C[~full] = T[rng.choice(len(T), size=int((~full).sum()))]   # re-seed empty clusters
+    return C
+
+# ---- Train / encode ----------------------------------------------------------
+def train(X: np.ndarray, dtype: str, dims: int | None = None, m: int | None = None, seed: int = 0) -> dict:
+    """Fit a codec on (a sample of) X. Returns its parameters as a dict of arrays/values."""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown dtype {dtype!r}. Choose from: {', '.join(DTYPES)}")
+    rng = np.random.default_rng(seed)
+    rows = TRAIN_ROWS if dtype != "pq" else PQ_TRAIN_PER_CODE << PQ_BITS
+    T = _truncate(X[np.sort(rng.choice(len(X), size=min(len(X), rows), replace=False))], dims)
+    d = T.shape[1]
+    params = {"dtype": dtype, "dims": d}
+    if dtype == "int8":
+        params["scale"] = (np.abs(T).max(axis=0) / 127).clip(min=1e-12).astype("float32")
+    elif dtype == "pq":
+        m = m or default_m(d)
+        if d % m:
+            raise ValueError(f"pq: {d} dims do not split into {m} sub-vectors")
+        ksub = min(1 << PQ_BITS, len(T))
+        subs = T.reshape(len(T), m, d // m)
+        params["codebooks"] = np.stack([_kmeans_l2(subs[:, j], ksub, PQ_ITERS, rng) for j in range(m)])
+    return params
+
+def encode(X: np.ndarray, params: dict) -> np.ndarray:
+    X = _truncate(X, params["dims"])
+    dtype = params["dtype"]
+    if dtype == "float32":
+        return X
+    if dtype == "float16":
+        return X.astype("float16")
+    if dtype == "int8":
+        return np.rint(X / params["scale"]).clip(-127, 127).astype("int8")
+    C = params["codebooks"]   # (m, ksub, d/m)
+    subs = X.reshape(len(X), len(C), -1)
+    codes = np.empty((len(X), len(C)), dtype="uint8")
+    for j, Cj in enumerate(C):
+        codes[:, j] = _nearest(subs[:, j], Cj)
+    return codes
+
+def codes_path(seg_dir: Path, name: str) -> Path:
+    return seg_dir / f"{name}.codes.npy"
+
+def params_path(seg_dir: Path, name: str) -> Path:
+    return seg_dir / f"{name}.codes.npz"
+
+def build_codes(seg_dir: Path, name: str, settings: dict) -> dict | None:
+    """Encode a finished segment into its .codes.npy (+ .codes.npz params). Returns the
+    manifest entry, or None when queries should use the float32 vectors as they are."""
+    dtype, dims = settings.get("dtype") or "float32", settings.get("dims")
+    X = np.load(seg_dir / f"{name}.vectors.npy", mmap_mode="r")
+    if not len(X) or (dtype == "float32" and (not dims or dims >= X.shape[1])):
+        return None
+    params = train(X, dtype, dims, (settings.get("pq") or {}).get("m"))
+    first = encode(X[:BLOCK], params)
+    tmp = seg_dir / f"{name}.codes.tmp.npy"
+    codes = np.lib.format.open_memmap(tmp, mode="w+", dtype=first.dtype, shape=(len(X), first.shape[1]))
+    codes[:len(first)] = first
+    for s in range(BLOCK, len(X), BLOCK):
+        codes[s:s + BLOCK] = encode(X[s:s + BLOCK], params)
+    codes.flush()
+    del codes
+    os.replace(tmp, codes_path(seg_dir, name))   # readers see the old or the new file, never half of one
+    tmp = seg_dir / f"{name}.codes.tmp.npz"
+    np.savez(tmp, **{k: v for k, v in params.items() if isinstance(v, np.ndarray)})
+    os.replace(tmp, params_path(seg_dir, name))
+    entry = {"dtype": dtype, "dims": params["dims"]}
+    if dtype == "pq":
+        entry["m"] = int(params["codebooks"].shape[0])
+    return entry
+
+def delete_files(seg_dir: Path, name: str):
+    for path in (codes_path(seg_dir, name), params_path(seg_dir, name)):
+        try:
+            path.unlink()
+        except OSError:
+            pass   # already gone, or still mapped by a reader on Windows
+
+# ---- Scoring -----------------------------------------------------------------
+class Exact:
+    """Scores against float32 vectors (the memory-mapped segment file)."""
+    lossy = False
+
+    def __init__(self, X: np.ndarray):
+        self.X = X
+
+    def prepare(self, Q: np.ndarray) -> np.ndarray:
+        return Q
+
+    def score(self, Qp: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        return Qp @ (self.X.T if rows is None else np.asarray(self.X[rows]).T)
+
+class Codes:
+    """Scores against compressed codes (memory-mapped)."""
+    lossy = True
+
+    def __init__(self, params: dict, codes: np.ndarray):
+        self.params, self.codes = params, codes
+        self.dtype = params["dtype"]
+        if self.dtype == "pq":
+            m, ksub = params["codebooks"].shape[:2]
+            self._shift = (np.arange(m) * ksub).astype("int64")   # code j -> column in the flat LUT
+
+    @classmethod
+    def load(cls, seg_dir: Path, name: str, entry: dict) -> "Codes":
+        with np.load(params_path(seg_dir, name)) as f:
+            arrays = {k: f[k] for k in f.files}
+        codes = arrays.pop("codes", None)   # older indexes kept the codes inside the .npz
+        if codes is None:
+            codes = np.load(codes_path(seg_dir, name), mmap_mode="r")
+        return cls({**entry, **arrays}, codes)
+
+    def prepare(self, Q: np.ndarray) -> np.ndarray:
+        """Per-query form that scores codes directly: scaled query, or PQ lookup table."""
+        Q = _truncate(Q, self.params["dims"])
+        if self.dtype == "int8":
+            return Q * self.params["scale"]   # q . (code * scale) == (q * scale) . code
+        if self.dtype == "pq":
+            C = self.params["codebooks"]
+            lut = np.einsum("bmd,mkd->bmk", Q.reshape(len(Q), len(C), -1), C)
+            return lut.reshape(len(Q), -1)   # (B, m * ksub)
+        return Q
+
+    def _score_block(self, Qp: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        if self.dtype == "pq":
+            return Qp[:, codes.astype("int64") + self._shift].sum(axis=-1)
+        return Qp @ codes.T.astype("float32")
+
+    def score(self, Qp: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        if rows is not None:
+            return self._score_block(Qp, self.codes[rows])
+        S = np.empty((len(Qp), len(self.codes)), dtype="float32")
+        step = BLOCK if self.dtype != "pq" else max(1, BLOCK * 16 // max(len(Qp) * self.codes.shape[1], 1))
+        for s in range(0, len(self.codes), step):
+            S[:, s:s + step] = self._score_block(Qp, self.codes[s:s + step])
+        return S
+
+def rerank(X: np.ndarray, Q: np.ndarray, idx: np.ndarray, k: int, top_k):
+    """Exact float32 scores for candidate rows idx (B, c; -1 = none), best k kept."""
+    valid = idx >= 0
+    R = np.asarray(X[np.where(valid, idx, 0).ravel()]).reshape(*idx.shape, -1)
+    S = np.einsum("bd,bcd->bc", Q, R)
+    S[~valid] = -np.inf
+    pick, scores = top_k(S, k)
+    return np.take_along_axis(idx, pick, axis=1), scores
+
+# ---- Report ------------------------------------------------------------------
+CONFIGS = [   # (dtype, dims, pq m)
+    ("float32", None, None), ("float16", None, None), ("int8", None, None), ("pq", None, None),
+    ("float32", 512, None), ("float16", 512, None), ("int8", 512, None), ("int8", 256, None), ("pq", 512, 32),
+]
+
+def report(info_path: Path, k: int = 10, queries: int = 200, rerank_to: int = 50, sample: int = 50_000, seed: int = 0):
+    """Recall@k and bytes/vector of every storage mode on a sample of the index.
+
+    Queries are stored vectors with a little noise, so no API calls are made.
+    """
+    from vector_index import Index, top_k
+
+    index = Index(info_path)
+    X = np.concatenate([np.asarray(V[:sample]) for V in index.vectors])[:sample]
+    rng = np.random.default_rng(seed)
+    Q = X[rng.choice(len(X), size=min(queries, len(X)), replace=False)]
+    Q = Q + rng.normal(scale=0.05 / np.sqrt(X.shape[1]), size=Q.shape).astype("float32")
+    Q /= np.linalg.norm(Q, axis=1, keepdims=True)
+    truth, _ = top_k(Q @ X.T, k)
+
+    def recall(idx):
+        return np.mean([len(set(a) & set(b)) / max(len(b), 1) for a, b in zip(idx.tolist(), truth.tolist())])
+
+    n = len(index)
+    print(f"{n} rows, {X.shape[1]} dims; sample {len(X)} rows, {len(Q)} queries, recall@{k} (re-rank from top {rerank_to})")
+    print(f"  {'storage':18s} {'bytes/vec':>9s} {'index RAM':>10s} {'recall':>7s} {'+rerank':>8s}")
+    for dtype, dims, m in CONFIGS:
+        if dims and dims >= X.shape[1]:
+            continue
+        try:
+            params = train(X, dtype, dims, m)
+        except ValueError as e:
+            print(f"  {dtype} skipped: {e}")
+            continue
+        scorer = Codes(params, encode(X, params))
+        S = scorer.score(scorer.prepare(Q))
+        idx, _ = top_k(S, k)
+        cand, _ = top_k(S, max(k, rerank_to))
+        reranked, _ = rerank(X, Q, cand, k, top_k)
+        per_vec = scorer.codes.nbytes / len(X)
+        label = dtype + (f"/{params['dims']}d" if dims else "") + (f" m={params['codebooks'].shape[0]}" if dtype == "pq" else "")
+        print(f"  {label:18s} {per_vec:9.0f} {per_vec * n / 2**20:8.1f}MB {recall(idx):7.3f} {recall(reranked):8.3f}")
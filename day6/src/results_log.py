@@ -0,0 +1,16 @@
+"""Append-only result log: the shared implementation in common/results_log.py.
+
+  python src/results_log.py outputs/answers.jsonl --last 5
+"""
+import sys
+from pathlib import Path
+
+_REPO = str(Path(__file__).resolve().parents[2])   # the repo root, which holds common/
+if _REPO not in sys.path:
+    sys.path.append(_REPO)
+from common.results_log import MAX_BYTES, ResultLog, append, main, query   # noqa: E402
+
+__all__ = ["MAX_BYTES", "ResultLog", "append", "query"]
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Long-lived query server for day6 (`day6_cli.py --serve`).
+
+Loads the index once, keeps one pooled AsyncOpenAI client, and answers many
+questions concurrently on a single asyncio loop. Plain HTTP/1.1 with keep-alive,
+over TCP or a Unix socket:
+
+  POST /ask     {"question": "...", "top_k": 3, "stream": false}
+  GET  /health
+  GET  /metrics  span latencies, tokens, cost, cache hits (Prometheus text, see tracing)
+
+Every answer is appended to the results log (outputs/answers.jsonl). Its
+reply carries the log record's `id`, `timings_ms` for embed, search and
+completion, and `cached` ("exact", "similar" or false).
+
+With "stream": true (or `Accept: text/event-stream`) the reply is a
+Server-Sent Events stream: one `sources` event once retrieval is done, a
+`token` event per text delta as the model generates it, then `done` with the
+full record, whose timings add `first_token`, plus `tokens` and
+`tokens_per_s`. A failure mid-stream ends with an `error` event instead.
+"""
+import asyncio, contextlib, json, time
+import numpy as np
+import day6_cli as cli
+import tracing
+from results_log import ResultLog
+
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 502: "Bad Gateway"}
+
+# ---- Warm state --------------------------------------------------------------
+class WarmIndex:
+    """Holds the opened index; reopens it only when ingest/add/remove/compact rewrite the manifest."""
+
+    def __init__(self, opts: dict | None = None):
+        self._stamp = None
+        self.index = None
+        self.opts = opts or {}   # nprobe / rerank / retrieval overrides
+
+    def get(self):
+        stamp = cli.INDEX_INFO.stat().st_mtime_ns
+        if stamp != self._stamp:
+            self.index = cli.load_corpus(**self.opts)
+            self._stamp = stamp
+        return self.index
+
+class State:
+    def __init__(self, max_inflight: int, opts: dict | None = None, cache: dict | None = None):
+        self.warm = WarmIndex(opts)
+        self.client = cli.get_async_client(max_connections=max_inflight)
+        self.limit = asyncio.Semaphore(max_inflight)   # bounds upstream API calls
+        self.cache = cache
+        self._answers = None
+        self.log = ResultLog(cli.RESULTS_LOG)   # every answer served, one fd kept open
+
+    def answers(self, index):
+        """Answer cache for the index's corpus version (reopened after an ingest changes it)."""
+        if self._answers is not None and self._answers.version != index.version:
+            self._answers.close()
+            self._answers = None
+        if self._answers is None:
+            self._answers = cli.open_answer_cache(index, self.cache)
+        return self._answers
+
+# ---- Ask ---------------------------------------------------------------------
+async def answer(state: State, question: str, top_k: int = cli.K, emit=None) -> dict:
+    """Answer one question. With emit (an async callback taking an event name and
+    its data), stream the sources and then every text delta as they arrive."""
+    with tracing.span("ask", top_k=top_k, stream=emit is not None) as trace:
+        record = await _answer(state, question, top_k, emit)
+        trace.set(cached=record["cached"])
+    return record
+
+async def _answer(state: State, question: str, top_k: int, emit) -> dict:
+    t0 = time.perf_counter()
+    index = state.warm.get()
+    answers = state.answers(index)
+    scope = cli.cache_scope(index, top_k)
+    timings, throughput = {}, None
+
+    async def done(result: dict, cached) -> dict:
+        if emit and cached:
+            await emit("sources", {"sources": result["sources"]})
+            await emit("token", {"text": result["answer"]})
+        timings["total"] = cli.ms(time.perf_counter() - t0)
+        record = {"question": question, **result, "cached": cached, "timings_ms": timings, **(throughput or {})}
+        return {"id": state.log.append({"kind": "serve", **record}), **record}
+
+    hit = answers.get(scope, question) if answers else None
+    if hit is not None:
+        return await done(hit, "exact")
+
+    async with state.limit:
+        with tracing.span("embed_query"):
+            resp = await state.client.embeddings.create(model=cli.EMBED_MODEL, input=[question])
+    tracing.usage("openai", cli.EMBED_MODEL, resp)
+    q_emb = np.asarray(resp.data[0].embedding, dtype="float32")
+    t1 = time.perf_counter()
+    timings["embed"] = cli.ms(t1 - t0)
+    hit = answers.nearest(scope, q_emb) if answers else None
+    if hit is not None:
+        return await done(hit, "similar")
+
+    with tracing.span("search", k=top_k, retrieval=index.retrieval):
+        idx, _ = await asyncio.to_thread(index.retrieve, q_emb, question, top_k)   # keep the loop free
+        picked_sources = [index.source(i) for i in idx.tolist()]
+        picked_chunks = [index.chunk(i) for i in idx.tolist()]
+    tracing.count("bytes_read", sum(len(c.encode("utf-8")) for c in picked_chunks), what="chunks")
+    t2 = time.perf_counter()
+    timings["search"] = cli.ms(t2 - t1)
+    messages = cli.build_messages(question, picked_chunks)
+
+    if emit:
+        await emit("sources", {"sources": picked_sources})
+        first, parts, tokens = None, [], None
+        async with state.limit:
+            with tracing.span("completion", model=cli.CHAT_MODEL, stream=True):
+                stream = await state.client.chat.completions.create(
+                    model=cli.CHAT_MODEL,
+                    temperature=0.2,
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                async for chunk in stream:
+                    if chunk.usage:
+                        tokens = chunk.usage.completion_tokens
+                        tracing.usage("openai", cli.CHAT_MODEL, chunk)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        first = first or time.perf_counter()
+                        parts.append(chunk.choices[0].delta.content)
+                        await emit("token", {"text": parts[-1]})
+        stats, throughput = cli.completion_stats(t2, first, time.perf_counter(), tokens or len(parts))
+        timings.update(stats)
+        reply = "".join(parts)
+    else:
+        async with state.limit:
+            with tracing.span("completion", model=cli.CHAT_MODEL):
+                chat = await state.client.chat.completions.create(
+                    model=cli.CHAT_MODEL,
+                    temperature=0.2,
+                    messages=messages,
+                )
+        tracing.usage("openai", cli.CHAT_MODEL, chat)
+        timings["completion"] = cli.ms(time.perf_counter() - t2)
+        reply = chat.choices[0].message.content
+
+    result = {"answer": reply, "sources": picked_sources}
+    if answers:
+        answers.put(scope, question, q_emb, result)
+    return await done(result, False)
+
+async def stream_answer(state: State, question: str, top_k: int):
+    """(event, data) pairs of one streamed answer, ending with "done" or "error"."""
+    queue = asyncio.Queue()
+
+    async def emit(event: str, data: dict):
+        await queue.put((event, data))
+
+    task = asyncio.create_task(answer(state, question, top_k, emit))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while (item := await queue.get()) is not None:
+            yield item
+        try:
+            yield "done", task.result()
+        except Exception as e:   # upstream API failure after the stream started
+            yield "error", {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        task.cancel()   # client went away mid-stream: stop generating
+
+async def route(state: State, method: str, path: str, body: bytes, accept: str = ""):
+    if path == "/health":
+        index = state.warm.get()
+        answers = state.answers(index)
+        cache = {"hits": answers.hits, "similar_hits": answers.near_hits, "misses": answers.misses} if answers else None
+        return 200, {"ok": True, "chunks": len(index), "segments": len(index.names), "answer_cache": cache}
+    if path == "/metrics":
+        return 200, tracing.prometheus_text()
+    if path != "/ask":
+        return 404, {"error": f"no route for {path}"}
+    if method != "POST":
+        return 405, {"error": "use POST /ask"}
+
+    try:
+        req = json.loads(body or b"{}")
+        question = str(req["question"]).strip()
+        top_k = int(req.get("top_k", cli.K))
+        stream = bool(req.get("stream")) or "text/event-stream" in accept
+    except (ValueError, KeyError, TypeError) as e:
+        return 400, {"error": f"expected JSON body with a 'question' field ({e})"}
+    if not question:
+        return 400, {"error": "empty question"}
+    if not 1 <= top_k <= cli.MAX_K:
+        return 400, {"error": f"top_k must be between 1 and {cli.MAX_K}"}
+
+    if stream:
+        return 200, stream_answer(state, question, top_k)
+    try:
+        return 200, await answer(state, question, top_k)
+    except Exception as e:   # upstream API failure: report it, keep serving
+        return 502, {"error": f"{type(e).__name__}: {e}"}
+
+# ---- HTTP --------------------------------------------------------------------
+async def handle(state: State, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:   # keep-alive: many requests per connection
+            line = await reader.readline()
+            if not line.strip():
+                break
+            method, path, _ = line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                h = await reader.readline()
+                if h in (b"\r\n", b"\n", b""):
+                    break
+                k, _, v = h.decode("latin-1").partition(":")
+                headers[k.strip().lower()] = v.strip()
+            body = await reader.readexactly(int(headers.get("content-length") or 0))
+
+            status, payload = await route(state, method.upper(), path.split("?", 1)[0], body,
+                                          headers.get("accept", ""))
+            keep = headers.get("connection", "").lower() != "close"
+            if isinstance(payload, (dict, str)):
+                text = isinstance(payload, str)   # /metrics
+                data = (payload if text else json.dumps(payload, ensure_ascii=False)).encode("utf-8")
+                kind = "text/plain; version=0.0.4" if text else "application/json"
+                head = (
+                    f"HTTP/1.1 {status} {STATUS[status]}\r\n"
+                    f"Content-Type: {kind}; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n"
+                )
+                writer.write(head.encode("latin-1") + data)
+                await writer.drain()
+            else:
+                await send_events(writer, status, payload, keep)
+            if not keep:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass   # malformed request or client went away
+    finally:
+        writer.close()
+
+async def send_events(writer: asyncio.StreamWriter, status: int, events, keep: bool):
+    """Write an SSE stream as a chunked HTTP/1.1 body (so the connection can be kept alive)."""
+    head = (
+        f"HTTP/1.1 {status} {STATUS[status]}\r\n"
+        "Content-Type: text/event-stream; charset=utf-8\r\n"
+        "Cache-Control: no-cache\r\n"
+        "Transfer-Encoding: chunked\r\n"
+        f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1"))
+    async with contextlib.aclosing(events):
+        async for event, data in events:
+            frame = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+            writer.write(f"{len(frame):x}\r\n".encode("latin-1") + frame + b"\r\n")
+            await writer.drain()   # flush each token now, not when a buffer fills
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+async def _main(host: str, port: int, socket_path: str | None, max_inflight: int, opts: dict | None,
+                cache: dict | None):
+    state = State(max_inflight, opts, cache)
+    index = state.warm.get()   # load once up front; fail fast if not ingested
+    handler = lambda r, w: handle(state, r, w)
+
+    if socket_path:
+        server = await asyncio.start_unix_server(handler, path=socket_path)
+        where = socket_path
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        where = f"http://{host}:{port}"
+    print(f"Serving {len(index)} chunks on {where} (POST /ask)")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await state.client.close()
+        if state._answers is not None:
+            state._answers.close()
+        state.log.close()
+
+def serve(host: str = "127.0.0.1", port: int = 8006, socket_path: str | None = None, max_inflight: int = 32,
+          opts: dict | None = None, cache: dict | None = None):
+    try:
+        asyncio.run(_main(host, port, socket_path, max_inflight, opts, cache))
+    except KeyboardInterrupt:
+        print("Server stopped.")
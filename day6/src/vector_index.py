@@ -0,0 +1,509 @@
+"""Segmented, ready-to-query vector index for day6.
+
+Vectors are saved L2-normalized as float32 in plain (uncompressed) .npy files,
+so `ask` can memory-map them instead of decompressing and refitting a model.
+Cosine similarity is then one matmul, and top-k is an `argpartition`
+(`normalize` and `top_k` come from the shared `vectors` module).
+
+The index is a list of append-only segments in `day6.index/`. The
+`day6.nn.json` sidecar is the manifest: it lists the live segments, the rows
+deleted from each (tombstones) and which segment holds each document.
+Adding documents writes a new segment, removing them only adds tombstones,
+and `compact()` later merges everything into one segment without the dead
+rows. The manifest is always replaced atomically, so readers see either the
+old or the new index, never a mix.
+
+How segments are searched is also set in the manifest and built when a
+segment is written: "algo" is "brute" (score every row) or "ivf" (probe
+k-means clusters, see `ann`), and "dtype" / "dims" pick the codes scored
+(float32, float16, int8 or PQ, optionally truncated, see `quant`), with an
+optional exact re-rank of the top "rerank" candidates. With "lexical" each
+segment also gets a BM25 inverted index (see `lexical`), and `retrieve()`
+fuses keyword and vector rankings with reciprocal rank fusion.
+
+Segments are written by `SegmentWriter` one block at a time (vectors appended
+to the .npy, chunk text to a columnar `chunk_store`), so building or
+compacting an index never holds more than one block in memory, and a query
+only reads the rows it returns.
+"""
+import hashlib, json, os
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import ann, lexical, quant
+from vectors import normalize, top_k
+from chunk_store import ChunkStore, ChunkStoreWriter, NpyAppender, delete_files as delete_chunk_files
+
+FORMAT = 4
+BLOCK = 2048              # rows per block when streaming segments
+MAX_SEGMENTS = 8          # compact once there are more segments than this...
+MAX_DELETED_FRAC = 0.25   # ...or once this share of rows is tombstoned
+RRF_K = 60                # reciprocal rank fusion: score = sum of 1 / (RRF_K + rank)
+RRF_DEPTH = 50            # candidates taken from each ranking before fusing
+
+# ---- Manifest ----------------------------------------------------------------
+def read_manifest(info_path: Path) -> dict:
+    if not info_path.exists():
+        raise FileNotFoundError("Index sidecar missing. Run --ingest first.")
+    info = json.loads(info_path.read_text())
+    if info.get("format") != FORMAT:
+        raise RuntimeError(f"{info_path.name} is from an older index format. Re-run --ingest.")
+    return info
+
+def corpus_version(info: dict) -> str:
+    """Hash of what answers depend on: each live doc's content, the chunking and the
+    embedding model. Compaction and re-indexing leave it unchanged."""
+    docs = sorted((key, d["sha1"]) for key, d in info["docs"].items())
+    blob = json.dumps([docs, info.get("chunking"), info.get("model")], ensure_ascii=False)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+
+def write_manifest(info_path: Path, info: dict):
+    tmp = info_path.with_name(info_path.name + ".tmp")
+    tmp.write_text(json.dumps(info, indent=2, ensure_ascii=False))
+    os.replace(tmp, info_path)
+
+def empty_manifest(info_path: Path, **info) -> dict:
+    return {
+        "format": FORMAT,
+        "metric": "cosine",
+        "algo": "brute",
+        "dtype": "float32",
+        "normalized": True,
+        "dir": info_path.name.replace(".nn.json", "") + ".index",
+        "next_segment": 1,
+        "segments": [],   # [{"name", "count", "deleted": [row, ...]}]
+        "docs": {},       # doc key -> {"sha1", "segment", "rows": [start, stop]}
+        **info,
+    }
+
+@contextmanager
+def locked(info_path: Path):
+    """Serialize writers (ingest/add/remove/compact) on one index."""
+    with open(info_path.with_name(info_path.name + ".lock"), "a+") as f:
+        try:
+            import fcntl
+        except ImportError:   # Windows: single-writer use only
+            yield
+            return
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# ---- Segments ----------------------------------------------------------------
+def segment_dir(info_path: Path, info: dict) -> Path:
+    return info_path.parent / info["dir"]
+
+class SegmentWriter:
+    """Streams one segment to disk, block by block.
+
+    Vectors are appended to the segment .npy and chunk columns to its chunk
+    store. Rows of one document must be appended together, so each doc maps
+    to a row range.
+    """
+
+    def __init__(self, seg_dir: Path, name: str):
+        seg_dir.mkdir(parents=True, exist_ok=True)
+        self.dir, self.name = seg_dir, name
+        self.count, self.dim = 0, None
+        self.docs = {}   # doc key -> [start, stop]
+        self.search_entry = {}   # {"ivf", "codes", "lexical"} set by build_search()
+        self._vec = NpyAppender(seg_dir / f"{name}.vectors.npy", "<f4")
+        self._store = ChunkStoreWriter(seg_dir, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self._vec.close()
+        self._store.close()
+        if exc_type:
+            delete_segment_files(self.dir, self.name)
+
+    def append(self, X: np.ndarray, sources, ids, chunks, docs):
+        self._vec.append(normalize(X))
+        self.dim = self._vec.width
+        self._store.append(source=sources, id=ids, chunk=chunks, doc=docs)
+        for doc in docs:
+            start, _ = self.docs.get(doc, (self.count, self.count))
+            self.count += 1
+            self.docs[doc] = [start, self.count]
+
+    def build_search(self, settings: dict):
+        """Build the segment's search structures once all rows are written."""
+        if self.count:
+            self.search_entry = build_search(self.dir, self.name, settings)
+
+    def entry(self) -> dict:
+        return {"name": self.name, "count": self.count, "deleted": [], **self.search_entry}
+
+def build_search(seg_dir: Path, name: str, settings: dict, existing: dict | None = None) -> dict:
+    """IVF clusters, compressed codes and/or BM25 postings for one segment, as its manifest fields.
+
+    Postings depend only on the chunk text, so an existing entry is reused.
+    """
+    entry = {}
+    if settings.get("algo", "brute") == "ivf":
+        entry["ivf"] = ann.build_ivf(seg_dir, name, settings.get("ivf") or {})
+    entry["codes"] = quant.build_codes(seg_dir, name, settings)
+    if settings.get("lexical"):
+        entry["lexical"] = (existing or {}).get("lexical") or lexical.build(seg_dir, name, ChunkStore(seg_dir, name))
+    return {k: v for k, v in entry.items() if v}
+
+def delete_segment_files(seg_dir: Path, name: str):
+    delete_chunk_files(seg_dir, name)
+    ann.delete_files(seg_dir, name)
+    quant.delete_files(seg_dir, name)
+    lexical.delete_files(seg_dir, name)
+    try:
+        (seg_dir / f"{name}.vectors.npy").unlink()
+    except OSError:
+        pass   # already gone, or still mapped by a reader on Windows
+
+def _new_segment_name(info: dict) -> str:
+    name = f"seg_{info['next_segment']:06d}"
+    info["next_segment"] += 1
+    return name
+
+def _reserve_segment(info_path: Path) -> tuple[dict, str]:
+    with locked(info_path):
+        info = read_manifest(info_path)
+        name = _new_segment_name(info)
+        write_manifest(info_path, info)
+    return info, name
+
+def _tombstone_docs(info: dict, keys) -> int:
+    """Mark every row of the given documents deleted. Returns rows removed."""
+    by_seg = {}
+    for key in keys:
+        entry = info["docs"].pop(key, None)
+        if entry:
+            by_seg.setdefault(entry["segment"], []).extend(range(*entry["rows"]))
+    removed = 0
+    for seg in info["segments"]:
+        rows = by_seg.get(seg["name"])
+        if rows:
+            seg["deleted"] = sorted(set(seg["deleted"]) | set(rows))
+            removed += len(rows)
+    return removed
+
+def reset(info_path: Path, **info) -> dict:
+    """Start an empty index, dropping any existing segments."""
+    return _swap_in(info_path, None, {}, replace=True, **info)
+
+def _swap_in(info_path: Path, writer, doc_hashes: dict, replace: bool = False, **fresh) -> dict:
+    """Publish a finished segment: tombstone older copies of its docs (or every
+    old segment when replace=True) and point the docs at their new rows."""
+    with locked(info_path):
+        old = None
+        try:
+            old = read_manifest(info_path)
+        except (FileNotFoundError, RuntimeError):
+            if not replace:
+                raise
+        if replace:
+            info = empty_manifest(info_path, **fresh)
+            if old:
+                info["next_segment"] = max(info["next_segment"], old["next_segment"])
+        else:
+            info = old
+            _tombstone_docs(info, doc_hashes)
+        if writer is not None and writer.count:
+            info["segments"].append(writer.entry())
+            info["dim"] = writer.dim
+            for key, sha in doc_hashes.items():
+                if key in writer.docs:
+                    info["docs"][key] = {"sha1": sha, "segment": writer.name, "rows": writer.docs[key]}
+        elif writer is not None:
+            delete_segment_files(writer.dir, writer.name)
+        write_manifest(info_path, info)
+    if replace and old:
+        for seg in old["segments"]:
+            delete_segment_files(segment_dir(info_path, old), seg["name"])
+    return info
+
+def append_docs(info_path: Path, blocks, doc_hashes: dict, replace: bool = False, **fresh) -> dict:
+    """Stream blocks of (X, sources, ids, chunks, docs) into one new segment.
+
+    The segment is written outside the lock; only the manifest swap is
+    serialized. With replace=True it becomes the whole index (full ingest).
+    """
+    if replace:
+        try:
+            info, name = _reserve_segment(info_path)
+        except (FileNotFoundError, RuntimeError):
+            info, name = empty_manifest(info_path, **fresh), "seg_000001"
+            info["next_segment"] = 2
+            write_manifest(info_path, info)
+    else:
+        info, name = _reserve_segment(info_path)
+    with SegmentWriter(segment_dir(info_path, info), name) as writer:
+        for X, sources, ids, chunks, docs in blocks:
+            writer.append(X, sources, ids, chunks, docs)
+    writer.build_search(fresh if replace else info)
+    return _swap_in(info_path, writer, doc_hashes, replace=replace, **fresh)
+
+def remove_docs(info_path: Path, keys) -> tuple[list[str], int]:
+    """Tombstone the given docs. Returns (the keys that were in the index, rows removed)."""
+    with locked(info_path):
+        info = read_manifest(info_path)
+        found = [k for k in dict.fromkeys(keys) if k in info["docs"]]
+        removed = _tombstone_docs(info, found)
+        write_manifest(info_path, info)
+    return found, removed
+
+def needs_compaction(info: dict) -> bool:
+    total = sum(s["count"] for s in info["segments"])
+    dead = sum(len(s["deleted"]) for s in info["segments"])
+    return len(info["segments"]) > MAX_SEGMENTS or (total > 0 and dead / total > MAX_DELETED_FRAC)
+
+def compact(info_path: Path) -> bool:
+    """Merge all segments into one and drop tombstoned rows.
+
+    The merge streams block by block outside the lock, so ask/add/remove keep
+    working; tombstones added meanwhile are carried over before the swap.
+    """
+    with locked(info_path):
+        info = read_manifest(info_path)
+        if len(info["segments"]) <= 1 and not any(s["deleted"] for s in info["segments"]):
+            return False
+        snapshot = [dict(s) for s in info["segments"]]
+        name = _new_segment_name(info)
+        write_manifest(info_path, info)   # reserve the segment name
+    seg_dir = segment_dir(info_path, info)
+
+    remap = {}   # old segment -> new row per old row (-1 if dropped)
+    with SegmentWriter(seg_dir, name) as writer:
+        for seg in snapshot:
+            keep = np.ones(seg["count"], dtype=bool)
+            keep[seg["deleted"]] = False
+            remap[seg["name"]] = np.where(keep, np.cumsum(keep) - 1 + writer.count, -1)
+            X = np.load(seg_dir / f"{seg['name']}.vectors.npy", mmap_mode="r")
+            store = ChunkStore(seg_dir, seg["name"])
+            for start in range(0, seg["count"], BLOCK):
+                rows = np.flatnonzero(keep[start:start + BLOCK]) + start
+                block = store.rows(rows.tolist())
+                if len(rows):
+                    writer.append(X[rows], [r["source"] for r in block], [r["id"] for r in block],
+                                  [r["chunk"] for r in block], [r["doc"] for r in block])
+    writer.build_search(info)
+
+    with locked(info_path):
+        info = read_manifest(info_path)
+        live = {s["name"]: s for s in info["segments"]}
+        if any(s["name"] not in live for s in snapshot):   # a full re-ingest won the race
+            delete_segment_files(seg_dir, name)
+            return False
+        merged = writer.entry()
+        for seg in snapshot:   # tombstones that arrived during the merge
+            late = set(live[seg["name"]]["deleted"]) - set(seg["deleted"])
+            merged["deleted"].extend(int(remap[seg["name"]][r]) for r in late)
+        merged["deleted"].sort()
+        gone = {s["name"] for s in snapshot}
+        info["segments"] = [merged] + [s for s in info["segments"] if s["name"] not in gone]
+        for entry in info["docs"].values():
+            if entry["segment"] in gone:
+                old = remap[entry["segment"]]
+                start, stop = entry["rows"]
+                entry["segment"] = name
+                entry["rows"] = [int(old[start]), int(old[stop - 1]) + 1]
+        write_manifest(info_path, info)
+    for seg in snapshot:
+        delete_segment_files(seg_dir, seg["name"])
+    return True
+
+SEARCH_KEYS = ("algo", "ivf", "dtype", "dims", "pq", "rerank", "lexical")
+
+def reindex(info_path: Path, settings: dict) -> dict:
+    """Switch the index to other search settings (SEARCH_KEYS), rebuilding each
+    segment's structures from its stored vectors (no re-embedding)."""
+    if settings.get("algo", "brute") not in ann.ALGOS:
+        raise ValueError(f"Unknown algo {settings['algo']!r}. Choose from: {', '.join(ann.ALGOS)}")
+    if (settings.get("dtype") or "float32") not in quant.DTYPES:
+        raise ValueError(f"Unknown dtype {settings['dtype']!r}. Choose from: {', '.join(quant.DTYPES)}")
+    info = read_manifest(info_path)
+    seg_dir = segment_dir(info_path, info)
+    built = {seg["name"]: build_search(seg_dir, seg["name"], settings, seg) for seg in info["segments"]}
+    with locked(info_path):
+        info = read_manifest(info_path)
+        for key in SEARCH_KEYS:
+            info.pop(key, None)
+        info.update(settings)
+        for seg in info["segments"]:
+            for key in ("ivf", "codes", "lexical"):
+                seg.pop(key, None)
+            seg.update(built.get(seg["name"], {}))
+        write_manifest(info_path, info)
+    for seg in info["segments"]:   # structures the new settings no longer use
+        if "ivf" not in seg:
+            ann.delete_files(seg_dir, seg["name"])
+        if "codes" not in seg:
+            quant.delete_files(seg_dir, seg["name"])
+        if "lexical" not in seg:
+            lexical.delete_files(seg_dir, seg["name"])
+    # A segment written meanwhile by add/compact has no entries yet and is searched exactly
+    return info
+
+# ---- Query view --------------------------------------------------------------
+RETRIEVAL = ("hybrid", "vector", "lexical")
+
+def rrf(rankings: list[np.ndarray], k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Fuse ranked id lists: each id scores sum(1 / (RRF_K + rank)). Returns the best k (ids, scores)."""
+    assert k > 0, f"k must be positive, got {k}"
+    ids = np.concatenate(rankings)
+    if not len(ids):
+        return ids.astype("int64"), np.zeros(0, dtype="float32")
+    ranks = np.concatenate([np.arange(1, len(r) + 1) for r in rankings])
+    uniq, inv = np.unique(ids, return_inverse=True)
+    scores = np.bincount(inv, weights=1.0 / (RRF_K + ranks)).astype("float32")
+    order = np.lexsort((uniq, -scores))[:k]   # ties: lower row id first
+    return uniq[order], scores[order]
+
+class Index:
+    """Read-only view over all live segments, addressed by one global row id."""
+
+    def __init__(self, info_path: Path, nprobe: int | None = None, rerank: int | None = None,
+                 retrieval: str | None = None):
+        for attempt in range(2):
+            self.info = read_manifest(info_path)
+            self.dir = segment_dir(info_path, self.info)
+            self.names = [s["name"] for s in self.info["segments"]]
+            try:
+                self.vectors = [np.load(self.dir / f"{name}.vectors.npy", mmap_mode="r") for name in self.names]
+                self.stores = [ChunkStore(self.dir, name) for name in self.names]
+                self.ivf = [ann.IVF(self.dir, s["name"]) if s.get("ivf") else None for s in self.info["segments"]]
+                self.scorers = [quant.Codes.load(self.dir, s["name"], s["codes"]) if s.get("codes") else quant.Exact(X)
+                                for s, X in zip(self.info["segments"], self.vectors)]
+                self.postings = [lexical.Postings(self.dir, s["name"], s["lexical"]) if s.get("lexical") else None
+                                 for s in self.info["segments"]]
+                break
+            except FileNotFoundError:
+                if attempt:   # compaction swapped segments under us; the retry sees the new manifest
+                    raise FileNotFoundError("Vector file missing. Run --ingest first.")
+        self.version = corpus_version(self.info)
+        self.deleted = [np.asarray(s["deleted"], dtype="int64") for s in self.info["segments"]]
+        self.offsets = np.cumsum([0] + [len(X) for X in self.vectors])
+        self.alive = []
+        for X, dead in zip(self.vectors, self.deleted):
+            alive = None
+            if len(dead):
+                alive = np.ones(len(X), dtype=bool)
+                alive[dead] = False
+            self.alive.append(alive)
+        self.nprobe = nprobe or (self.info.get("ivf") or {}).get("nprobe") or ann.NPROBE
+        self.rerank = (self.info.get("rerank") or 0) if rerank is None else rerank
+        has_lexical = any(p is not None for p in self.postings)
+        self.retrieval = retrieval or ("hybrid" if has_lexical else "vector")
+        if self.retrieval not in RETRIEVAL:
+            raise ValueError(f"Unknown retrieval {self.retrieval!r}. Choose from: {', '.join(RETRIEVAL)}")
+        if self.retrieval != "vector" and not has_lexical:
+            raise RuntimeError("Index has no lexical postings. Run --reindex --lexical first.")
+
+    def __len__(self) -> int:
+        return int(sum(s["count"] - len(s["deleted"]) for s in self.info["segments"]))
+
+    def search(self, q: np.ndarray, k: int, nprobe: int | None = None, rerank: int | None = None,
+               exact: bool = False):
+        """Top-k live rows across all segments for one query (D,) or a batch (B, D).
+
+        IVF segments probe `nprobe` clusters, and segments with compressed
+        codes re-rank their top `rerank` candidates on the float32 vectors
+        (both default to the index's settings; rerank=0 turns it off).
+        exact=True scores every float32 row regardless of the settings.
+        When probed clusters hold fewer than k live rows for a query, that
+        query's row is padded with id -1 and score -inf (a single query is
+        trimmed instead).
+        """
+        q = normalize(q)
+        single = q.ndim == 1
+        Q = q[None, :] if single else q
+        rerank = self.rerank if rerank is None else rerank
+        all_idx, all_scores = [np.empty((Q.shape[0], 0), dtype="int64")], [np.empty((Q.shape[0], 0), dtype="float32")]
+        for X, dead, alive, ivf, scorer, off in zip(self.vectors, self.deleted, self.alive, self.ivf,
+                                                    self.scorers, self.offsets):
+            scorer = quant.Exact(X) if exact else scorer
+            cand = max(k, rerank) if scorer.lossy and rerank else k
+            Qp = scorer.prepare(Q)
+            if ivf is not None and not exact:
+                idx, scores = ivf.search(scorer, Q, Qp, cand, alive, nprobe or self.nprobe, top_k)
+            else:
+                S = scorer.score(Qp)
+                S[:, dead] = -np.inf
+                idx, scores = top_k(S, cand)
+            if scorer.lossy and rerank:
+                idx, scores = quant.rerank(X, Q, np.where(np.isfinite(scores), idx, -1), k, top_k)
+            all_idx.append(np.where(np.isfinite(scores), idx + off, -1))   # padding: -1, not a row of another segment
+            all_scores.append(scores)
+        S = np.concatenate(all_scores, axis=1)
+        pick, scores = top_k(S, min(k, len(self)))
+        idx = np.take_along_axis(np.concatenate(all_idx, axis=1), pick, axis=1)
+        if not exact and not np.isfinite(scores).all():
+            # Padding sorts last in each row; drop only the columns that are padding for every query
+            pad = ~np.isfinite(scores)
+            idx = np.where(pad, -1, idx)
+            keep = ~pad.all(axis=0)
+            idx, scores = idx[:, keep], scores[:, keep]
+        return (idx[0], scores[0]) if single else (idx, scores)
+
+    def lexical_search(self, text: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k live rows by BM25 for one query text. Returns (idx, scores)."""
+        terms = list(dict.fromkeys(lexical.tokenize(text)))
+        found = [[p.df(t) if p is not None else (-1, 0) for t in terms] for p in self.postings]
+        n = max(len(self), 1)
+        idfs = [lexical.idf(n, sum(f[j][1] for f in found)) for j in range(len(terms))]
+        all_idx, all_scores = [np.zeros(0, dtype="int64")], [np.zeros(0, dtype="float32")]
+        for p, f, alive, off in zip(self.postings, found, self.alive, self.offsets):
+            if p is None:
+                continue
+            rows, scores = p.score([(t, w) for (t, _), w in zip(f, idfs)])
+            if alive is not None:
+                live = alive[rows]
+                rows, scores = rows[live], scores[live]
+            all_idx.append(rows + off)
+            all_scores.append(scores)
+        idx, scores = np.concatenate(all_idx), np.concatenate(all_scores)
+        pick, best = top_k(scores[None, :], k)
+        return idx[pick[0]], best[0]
+
+    def retrieve(self, q: np.ndarray, texts, k: int, retrieval: str | None = None, **kw):
+        """Top-k for query vector(s) q and their text(s), by the index's retrieval mode.
+
+        "vector" is search(), "lexical" is BM25 only, and "hybrid" fuses both
+        rankings with RRF. Takes one query (D,) and a string, or a batch (B, D)
+        and a list; a batch returns lists of per-query (idx, scores) arrays.
+        """
+        assert k > 0, f"k must be positive, got {k}"
+        mode = retrieval or self.retrieval
+        if mode == "vector":
+            idx, scores = self.search(q, k, **kw)
+            if idx.ndim == 1:
+                return idx, scores
+            return [i[i >= 0] for i in idx], [s[i >= 0] for i, s in zip(idx, scores)]
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        depth = max(k, RRF_DEPTH)
+        if mode == "hybrid":
+            vec_idx, _ = self.search(q[None, :] if single else q, depth, **kw)
+        out_idx, out_scores = [], []
+        for b, text in enumerate(texts):
+            lex_idx, lex_scores = self.lexical_search(text, depth if mode == "hybrid" else k)
+            if mode == "lexical":
+                idx, scores = lex_idx, lex_scores
+            else:
+                idx, scores = rrf([vec_idx[b][vec_idx[b] >= 0], lex_idx], k)
+            out_idx.append(idx)
+            out_scores.append(scores)
+        return (out_idx[0], out_scores[0]) if single else (out_idx, out_scores)
+
+    def _locate(self, i: int):
+        seg = int(np.searchsorted(self.offsets, i, side="right")) - 1
+        return self.stores[seg], i - int(self.offsets[seg])
+
+    def source(self, i: int) -> str:
+        store, row = self._locate(i)
+        return store.get("source", row)
+
+    def chunk(self, i: int) -> str:
+        store, row = self._locate(i)
+        return store.get("chunk", row)
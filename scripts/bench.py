@@ -0,0 +1,256 @@
+"""Offline benchmarks for day4-day6, against the local mock API (scripts/mock_api.py).
+
+No API keys needed and nothing in the day folders is touched: each case runs
+in a fresh subprocess whose index, caches and logs live in a temp dir (the
+CLIs' module-level paths are pointed there), with OPENAI_BASE_URL /
+ANTHROPIC_BASE_URL set to a mock server started for the run.
+
+  day6   ingest throughput of a synthetic corpus, then `ask` latency
+         percentiles (total and per stage) with the answer cache off
+  day5   the same for the day5 whole-document index
+  day4   --batch analysis of N snippets on both providers (calls/s, retries)
+
+One case per benchmark x corpus size. Every run appends one JSON record per
+case to scripts/bench_results.jsonl (commit, params, metrics, mock API stats),
+so runs can be compared across commits. tiktoken downloads its encodings on
+first use, so a machine without network needs them cached beforehand (one
+online run, or TIKTOKEN_CACHE_DIR pointing at a copy).
+
+  python scripts/bench.py                                  # all, default sizes
+  python scripts/bench.py day6 --sizes 200 2000 --asks 50 --latency 80
+  python scripts/bench.py day4 --snippets 500 --rpm 1200 --error-rate 0.02
+  python scripts/bench.py --compare                        # latest run vs the previous commit's
+"""
+import argparse, contextlib, io, json, os, random, subprocess, sys, tempfile, time, urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS = Path(__file__).resolve().parent / "bench_results.jsonl"
+BENCHES = ("day6", "day5", "day4")
+SIZES = [100, 1000]      # documents per corpus
+ASKS = 30                # questions per corpus size
+SNIPPETS = 200           # day4 batch size
+VOCAB = 5000             # synthetic corpus vocabulary
+DOC_WORDS = 400          # words per synthetic document
+
+# ---- Synthetic data ----------------------------------------------------------
+def vocabulary(rng: random.Random) -> list[str]:
+    syll = ["ka", "ri", "to", "me", "su", "na", "po", "le", "vi", "da", "shi", "ro", "an", "el", "mu"]
+    words = set()
+    while len(words) < VOCAB:
+        words.add("".join(rng.choice(syll) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def write_corpus(dst: Path, n: int, seed: int = 0) -> list[str]:
+    """n .txt docs of DOC_WORDS words (Zipf-ish word frequencies); returns one question per doc."""
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    weights = [1 / (i + 1) for i in range(len(words))]
+    dst.mkdir(parents=True, exist_ok=True)
+    questions = []
+    for i in range(n):
+        doc = rng.choices(words, weights, k=DOC_WORDS)
+        sentences = [" ".join(doc[j:j + 12]).capitalize() + "." for j in range(0, DOC_WORDS, 12)]
+        (dst / f"doc{i:05d}.txt").write_text("\n".join(sentences), encoding="utf-8")
+        questions.append(f"What does the policy say about {' '.join(rng.sample(doc, 3))}?")
+    return questions
+
+def write_snippets(dst: Path, n: int, seed: int = 0):
+    rng = random.Random(seed)
+    topics = ["Extend clinic hours.", "Share patient records with vendors; privacy review pending.",
+              "Pilot telehealth in rural areas.", "Budget approved for staff training.",
+              "Contractor billing shows possible fraud.", "Quarterly outcome tracking is planned."]
+    with dst.open("w", encoding="utf-8") as f:
+        for i in range(n):
+            text = " ".join(rng.sample(topics, 3)) + f" Ref {i}."
+            f.write(json.dumps({"id": f"s{i:05d}", "snippet": text}) + "\n")
+
+def percentiles(values: list[float]) -> dict:
+    v = sorted(values)
+    if not v:
+        return {}
+    pick = lambda q: v[min(len(v) - 1, int(q * len(v)))]
+    return {"p50": round(pick(0.5), 2), "p90": round(pick(0.9), 2), "p99": round(pick(0.99), 2),
+            "mean": round(sum(v) / len(v), 2), "n": len(v)}
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+# ---- Cases (run in a subprocess each) ----------------------------------------
+def case_day6(tmp: Path, size: int, asks: int) -> dict:
+    sys.path.insert(0, str(ROOT / "day6" / "src"))
+    import day6_cli as cli
+    cli.ENV, cli.OUT_DIR = tmp / ".env", tmp / "outputs"
+    cli.RESULTS_LOG = cli.OUT_DIR / "answers.jsonl"
+    cli.INDEX_INFO, cli.EMB_CACHE, cli.ANSWER_CACHE = tmp / "day6.nn.json", tmp / "emb.sqlite", tmp / "answers.sqlite"
+    questions = write_corpus(tmp / "docs", size)
+
+    t0 = time.perf_counter()
+    with quiet():
+        cli.ingest(str(tmp / "docs"))
+    ingest_s = time.perf_counter() - t0
+    chunks = len(cli.load_corpus())
+
+    rng = random.Random(1)
+    walls = []
+    for q in rng.sample(questions, min(asks, len(questions))):
+        t0 = time.perf_counter()
+        with quiet():
+            cli.ask(q, cache={"enabled": False})
+        walls.append((time.perf_counter() - t0) * 1000)
+    records = [json.loads(line) for line in cli.RESULTS_LOG.read_text(encoding="utf-8").splitlines()]
+    stages = {s: percentiles([r["timings_ms"][s] for r in records if s in r["timings_ms"]])
+              for s in ("embed", "search", "completion")}
+    return {"docs": size, "chunks": chunks, "ingest_s": round(ingest_s, 2),
+            "chunks_per_s": round(chunks / ingest_s, 1), "ask_ms": percentiles(walls), "stages_ms": stages}
+
+def case_day5(tmp: Path, size: int, asks: int) -> dict:
+    sys.path.insert(0, str(ROOT / "day5" / "src"))
+    import day5_cli as cli
+    cli.ROOT, cli.ENV, cli.OUT_DIR = tmp, tmp / ".env", tmp / "outputs"
+    cli.RESULTS_LOG = cli.OUT_DIR / "answers.jsonl"
+    cli.INDEX_VEC, cli.INDEX_META = tmp / "day5.vectors.npy", tmp / "day5.docs.npz"
+    cli.INDEX_INFO, cli.EMB_CACHE = tmp / "day5.nn.json", tmp / "emb.sqlite"
+    cli.OUT_DIR.mkdir(exist_ok=True)
+    questions = write_corpus(tmp / "docs", size)
+
+    t0 = time.perf_counter()
+    with quiet():
+        cli.ingest(str(tmp / "docs"))
+    ingest_s = time.perf_counter() - t0
+
+    rng = random.Random(1)
+    walls = []
+    for q in rng.sample(questions, min(asks, len(questions))):
+        t0 = time.perf_counter()
+        with quiet():
+            cli.ask(q)
+        walls.append((time.perf_counter() - t0) * 1000)
+    return {"docs": size, "ingest_s": round(ingest_s, 2), "docs_per_s": round(size / ingest_s, 1),
+            "ask_ms": percentiles(walls)}
+
+def case_day4(tmp: Path, snippets: int) -> dict:
+    sys.path.insert(0, str(ROOT / "day4"))
+    from src import batch, capabilities, response_cache
+    response_cache.ENABLED = False        # measure the calls, not the cache
+    capabilities.STORE = tmp / "capabilities.json"
+    write_snippets(tmp / "snippets.jsonl", snippets)
+    out = tmp / "batch.jsonl"
+    with quiet():
+        stats = batch.analyze_batch(str(tmp / "snippets.jsonl"), ["openai", "anthropic"], str(out))
+    recs = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    calls = len(recs)
+    attempts = sum(r["attempts"] for r in recs)
+    return {"snippets": snippets, "seconds": round(stats["seconds"], 2), "calls_per_s": round(calls / stats["seconds"], 1),
+            "errors": sum("error" in r for r in recs), "retries": attempts - calls,
+            "call_ms": percentiles([r["ms"] for r in recs])}
+
+CASES = {"day6": case_day6, "day5": case_day5, "day4": case_day4}
+
+# ---- Driver ------------------------------------------------------------------
+def git_commit() -> tuple[str | None, bool]:
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return head or None, dirty
+    except OSError:
+        return None, False
+
+def mock_stats(base: str) -> dict:
+    with urllib.request.urlopen(f"{base}/stats") as r:
+        return json.loads(r.read())
+
+def run_case(base: str, bench: str, params: dict) -> dict:
+    env = {**os.environ, "OPENAI_BASE_URL": f"{base}/v1", "ANTHROPIC_BASE_URL": base,
+           "OPENAI_API_KEY": "mock", "ANTHROPIC_API_KEY": "mock"}
+    env.pop("OPENAI_PROJECT", None)
+    cmd = [sys.executable, __file__, "--worker", bench, "--params", json.dumps(params)]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"{bench} {params} failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def compare(path: Path):
+    """Latest record of each case vs the newest one from another commit."""
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    latest = {}
+    for r in records:
+        latest[(r["bench"], json.dumps(r["params"], sort_keys=True))] = r
+    for key, new in latest.items():
+        old = next((r for r in reversed(records) if (r["bench"], json.dumps(r["params"], sort_keys=True)) == key
+                    and r["commit"] != new["commit"]), None)
+        print(f"{new['bench']} {new['params']}  {old['commit'] if old else '-'} -> {new['commit']}")
+        for name, value in flatten(new["metrics"]).items():
+            prev = flatten(old["metrics"]).get(name) if old else None
+            change = f"  ({(value - prev) / prev:+.1%})" if isinstance(prev, (int, float)) and prev else ""
+            print(f"  {name:28s} {prev if prev is not None else '-':>10} -> {value:>10}{change}")
+
+def flatten(d: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in d.items():
+        if isinstance(v, dict):
+            out.update(flatten(v, f"{prefix}{k}."))
+        elif isinstance(v, (int, float)):
+            out[prefix + k] = v
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline benchmarks against the mock OpenAI/Anthropic API")
+    ap.add_argument("benches", nargs="*", metavar="BENCH", help=f"{', '.join(BENCHES)} (default: all)")
+    ap.add_argument("--sizes", nargs="+", type=int, default=SIZES, help="day5/day6 corpus sizes (documents)")
+    ap.add_argument("--asks", type=int, default=ASKS, help="day5/day6 questions per corpus size")
+    ap.add_argument("--snippets", type=int, default=SNIPPETS, help="day4 batch size")
+    ap.add_argument("--latency", type=float, default=30.0, help="mock API latency (ms)")
+    ap.add_argument("--tokens-per-s", type=float, default=200.0, help="mock completion decode speed")
+    ap.add_argument("--rpm", type=float, default=0, help="mock rate limit per provider (0 = none)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="mock 500s, as a fraction of requests")
+    ap.add_argument("--out", default=str(RESULTS), help="results JSONL (appended)")
+    ap.add_argument("--compare", action="store_true", help="compare the latest results with the previous commit's")
+    ap.add_argument("--worker", help=argparse.SUPPRESS)
+    ap.add_argument("--params", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if set(args.benches) - set(BENCHES):
+        ap.error(f"unknown benchmark: {', '.join(sorted(set(args.benches) - set(BENCHES)))}")
+
+    if args.worker:   # subprocess: one case, metrics as the last stdout line
+        with tempfile.TemporaryDirectory(prefix=f"bench_{args.worker}_") as tmp:
+            print(json.dumps(CASES[args.worker](Path(tmp), **json.loads(args.params))))
+        return
+    if args.compare:
+        compare(Path(args.out))
+        return
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    import mock_api
+    mock = {"latency": args.latency, "tokens_per_s": args.tokens_per_s, "rpm": args.rpm, "error_rate": args.error_rate}
+    server, _ = mock_api.start(**mock)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    commit, dirty = git_commit()
+    cases = []
+    for bench in args.benches or BENCHES:
+        if bench == "day4":
+            cases.append((bench, {"snippets": args.snippets}))
+        else:
+            cases += [(bench, {"size": n, "asks": args.asks}) for n in args.sizes]
+
+    with Path(args.out).open("a", encoding="utf-8") as out:
+        for bench, params in cases:
+            before = mock_stats(base)
+            t0 = time.perf_counter()
+            metrics = run_case(base, bench, params)
+            after = mock_stats(base)
+            api = {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+            rec = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit, "dirty": dirty, "bench": bench,
+                   "params": {**params, "mock": mock}, "metrics": metrics, "api": api,
+                   "wall_s": round(time.perf_counter() - t0, 2)}
+            out.write(json.dumps(rec) + "\n")
+            out.flush()
+            print(f"{bench} {params}: {json.dumps(metrics)}")
+    server.shutdown()
+    print(f"Results appended to {args.out}")
+
+if __name__ == "__main__":
+    main()
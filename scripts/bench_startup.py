@@ -0,0 +1,71 @@
+"""Startup budget for the day4-day6 CLIs, measured with `python -X importtime`.
+
+Cron jobs and shell pipelines start these CLIs thousands of times a day, so
+`--help` and argument errors must not pay for openai, anthropic, numpy or the
+index modules: those are imported inside the code paths that use them. Each
+case below runs a fast path, sums the import time of every module it loads
+beyond bare interpreter startup (`python -c pass`), and fails if a heavy
+module shows up or the total exceeds the budget.
+
+  python scripts/bench_startup.py            # exit status 1 on a regression
+  python scripts/bench_startup.py --top 5    # also list the slowest imports per case
+"""
+import argparse, re, subprocess, sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_MS = 40.0    # import time per fast path, on top of interpreter startup
+RUNS = 5            # best of N, so a cold disk cache or a busy machine doesn't fail the check
+HEAVY = ("openai", "anthropic", "numpy", "sklearn", "tiktoken", "httpx", "dotenv",
+         "vector_index", "vectors", "answer_cache", "embed_cache", "embedder", "loader",
+         "common.embed_cache", "common.embedder", "common.vectors", "src.openai_call", "src.anthropic_call")
+
+# (name, working directory, arguments after `python -X importtime`)
+CASES = [
+    ("day4 --help", "day4", ["-m", "src.cli", "--help"]),
+    ("day4 usage error", "day4", ["-m", "src.cli"]),
+    ("day5 --help", "day5", ["src/day5_cli.py", "--help"]),
+    ("day6 --help", "day6", ["src/day6_cli.py", "--help"]),
+    ("day6 bad flag", "day6", ["src/day6_cli.py", "--no-such-flag"]),
+    ("results_log --help", "day6", ["src/results_log.py", "--help"]),
+]
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+def imports(cwd: Path, args: list[str]) -> dict[str, int]:
+    """Module -> self import time (µs) for one run."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=cwd, capture_output=True, text=True)
+    return {m.group(4): int(m.group(1)) for m in map(LINE.match, proc.stderr.splitlines()) if m}
+
+def measure(cwd: Path, args: list[str], baseline: set[str]) -> tuple[float, dict[str, int]]:
+    """Best-of-RUNS total (ms) of the modules this command loads beyond startup, and that run's modules."""
+    best = None
+    for _ in range(RUNS):
+        mods = {k: v for k, v in imports(cwd, args).items() if k not in baseline}
+        total = sum(mods.values()) / 1000
+        if best is None or total < best[0]:
+            best = (total, mods)
+    return best
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Check the CLIs' fast paths against an import-time budget")
+    ap.add_argument("--budget", type=float, default=BUDGET_MS, help=f"ms per case (default: {BUDGET_MS})")
+    ap.add_argument("--top", type=int, default=0, help="list the N slowest imports of each case")
+    args = ap.parse_args()
+
+    baseline = set(imports(ROOT, ["-c", "pass"]))
+    failed = 0
+    for name, where, argv in CASES:
+        total, mods = measure(ROOT / where, argv, baseline)
+        heavy = sorted(m for m in mods if m.split(".")[0] in HEAVY or m in HEAVY)
+        ok = not heavy and total <= args.budget
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:22s} {total:7.1f} ms  {len(mods):3d} modules"
+              + (f"  heavy: {', '.join(heavy[:6])}" if heavy else ""))
+        for mod, us in sorted(mods.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"       {us / 1000:7.1f} ms  {mod}")
+    print(f"{len(CASES) - failed}/{len(CASES)} within {args.budget:g} ms")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
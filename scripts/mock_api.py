@@ -0,0 +1,358 @@
+"""Local stand-in for the OpenAI and Anthropic APIs, for offline runs and benchmarks.
+
+Implements what day4-day6 call: embeddings, chat.completions (plain and
+streamed), responses and messages, plus the file / batch endpoints behind
+day4's --batch-submit. Answers are deterministic and cheap to compute:
+
+- embeddings are hashed bags of words, so texts sharing words are similar and
+  retrieval behaves sensibly;
+- a day4 analysis prompt gets a JSON contract built from the snippet (risk
+  if it mentions privacy, breach, fraud, ...); any other prompt gets a short
+  answer quoting its context.
+
+Latency, streaming speed, rate limits (429 + retry-after and x-ratelimit-*
+headers) and injected 5xx errors are configurable, and `GET /stats` reports
+request, error and token counts.
+
+  python scripts/mock_api.py --port 8900 --latency 40 --rpm 3000 --error-rate 0.01
+  export OPENAI_BASE_URL=http://127.0.0.1:8900/v1 ANTHROPIC_BASE_URL=http://127.0.0.1:8900
+  export OPENAI_API_KEY=mock ANTHROPIC_API_KEY=mock
+"""
+import base64, json, random, re, struct, threading, time, zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULTS = {
+    "latency": 30.0,         # ms before the first byte of any response
+    "jitter": 0.2,           # +- fraction of latency
+    "tokens_per_s": 200.0,   # completion decode speed (whole reply, or spacing of streamed tokens)
+    "answer_tokens": 60,     # words in a plain (non-JSON) answer
+    "dim": 1536,             # embedding size
+    "rpm": 0,                # requests per minute per provider; 0 = unlimited
+    "error_rate": 0.0,       # fraction of requests answered with a 500
+    "reject_models": [],     # models answered with a 400 (e.g. "gpt-5", to exercise fallbacks)
+    "batch_delay": 2.0,      # seconds a batch job stays in progress
+    "seed": 0,
+}
+RED_FLAGS = ("privacy", "breach", "overbudget", "bias", "inequity", "fraud")
+WORD = re.compile(r"\w+")
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def embed(text: str, dim: int) -> list[float]:
+    v = [0.0] * dim
+    for w in WORD.findall(text.lower()):
+        h = zlib.crc32(w.encode("utf-8"))
+        v[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    v[zlib.crc32(text.encode("utf-8")) % dim] += 0.1   # never all zeros
+    return v
+
+def reply_text(prompt: str, answer_tokens: int) -> str:
+    """JSON contract for day4 analysis prompts, a cited answer for anything else."""
+    if '"bullets"' in prompt and "<<<" in prompt:
+        snippet = prompt.rsplit("<<<", 1)[1].split(">>>", 1)[0].strip()
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", snippet) if s.strip()] or [snippet[:80]]
+        bullets = [" ".join(s.split()[:12]) for s in sentences[:3]]
+        risk = "risk" if any(f in snippet.lower() for f in RED_FLAGS) else "ok"
+        return json.dumps({"bullets": bullets, "risk": risk})
+    sources = re.findall(r"[\w\-.]+\.txt(?:#chunk\d+)?", prompt)
+    words = WORD.findall(prompt.split("Context:", 1)[-1]) or ["ok"]
+    body = " ".join(words[i % len(words)] for i in range(answer_tokens))
+    return f"{body} [{sources[0]}]" if sources else body
+
+class Limiter:
+    """Token bucket per provider: rpm/60 requests per second, one second of burst."""
+
+    def __init__(self, rpm: float):
+        self.rate = rpm / 60
+        self.capacity = max(1.0, self.rate)
+        self.level, self.t = self.capacity, time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        """0 if the request may proceed, else seconds until it could."""
+        with self.lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.t) * self.rate)
+            self.t = now
+            if self.level >= 1:
+                self.level -= 1
+                return 0.0
+            return (1 - self.level) / self.rate
+
+class MockAPI:
+    def __init__(self, **config):
+        self.cfg = {**DEFAULTS, **config}
+        self.rng = random.Random(self.cfg["seed"])
+        self.limits = {p: Limiter(self.cfg["rpm"]) for p in ("openai", "anthropic")} if self.cfg["rpm"] else {}
+        self.stats = Counter()
+        self.files, self.batches, self.ids = {}, {}, 0
+        self.lock = threading.Lock()
+
+    def count(self, **kv):
+        with self.lock:
+            self.stats.update(kv)
+
+    def sleep_latency(self):
+        j = self.cfg["jitter"]
+        time.sleep(self.cfg["latency"] / 1000 * (1 + self.rng.uniform(-j, j)))
+
+    def new_id(self, prefix: str) -> str:
+        with self.lock:
+            self.ids += 1
+            return f"{prefix}_{self.ids:08d}"
+
+    # ---- Completions ---------------------------------------------------------
+    def complete(self, route: str, req: dict) -> dict:
+        """Response body for one completion request (also used for batch lines)."""
+        if route == "messages":
+            prompt = "\n".join(m["content"] if isinstance(m["content"], str) else json.dumps(m["content"])
+                               for m in req.get("messages", []))
+        elif route == "responses":
+            inp = req.get("input", "")
+            prompt = inp if isinstance(inp, str) else "\n".join(str(m.get("content", "")) for m in inp)
+        else:
+            prompt = "\n".join(str(m.get("content", "")) for m in req.get("messages", []))
+        text = reply_text(prompt, self.cfg["answer_tokens"])
+        tin, tout = _tokens(prompt), len(text.split())
+        self.count(tokens_in=tin, tokens_out=tout)
+        model = req.get("model", "mock")
+        if route == "messages":
+            return {"id": self.new_id("msg"), "type": "message", "role": "assistant", "model": model,
+                    "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+                    "usage": {"input_tokens": tin, "output_tokens": tout}}
+        if route == "responses":
+            return {"id": self.new_id("resp"), "object": "response", "created_at": int(time.time()), "model": model,
+                    "status": "completed", "output": [{"type": "message", "id": self.new_id("msg"), "role": "assistant",
+                                                       "status": "completed",
+                                                       "content": [{"type": "output_text", "text": text, "annotations": []}]}],
+                    "usage": {"input_tokens": tin, "output_tokens": tout, "total_tokens": tin + tout}}
+        return {"id": self.new_id("chatcmpl"), "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": tin, "completion_tokens": tout, "total_tokens": tin + tout}}
+
+    def embeddings(self, req: dict) -> dict:
+        inputs = req["input"] if isinstance(req["input"], list) else [req["input"]]
+        b64 = req.get("encoding_format") == "base64"
+        data = []
+        for i, text in enumerate(inputs):
+            v = embed(str(text), req.get("dimensions") or self.cfg["dim"])
+            vec = base64.b64encode(struct.pack(f"<{len(v)}f", *v)).decode() if b64 else v
+            data.append({"object": "embedding", "index": i, "embedding": vec})
+        tin = sum(_tokens(str(t)) for t in inputs)
+        self.count(tokens_in=tin, embedded=len(inputs))
+        return {"object": "list", "data": data, "model": req.get("model"),
+                "usage": {"prompt_tokens": tin, "total_tokens": tin}}
+
+    # ---- Batches -------------------------------------------------------------
+    def openai_batch(self, req: dict) -> dict:
+        out = []
+        for line in self.files[req["input_file_id"]].splitlines():
+            if line.strip():
+                item = json.loads(line)
+                route = "responses" if item["url"].endswith("/responses") else "chat"
+                out.append({"id": self.new_id("req"), "custom_id": item["custom_id"], "error": None,
+                            "response": {"status_code": 200, "body": self.complete(route, item["body"])}})
+        bid = self.new_id("batch")
+        self.files[f"file-{bid}"] = "\n".join(json.dumps(o) for o in out) + "\n"
+        self.batches[bid] = {"ready": time.time() + self.cfg["batch_delay"], "body": {
+            "id": bid, "object": "batch", "endpoint": req["endpoint"], "input_file_id": req["input_file_id"],
+            "completion_window": req.get("completion_window", "24h"), "created_at": int(time.time()),
+            "status": "in_progress", "output_file_id": None, "error_file_id": None, "metadata": req.get("metadata"),
+            "request_counts": {"total": len(out), "completed": 0, "failed": 0}}, "output": f"file-{bid}"}
+        return self.openai_batch_status(bid)
+
+    def openai_batch_status(self, bid: str) -> dict:
+        b = self.batches[bid]
+        if time.time() >= b["ready"] and b["body"]["status"] == "in_progress":
+            counts = b["body"]["request_counts"]
+            b["body"].update(status="completed", output_file_id=b["output"])
+            counts["completed"] = counts["total"]
+        return b["body"]
+
+    def anthropic_batch(self, req: dict, base: str) -> dict:
+        results = [{"custom_id": r["custom_id"], "result": {"type": "succeeded", "message": self.complete("messages", r["params"])}}
+                   for r in req["requests"]]
+        bid = self.new_id("msgbatch")
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self.batches[bid] = {"ready": time.time() + self.cfg["batch_delay"], "results": results, "body": {
+            "id": bid, "type": "message_batch", "processing_status": "in_progress", "created_at": now,
+            "expires_at": now, "ended_at": None, "archived_at": None, "cancel_initiated_at": None, "results_url": None,
+            "request_counts": {"processing": len(results), "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}}}
+        return self.anthropic_batch_status(bid, base)
+
+    def anthropic_batch_status(self, bid: str, base: str) -> dict:
+        b = self.batches[bid]
+        if time.time() >= b["ready"] and b["body"]["processing_status"] == "in_progress":
+            n = len(b["results"])
+            b["body"].update(processing_status="ended", ended_at=b["body"]["created_at"],
+                             results_url=f"{base}/v1/messages/batches/{bid}/results")
+            b["body"]["request_counts"].update(processing=0, succeeded=n)
+        return b["body"]
+
+    # ---- HTTP ----------------------------------------------------------------
+    def handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive, like the real APIs
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, code: int, body, headers: dict | None = None):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+                api.count(**{f"status_{code}": 1})
+
+            def error(self, provider: str, code: int, kind: str, message: str, headers: dict | None = None):
+                body = ({"type": "error", "error": {"type": kind, "message": message}} if provider == "anthropic"
+                        else {"error": {"message": message, "type": kind, "code": None, "param": None}})
+                self.send(code, body, headers)
+
+            def gate(self, provider: str, req: dict) -> bool:
+                """Rate limit, error injection and rejected models; False if an error was sent."""
+                limiter = api.limits.get(provider)
+                wait = limiter.take() if limiter else 0.0
+                if wait:
+                    api.count(rate_limited=1)
+                    self.error(provider, 429, "rate_limit_error", "Rate limit reached (mock)",
+                               {"retry-after": f"{wait:.3f}", "retry-after-ms": str(int(wait * 1000) + 1),
+                                "x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": f"{wait:.3f}s"})
+                    return False
+                if api.cfg["error_rate"] and api.rng.random() < api.cfg["error_rate"]:
+                    api.count(injected_errors=1)
+                    self.error(provider, 500, "api_error" if provider == "anthropic" else "server_error",
+                               "Injected server error (mock)")
+                    return False
+                if req.get("model") in api.cfg["reject_models"]:
+                    self.error(provider, 400, "invalid_request_error", "Unsupported parameter: 'temperature' (mock)")
+                    return False
+                return True
+
+            def body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("content-length") or 0))
+
+            def stream_chat(self, req: dict):
+                full = api.complete("chat", req)
+                words = full["choices"][0]["message"]["content"].split(" ")
+                self.send_response(200)
+                self.send_header("content-type", "text/event-stream")
+                self.send_header("transfer-encoding", "chunked")
+                self.end_headers()
+
+                def event(obj):
+                    data = f"data: {obj if isinstance(obj, str) else json.dumps(obj)}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+                base = {"id": full["id"], "object": "chat.completion.chunk", "created": full["created"], "model": full["model"]}
+                for i, w in enumerate(words):
+                    if i:
+                        time.sleep(1 / api.cfg["tokens_per_s"])
+                    event({**base, "choices": [{"index": 0, "delta": {"content": w if i == 0 else " " + w},
+                                                "finish_reason": None}]})
+                event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                if (req.get("stream_options") or {}).get("include_usage"):
+                    event({**base, "choices": [], "usage": full["usage"]})
+                event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+                api.count(status_200=1)
+
+            def do_POST(self):
+                raw = self.body()
+                path = self.path.split("?", 1)[0]
+                api.count(**{f"POST {path}": 1})
+                if path == "/v1/files":
+                    m = re.search(rb'name="file"; filename="[^"]*"\r\n(?:[^\r\n]+\r\n)*\r\n(.*?)\r\n--', raw, re.S)
+                    fid = api.new_id("file")
+                    api.files[fid] = m.group(1).decode("utf-8") if m else ""
+                    return self.send(200, {"id": fid, "object": "file", "bytes": len(api.files[fid]), "created_at": int(time.time()),
+                                           "filename": "batch.jsonl", "purpose": "batch", "status": "processed"})
+                try:
+                    req = json.loads(raw or b"{}")
+                except ValueError:
+                    return self.error("openai", 400, "invalid_request_error", "Body is not JSON")
+                provider = "anthropic" if path.startswith("/v1/messages") else "openai"
+                if not self.gate(provider, req):
+                    return
+                api.sleep_latency()
+                if path == "/v1/embeddings":
+                    return self.send(200, api.embeddings(req))
+                if path == "/v1/batches":
+                    return self.send(200, api.openai_batch(req))
+                if path == "/v1/messages/batches":
+                    return self.send(200, api.anthropic_batch(req, self.base()))
+                route = {"/v1/chat/completions": "chat", "/v1/responses": "responses", "/v1/messages": "messages"}.get(path)
+                if route is None:
+                    return self.error(provider, 404, "not_found_error", f"No route {path} (mock)")
+                if route == "chat" and req.get("stream"):
+                    return self.stream_chat(req)
+                body = api.complete(route, req)
+                out = (body.get("usage") or {}).get("completion_tokens") or (body.get("usage") or {}).get("output_tokens") or 0
+                time.sleep(out / api.cfg["tokens_per_s"])   # decode time of the whole reply
+                self.send(200, body)
+
+            def base(self) -> str:
+                host, port = self.server.server_address[:2]
+                return f"http://{host}:{port}"
+
+            def do_GET(self):
+                self.body()
+                path = self.path.split("?", 1)[0]
+                if path == "/stats":
+                    with api.lock:
+                        stats = dict(api.stats)
+                    return self.send(200, stats)
+                if m := re.fullmatch(r"/v1/files/([^/]+)/content", path):
+                    return self.send(200, api.files.get(m.group(1), "").encode("utf-8"))
+                if m := re.fullmatch(r"/v1/batches/([^/]+)", path):
+                    return self.send(200, api.openai_batch_status(m.group(1)))
+                if m := re.fullmatch(r"/v1/messages/batches/([^/]+)", path):
+                    return self.send(200, api.anthropic_batch_status(m.group(1), self.base()))
+                if m := re.fullmatch(r"/v1/messages/batches/([^/]+)/results", path):
+                    lines = "".join(json.dumps(r) + "\n" for r in api.batches[m.group(1)]["results"])
+                    return self.send(200, lines.encode("utf-8"))
+                self.error("openai", 404, "not_found_error", f"No route {path} (mock)")
+
+        return Handler
+
+def start(host: str = "127.0.0.1", port: int = 0, **config) -> tuple[ThreadingHTTPServer, MockAPI]:
+    """Serve in a background thread; port 0 picks a free one (see server.server_address)."""
+    api = MockAPI(**config)
+    server = ThreadingHTTPServer((host, port), api.handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, api
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Mock OpenAI/Anthropic API server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--latency", type=float, default=DEFAULTS["latency"], help="ms before each response")
+    ap.add_argument("--jitter", type=float, default=DEFAULTS["jitter"], help="+- fraction of --latency")
+    ap.add_argument("--tokens-per-s", type=float, default=DEFAULTS["tokens_per_s"], help="completion decode speed")
+    ap.add_argument("--answer-tokens", type=int, default=DEFAULTS["answer_tokens"], help="words per plain answer")
+    ap.add_argument("--dim", type=int, default=DEFAULTS["dim"], help="embedding size")
+    ap.add_argument("--rpm", type=float, default=DEFAULTS["rpm"], help="requests/minute per provider (0 = unlimited)")
+    ap.add_argument("--error-rate", type=float, default=DEFAULTS["error_rate"], help="fraction of requests failing with 500")
+    ap.add_argument("--reject-model", action="append", default=[], help="answer requests for this model with a 400")
+    ap.add_argument("--batch-delay", type=float, default=DEFAULTS["batch_delay"], help="seconds until a batch job ends")
+    args = ap.parse_args()
+    server, _ = start(args.host, args.port, latency=args.latency, jitter=args.jitter, tokens_per_s=args.tokens_per_s,
+                      answer_tokens=args.answer_tokens, dim=args.dim, rpm=args.rpm, error_rate=args.error_rate,
+                      reject_models=args.reject_model, batch_delay=args.batch_delay)
+    print(f"Mock API on http://{args.host}:{server.server_address[1]} (OpenAI base URL: /v1)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()